@@ -0,0 +1 @@
+# Lets `pytest` (not only `python -m pytest`) import the `src` package from the repository root
@@ -0,0 +1,5 @@
+-- Created after the bulk load (sql_backend.load) so inserts do not maintain them row by row
+CREATE INDEX IF NOT EXISTS ix_eng_client ON program_engagements (client_id);
+CREATE INDEX IF NOT EXISTS ix_eng_provider_program ON program_engagements (provider, program_name);
+CREATE INDEX IF NOT EXISTS ix_eng_program ON program_engagements (program_name);
+CREATE INDEX IF NOT EXISTS ix_eng_exit_month ON program_engagements (exit_month);
@@ -1,3 +1,4 @@
+-- name: perm_rate_by_program
 -- Permanent housing rate by program
 SELECT
   program_name,
@@ -8,6 +9,7 @@ FROM program_engagements
 GROUP BY program_name
 ORDER BY perm_rate DESC;
 
+-- name: missing_interviews_by_provider
 -- Missing exit interview rate by provider+program
 SELECT
   provider,
@@ -20,6 +22,7 @@ GROUP BY provider, program_name
 HAVING exits >= 30
 ORDER BY missing_rate DESC;
 
+-- name: equity_perm_by_race
 -- Equity cut: perm housing by race/ethnicity
 SELECT
   c.race_ethnicity,
@@ -31,3 +34,151 @@ JOIN clients c ON c.client_id = e.client_id
 WHERE e.exited_flag = 1
 GROUP BY c.race_ethnicity
 ORDER BY perm_rate DESC;
+
+-- KPI engine (etl_build_metrics --backend sqlite). Rates are derived from these counts in Python so
+-- both backends share one definition; NULL groups sort last to match the pandas outputs. Length-of-stay
+-- quantiles are read off the kpi_days_hist histogram in Python, like the pandas partials.
+
+-- name: kpi_monthly
+SELECT
+  exit_month,
+  COALESCE(SUM(exited_flag), 0) AS exited_clients,
+  COALESCE(SUM(permanent_housing_flag), 0) AS exits_to_perm_housing,
+  SUM(CASE WHEN exit_interview_completed = 0 THEN 1 ELSE 0 END) AS missing_exit_interviews
+FROM program_engagements
+GROUP BY exit_month
+ORDER BY exit_month IS NULL, exit_month;
+
+-- name: kpi_program
+SELECT
+  program_name,
+  COUNT(DISTINCT client_id) AS total_clients,
+  COALESCE(SUM(exited_flag), 0) AS exited_clients,
+  COALESCE(SUM(permanent_housing_flag), 0) AS exits_to_perm_housing,
+  SUM(CASE WHEN exit_interview_completed = 0 THEN 1 ELSE 0 END) AS missing_exit_interviews
+FROM program_engagements
+GROUP BY program_name
+ORDER BY program_name IS NULL, program_name;
+
+-- name: kpi_dq
+SELECT
+  provider,
+  program_name,
+  COALESCE(SUM(exited_flag), 0) AS exited_clients,
+  SUM(CASE WHEN exit_interview_completed = 0 THEN 1 ELSE 0 END) AS missing_exit_interviews,
+  SUM(CASE WHEN income_at_exit_range = 'Data Not Collected' AND exited_flag = 1 THEN 1 ELSE 0 END) AS missing_income
+FROM program_engagements
+GROUP BY provider, program_name
+ORDER BY provider IS NULL, provider, program_name IS NULL, program_name;
+
+-- name: kpi_days_hist
+-- (exit month, provider, program, days) -> episodes: the finest grain every KPI table's quantiles roll up from
+SELECT exit_month, provider, program_name, days_in_program, COUNT(*) AS n
+FROM program_engagements
+WHERE days_in_program IS NOT NULL
+GROUP BY exit_month, provider, program_name, days_in_program;
+
+-- name: kpi_equity
+SELECT
+  c.race_ethnicity,
+  COUNT(DISTINCT e.client_id) AS exited_clients,
+  COALESCE(SUM(e.permanent_housing_flag), 0) AS perm_exits
+FROM program_engagements e
+JOIN clients c ON c.client_id = e.client_id
+WHERE e.exited_flag = 1 AND c.race_ethnicity IS NOT NULL
+GROUP BY c.race_ethnicity
+ORDER BY c.race_ethnicity;
+
+-- name: kpi_totals
+SELECT
+  (SELECT COUNT(DISTINCT client_id) FROM clients) AS total_clients,
+  COALESCE(SUM(exited_flag), 0) AS total_exits,
+  COALESCE(SUM(CASE WHEN exited_flag = 1 THEN permanent_housing_flag END), 0) AS perm_housing_exits
+FROM program_engagements;
+
+-- The interval_* queries return src.intervals' count tables (COUNT_KEYS), computed in the database
+-- with window functions over each client's episodes in day order, so no per-episode rows reach Python.
+
+-- name: interval_episodes
+-- An episode is concurrent when it starts before the latest exit among the same client's earlier-starting
+-- episodes (ties in load order; an open enrollment never ends)
+SELECT program_name, COUNT(*) AS episodes, SUM(COALESCE(entry_day < latest_exit, 0)) AS concurrent_episodes
+FROM (
+  SELECT
+    program_name,
+    entry_day,
+    MAX(COALESCE(exit_day, 2147483647)) OVER (
+      PARTITION BY client_id ORDER BY entry_day, id ROWS BETWEEN UNBOUNDED PRECEDING AND 1 PRECEDING
+    ) AS latest_exit
+  FROM episode_days
+)
+GROUP BY program_name;
+
+-- name: interval_returns
+-- Permanent housing exits by program, exit day and days to the same client's first entry strictly after
+-- the exit day (capped at :no_return). Entries and exits share one window per client in day order with
+-- entries first, so the earliest entry among the rows after an exit is its return.
+SELECT program_name, day AS exit_day, MIN(COALESCE(next_entry - day, :no_return), :no_return) AS gap, COUNT(*) AS exits
+FROM (
+  SELECT
+    program_name,
+    day,
+    kind,
+    MIN(CASE WHEN kind = 0 THEN day END) OVER (
+      PARTITION BY client_id ORDER BY day, kind ROWS BETWEEN 1 FOLLOWING AND UNBOUNDED FOLLOWING
+    ) AS next_entry
+  FROM (
+    SELECT client_id, NULL AS program_name, entry_day AS day, 0 AS kind FROM episode_days
+    UNION ALL
+    SELECT client_id, program_name, exit_day, 1 FROM episode_days WHERE perm_exit = 1
+  )
+)
+WHERE kind = 1
+GROUP BY program_name, exit_day, gap;
+
+-- name: interval_events
+-- Census events per program and day: entries, ends (the day after an exit), exits and permanent housing exits
+SELECT
+  program_name,
+  day,
+  SUM(entries) AS entries,
+  SUM(ends) AS ends,
+  SUM(exits) AS exits,
+  SUM(perm_exit) AS perm_housing_exits
+FROM (
+  SELECT program_name, entry_day AS day, 1 AS entries, 0 AS ends, 0 AS exits, 0 AS perm_exit FROM episode_days
+  UNION ALL
+  SELECT program_name, MAX(exit_day, entry_day) + 1, 0, 1, 0, 0 FROM episode_days WHERE exit_day IS NOT NULL
+  UNION ALL
+  SELECT program_name, MAX(exit_day, entry_day), 0, 0, 1, perm_exit FROM episode_days WHERE exit_day IS NOT NULL
+)
+GROUP BY program_name, day;
+
+-- name: interval_stays
+-- Completed stays per program by length in days
+SELECT program_name, MAX(exit_day - entry_day, 0) AS days, COUNT(*) AS exits
+FROM episode_days
+WHERE exit_day IS NOT NULL
+GROUP BY program_name, days;
+
+-- name: tableau_extract
+SELECT
+  e.client_id,
+  e.program_name,
+  e.provider,
+  e.entry_date,
+  e.exit_date,
+  e.days_in_program,
+  e.exited_flag,
+  e.permanent_housing_flag,
+  e.exit_interview_completed,
+  e.exit_destination,
+  e.income_at_exit_range,
+  c.year,
+  c.household_type,
+  c.age_group,
+  c.race_ethnicity,
+  c.gender
+FROM program_engagements e
+LEFT JOIN clients c ON c.client_id = e.client_id
+ORDER BY e.rowid;
@@ -1,3 +1,4 @@
+DROP VIEW IF EXISTS episode_days;
 DROP TABLE IF EXISTS clients;
 DROP TABLE IF EXISTS program_engagements;
 
@@ -22,5 +23,21 @@ CREATE TABLE program_engagements (
   exit_interview_completed INTEGER,
   exit_destination TEXT,
   income_at_exit_range TEXT,
-  permanent_housing_flag INTEGER
-);
\ No newline at end of file
+  permanent_housing_flag INTEGER,
+  exit_month TEXT GENERATED ALWAYS AS (substr(exit_date, 1, 7) || '-01') STORED,
+  days_in_program INTEGER GENERATED ALWAYS AS (MAX(CAST(julianday(exit_date) - julianday(entry_date) AS INTEGER), 0)) STORED
+);
+
+-- Episodes with an entry date as day numbers (days since 1970-01-01) for the interval queries;
+-- exit_day only for recorded exits, NULL for enrollments still open
+CREATE VIEW episode_days AS
+SELECT
+  rowid AS id,
+  client_id,
+  program_name,
+  CAST(julianday(entry_date) - 2440587.5 AS INTEGER) AS entry_day,
+  CASE WHEN exited_flag = 1 AND julianday(exit_date) IS NOT NULL
+    THEN CAST(julianday(exit_date) - 2440587.5 AS INTEGER) END AS exit_day,
+  COALESCE(exited_flag = 1 AND julianday(exit_date) IS NOT NULL AND permanent_housing_flag = 1, 0) AS perm_exit
+FROM program_engagements
+WHERE julianday(entry_date) IS NOT NULL;
@@ -0,0 +1,102 @@
+import argparse
+import runpy
+import sys
+
+from src import instrument
+
+# Single entry point: `python -m src <command> [options]`. A command's module is imported only when that
+# command runs, so `--help` and light commands never load pandas, matplotlib or reportlab. `run` executes
+# generate -> ETL -> access sites -> report in this one process: the generated frames go straight to the
+# ETL, and its KPI tables and the access-site volumes straight to the report, so nothing is re-imported or
+# read back from disk between stages (the files are still written, for Tableau and src.pipeline's cache).
+COMMANDS = {
+    "generate": ("src.generate_data", "generate synthetic raw data"),
+    "etl": ("src.etl_build_metrics", "build the KPI tables and the Tableau extract"),
+    "access": ("src.access_sites", "ingest new access-site events and write weekly / monthly volumes"),
+    "analysis": ("src.analysis", "render figures, report.md and report.pdf"),
+    "pipeline": ("src.pipeline", "cached multi-process pipeline (one stage per worker)"),
+    "montecarlo": ("src.montecarlo", "permanent housing rate bands over seeded replicates"),
+    "packs": ("src.report_packs", "per-provider / per-program report packs"),
+    "dq": ("src.dq_rules", "records behind a provider x program's data quality flags"),
+    "sql": ("src.sql_backend", "run a named query against the SQLite KPI database"),
+    "benchmark": ("src.benchmark", "stage benchmarks at several data sizes"),
+}
+
+
+def run(argv: list):
+    from src.storage import FORMATS
+
+    parser = argparse.ArgumentParser(
+        prog="python -m src run", description="Generate, build the KPIs and access-site volumes, and render the report in one process."
+    )
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--scale", type=float, default=1.0, help="multiplier on the calibrated 2,495-client population")
+    parser.add_argument("--total-clients", type=int, default=None, help="exact client count (overrides --scale)")
+    parser.add_argument("--episodes-per-client", type=float, default=1.0, help="mean episodes per client in the generated data")
+    parser.add_argument("--targets", default=None, help="JSON file of marginal calibration targets for generate_data")
+    parser.add_argument("--skip-generate", action="store_true", help="build from the raw files already on disk")
+    parser.add_argument("--format", dest="fmt", choices=FORMATS, default="csv", help="table format for every stage")
+    parser.add_argument("--chunksize", type=int, default=None, help="stream the ETL in chunks of this many rows")
+    parser.add_argument("--incremental", action="store_true", help="incremental ETL over data/processed/state")
+    parser.add_argument("--backend", choices=["pandas", "sqlite"], default="pandas", help="ETL backend")
+    parser.add_argument("--dq-rules", default=None, help="JSON list of data quality rules for the ETL")
+    parser.add_argument("--dpi", type=int, default=None, help="figure resolution (default: src.analysis.DPI)")
+    parser.add_argument("--draft", action="store_true", help="render figures at draft resolution")
+    parser.add_argument("--jobs", type=int, default=None, help="figure worker processes (default: one per core)")
+    parser.add_argument("--no-figures", dest="figures", action="store_false", help="skip the figures the PDF does not embed")
+    parser.add_argument("--no-pdf", dest="pdf", action="store_false", help="skip report.pdf")
+    instrument.add_arguments(parser)
+    args = parser.parse_args(argv)
+    instrument.configure(args.run_log, args.profile)
+
+    from src import access_sites, analysis, generate_data
+    from src import etl_build_metrics as etl
+
+    raw = None
+    if not args.skip_generate:
+        with instrument.stage("run", "generate"):
+            raw = generate_data.main(
+                seed=args.seed,
+                scale=args.scale,
+                total_clients=args.total_clients,
+                fmt=args.fmt,
+                episodes_per_client=args.episodes_per_client,
+                targets=args.targets,
+            )
+    with instrument.stage("run", "etl"):
+        tables = etl.main(
+            chunksize=args.chunksize, fmt=args.fmt, incremental=args.incremental, backend=args.backend, rules=args.dq_rules, raw=raw
+        )
+    with instrument.stage("run", "access"):
+        tables["access"] = access_sites.main(fmt=args.fmt)["month"]
+    dpi = analysis.DRAFT_DPI if args.draft else args.dpi or analysis.DPI
+    with instrument.stage("run", "analysis"):
+        analysis.main(fmt=args.fmt, dpi=dpi, jobs=args.jobs, figures=args.figures, pdf=args.pdf, tables=tables)
+
+
+def usage() -> str:
+    width = max(map(len, COMMANDS))
+    lines = [f"  {'run':<{width}}  generate -> ETL -> access sites -> report in one process, sharing frames"]
+    lines += [f"  {name:<{width}}  {help}" for name, (_, help) in COMMANDS.items()]
+    return "usage: python -m src <command> [options]\n\ncommands:\n" + "\n".join(lines) + "\n\n`python -m src <command> --help` lists a command's options."
+
+
+def main(argv: list | None = None):
+    argv = sys.argv[1:] if argv is None else argv
+    if not argv or argv[0] in ("-h", "--help"):
+        print(usage())
+        return
+    command, rest = argv[0], argv[1:]
+    if command == "run":
+        run(rest)
+    elif command in COMMANDS:
+        # Exactly `python -m <module> ...`, in this interpreter
+        module = COMMANDS[command][0]
+        sys.argv[1:] = rest
+        runpy.run_module(module, run_name="__main__", alter_sys=True)
+    else:
+        sys.exit(f"unknown command {command!r}\n\n{usage()}")
+
+
+if __name__ == "__main__":
+    main()
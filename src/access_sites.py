@@ -0,0 +1,217 @@
+import argparse
+import hashlib
+import io
+import json
+import os
+
+import numpy as np
+import pandas as pd
+
+from src import instrument
+from src.dates import parse_dates
+from src.instrument import stage
+from src.storage import CATEGORY_DTYPES, FORMATS, read_table, table_path, write_table
+
+BASE = os.path.dirname(os.path.dirname(__file__))
+
+# Access-site engagements: walk-in events (site, engagement_date) appended to data/raw/access_site_engagements
+# as they arrive. Each run ingests only the events past the stored cursor and adds their per-site, per-day
+# counts into a small counter store (STORE_DIR), so the event log is never rescanned. Queries run on
+# prefix sums of the store: the volume of any site over any day range is two lookups, so each week or
+# month bucket costs O(1) whatever the number of events behind it.
+RAW_ACCESS = os.path.join(BASE, "data/raw/access_site_engagements.csv")
+STORE_DIR = os.path.join(BASE, "data/processed/access_store")
+STORE_DAILY = os.path.join(STORE_DIR, "daily.csv")
+STORE_CURSOR = os.path.join(STORE_DIR, "cursor.json")
+OUT_WEEKLY = os.path.join(BASE, "data/processed/access_site_weekly.csv")
+OUT_MONTHLY = os.path.join(BASE, "data/processed/access_site_monthly.csv")
+
+TRAILING = {"week": 4, "month": 3}  # buckets in the trailing mean
+CHECK_BYTES = 1 << 16  # tail of the consumed log compared on each run, to catch a rewritten file
+
+
+class CounterStore:
+    # Per-site, per-day event counts over a contiguous day range, held as one cumulative row per site:
+    # cum[s, d] is site s's events on days before origin + d.
+    def __init__(self, daily: pd.DataFrame):
+        self.sites = sorted(daily["site"].astype(str).unique())
+        days = daily["engagement_date"].to_numpy(dtype="datetime64[D]")
+        if not len(days):
+            self.first = self.last = None
+            self.cum = np.zeros((0, 1), dtype=np.int64)
+            return
+        self.first, self.last = days.min(), days.max()
+        # Buckets are aligned to weeks and months, so the range is padded to whole ones on both ends
+        self.origin = min(week_start(self.first), self.first.astype("datetime64[M]").astype("datetime64[D]"))
+        end = max(week_start(self.last) + 7, (self.last.astype("datetime64[M]") + 1).astype("datetime64[D]"))
+        counts = np.zeros((len(self.sites), int((end - self.origin).astype(int))), dtype=np.int64)
+        site = np.searchsorted(self.sites, daily["site"].astype(str).to_numpy())
+        np.add.at(counts, (site, (days - self.origin).astype(int)), daily["engagements"].to_numpy(dtype=np.int64))
+        self.cum = np.concatenate([np.zeros((len(self.sites), 1), dtype=np.int64), counts.cumsum(axis=1)], axis=1)
+
+    def index(self, day) -> np.ndarray:
+        return np.clip((np.asarray(day, dtype="datetime64[D]") - self.origin).astype(int), 0, self.cum.shape[1] - 1)
+
+    def volume(self, start, end) -> np.ndarray:
+        # Events per site on days start <= day < end
+        return self.cum[:, self.index(end)] - self.cum[:, self.index(start)]
+
+    def edges(self, freq: str) -> np.ndarray:
+        if freq == "week":
+            return np.arange(week_start(self.first), week_start(self.last) + 8, 7)
+        months = np.arange(self.first.astype("datetime64[M]"), self.last.astype("datetime64[M]") + 2)
+        return months.astype("datetime64[D]")
+
+    def buckets(self, freq: str) -> pd.DataFrame:
+        # One row per site x bucket: events, days of the bucket inside the observed range (edge buckets
+        # can be partial), change on the previous bucket and the trailing mean over TRAILING[freq] buckets
+        columns = ["site", "period_start", "days", "engagements", "change", "trailing_mean"]
+        if self.first is None:
+            return pd.DataFrame(columns=columns)
+        edges = self.edges(freq)
+        at = self.cum[:, self.index(edges)]
+        volume = np.diff(at, axis=1)
+        k = TRAILING[freq]
+        back = np.maximum(np.arange(1, len(edges)) - k, 0)
+        trailing = (at[:, 1:] - at[:, back]) / (np.arange(1, len(edges)) - back)
+        change = np.diff(volume, axis=1, prepend=np.nan)
+        observed = np.minimum(edges[1:], self.last + 1) - np.maximum(edges[:-1], self.first)
+        n = len(edges) - 1
+        return pd.DataFrame(
+            {
+                "site": np.repeat(self.sites, n),
+                "period_start": np.tile(edges[:-1], len(self.sites)).astype("datetime64[ns]"),
+                "days": np.tile(observed.astype(int), len(self.sites)),
+                "engagements": volume.reshape(-1),
+                "change": change.reshape(-1),
+                "trailing_mean": trailing.reshape(-1),
+            },
+            columns=columns,
+        )
+
+
+def week_start(day: np.datetime64) -> np.datetime64:
+    # Monday on or before `day` (1970-01-01 was a Thursday)
+    return day - (day.astype(int) + 3) % 7
+
+
+def daily_counts(events: pd.DataFrame) -> pd.DataFrame:
+    # Grouped on the site categorical; only the small result is turned back into text
+    days = parse_dates(events["engagement_date"])
+    daily = (
+        pd.DataFrame({"site": events["site"], "engagement_date": days})
+        .groupby(["site", "engagement_date"], sort=True, observed=True)
+        .size()
+        .reset_index(name="engagements")
+    )
+    return daily.astype({"site": str})
+
+
+def read_cursor() -> dict | None:
+    if not os.path.exists(STORE_CURSOR):
+        return None
+    with open(STORE_CURSOR) as f:
+        return json.load(f)
+
+
+def tail_digest(f, offset: int) -> str:
+    # Header line plus the last CHECK_BYTES consumed: a rewritten or truncated log changes one of them
+    f.seek(0)
+    head = f.readline()
+    f.seek(max(offset - CHECK_BYTES, 0))
+    return hashlib.blake2b(head + f.read(min(offset, CHECK_BYTES)), digest_size=16).hexdigest()
+
+
+def new_events(fmt: str, cursor: dict | None):
+    # Events appended since `cursor`, and the cursor after them; a cursor of None or one that no longer
+    # matches the log means the store is rebuilt from the whole log (returned as reset=True)
+    path = table_path(RAW_ACCESS, fmt)
+    if fmt != "csv":
+        # Columnar files are rewritten whole rather than appended to; rows past the cursor are the batch
+        events = read_table(RAW_ACCESS, fmt)
+        rows = cursor["rows"] if cursor and cursor.get("fmt") == fmt else 0
+        digest = pd.util.hash_pandas_object(events.iloc[:rows], index=False).sum() if rows else 0
+        reset = not rows or len(events) < rows or f"{digest:x}" != cursor["digest"]
+        batch = events if reset else events.iloc[rows:]
+        full = pd.util.hash_pandas_object(events, index=False).sum() if len(events) else 0
+        return batch, {"fmt": fmt, "rows": len(events), "digest": f"{full:x}"}, reset
+
+    with open(path, "rb") as f:
+        size = f.seek(0, os.SEEK_END)
+        offset = cursor["bytes"] if cursor and cursor.get("fmt") == fmt else 0
+        reset = not offset or size < offset or tail_digest(f, offset) != cursor["digest"]
+        f.seek(0)
+        header = f.readline()
+        start = len(header) if reset else offset
+        f.seek(start)
+        data = f.read()
+    # A line still being written (no newline yet) is left for the next run
+    data = data[: data.rfind(b"\n") + 1]
+    end = start + len(data)
+    batch = pd.read_csv(io.BytesIO(header + data), dtype=CATEGORY_DTYPES)
+    with open(path, "rb") as f:
+        digest = tail_digest(f, end)
+    previous = 0 if reset else cursor["rows"]
+    return batch, {"fmt": fmt, "bytes": end, "rows": previous + len(batch), "digest": digest}, reset
+
+
+def ingest(fmt: str = "csv", rebuild: bool = False) -> CounterStore:
+    os.makedirs(STORE_DIR, exist_ok=True)
+    # Without the store there is nothing to add to, whatever the cursor says
+    cursor = None if rebuild or not os.path.exists(table_path(STORE_DAILY, fmt)) else read_cursor()
+    with stage("access", "read_new_events") as r:
+        batch, cursor_after, reset = new_events(fmt, cursor)
+        r["rows"] = len(batch)
+    with stage("access", "update_store") as r:
+        daily = daily_counts(batch)
+        if not reset:
+            # Adding counts is the whole merge: the store is tiny next to the log it summarizes
+            stored = read_table(STORE_DAILY, fmt, parse_dates=["engagement_date"])
+            daily = (
+                pd.concat([stored.astype({"site": str}), daily], ignore_index=True)
+                .groupby(["site", "engagement_date"], sort=True)["engagements"]
+                .sum()
+                .reset_index()
+            )
+        write_table(daily, STORE_DAILY, fmt)
+        with open(STORE_CURSOR, "w") as f:
+            json.dump(cursor_after, f, indent=1)
+        r["rows"] = len(daily)
+    print(f"Access sites: {len(batch)} new events{' (store rebuilt)' if reset else ''}, {cursor_after['rows']} ingested in total")
+    return CounterStore(daily)
+
+
+def load(fmt: str = "csv") -> CounterStore:
+    # The store as last ingested, for ad hoc bucket and range queries
+    return CounterStore(read_table(STORE_DAILY, fmt, parse_dates=["engagement_date"]))
+
+
+def main(fmt: str = "csv", rebuild: bool = False):
+    store = ingest(fmt, rebuild)
+    tables = {}
+    print("Wrote:")
+    for freq, path in [("week", OUT_WEEKLY), ("month", OUT_MONTHLY)]:
+        with stage("access", f"buckets_{freq}") as r:
+            tables[freq] = store.buckets(freq)
+            print(" -", write_table(tables[freq], path, fmt))
+            r["rows"] = len(tables[freq])
+    print(" -", table_path(STORE_DAILY, fmt))
+    return tables
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Ingest new access-site engagements into the per-site daily counter store and write weekly / monthly volumes."
+    )
+    parser.add_argument("--format", dest="fmt", choices=FORMATS, default="csv", help="raw input and processed output format")
+    parser.add_argument("--rebuild", action="store_true", help="ignore the stored cursor and re-ingest the whole event log")
+    parser.add_argument("--show", choices=list(TRAILING), default=None, help="print the stored volumes by week or month instead of ingesting")
+    parser.add_argument("--site", default=None, help="with --show: one site only")
+    instrument.add_arguments(parser)
+    args = parser.parse_args()
+    instrument.configure(args.run_log, args.profile)
+    if args.show:
+        out = load(args.fmt).buckets(args.show)
+        print((out if args.site is None else out[out["site"] == args.site]).to_string(index=False))
+    else:
+        main(fmt=args.fmt, rebuild=args.rebuild)
@@ -1,48 +1,77 @@
+import argparse
 import os
+from concurrent.futures import Future, ProcessPoolExecutor
+
 import pandas as pd
-import matplotlib.pyplot as plt
-from reportlab.lib.pagesizes import letter
-from reportlab.pdfgen import canvas
-from reportlab.lib.units import inch
+
+from src import instrument
+from src.instrument import stage
+from src.storage import FORMATS, read_table, table_path
 
 BASE = os.path.dirname(os.path.dirname(__file__))
 
-CLIENTS = os.path.join(BASE, "data/raw/clients.csv")
-ENG = os.path.join(BASE, "data/raw/program_engagements.csv")
 MONTHLY = os.path.join(BASE, "data/processed/system_kpis_monthly.csv")
 PROGRAM = os.path.join(BASE, "data/processed/program_kpis.csv")
 DQ = os.path.join(BASE, "data/processed/data_quality_watchlist.csv")
+EQUITY = os.path.join(BASE, "data/processed/equity_perm_by_race.csv")
+TOTALS = os.path.join(BASE, "data/processed/headline_totals.csv")
+BANDS = os.path.join(BASE, "data/processed/montecarlo_bands.csv")  # optional: written by src.montecarlo
+ACCESS = os.path.join(BASE, "data/processed/access_site_monthly.csv")  # optional: written by src.access_sites
 
 OUT_MD = os.path.join(BASE, "outputs/report.md")
 OUT_PDF = os.path.join(BASE, "outputs/report.pdf")
 FIG_DIR = os.path.join(BASE, "outputs/figures")
+FIGURES = {
+    "program": os.path.join(FIG_DIR, "perm_housing_rate_by_program.png"),
+    "monthly": os.path.join(FIG_DIR, "monthly_exits.png"),
+    "equity": os.path.join(FIG_DIR, "perm_rate_by_race.png"),
+    "bands": os.path.join(FIG_DIR, "perm_rate_bands.png"),
+    "access": os.path.join(FIG_DIR, "access_site_volume.png"),
+}
+EMBEDDED = ["program", "equity", "access"]  # figures drawn into report.pdf (access only when there are volumes)
+
+DPI = 180
+DRAFT_DPI = 72
+
+
+def pyplot():
+    # matplotlib is imported on first use, so markdown-only runs never load it
+    import matplotlib
+
+    matplotlib.use("Agg")  # figures are rendered in worker processes; no display backend
+    import matplotlib.pyplot as plt
+
+    return plt
 
 
-def save_fig(path: str):
+def save_fig(path: str, dpi: int = DPI) -> str:
+    plt = pyplot()
     plt.tight_layout()
-    plt.savefig(path, dpi=180)
+    plt.savefig(path, dpi=dpi)
     plt.close()
+    return path
 
 
-def main():
-    os.makedirs(FIG_DIR, exist_ok=True)
-    os.makedirs(os.path.join(BASE, "outputs"), exist_ok=True)
+def plot_rate_bars(df: pd.DataFrame, label: str, rate: str, title: str, path: str, dpi: int = DPI, figsize=(8, 4), rotate: bool = False) -> str:
+    plt = pyplot()
+    plt.figure(figsize=figsize)
+    plt.bar(df[label], df[rate])
+    plt.title(title)
+    plt.ylabel("Rate")
+    if rotate:
+        plt.xticks(rotation=25, ha="right")
+    return save_fig(path, dpi)
 
-    clients = pd.read_csv(CLIENTS)
-    eng = pd.read_csv(ENG)
-    monthly = pd.read_csv(MONTHLY, parse_dates=["exit_month"])
-    program = pd.read_csv(PROGRAM)
-    dq = pd.read_csv(DQ)
 
-    # 1) Permanent housing rate by program
+def plot_program_rates(program: pd.DataFrame, path: str, dpi: int = DPI) -> str:
     program_sorted = program.sort_values("perm_housing_rate", ascending=False)
-    plt.figure(figsize=(8, 4))
-    plt.bar(program_sorted["program_name"], program_sorted["perm_housing_rate"])
-    plt.title("Permanent Housing Rate by Program (Synthetic, Calibrated)")
-    plt.ylabel("Rate")
-    save_fig(os.path.join(FIG_DIR, "perm_housing_rate_by_program.png"))
+    return plot_rate_bars(
+        program_sorted, "program_name", "perm_housing_rate", "Permanent Housing Rate by Program (Synthetic, Calibrated)", path, dpi
+    )
 
-    # 2) Monthly exits vs perm housing
+
+def plot_monthly_exits(monthly: pd.DataFrame, path: str, dpi: int = DPI) -> str:
+    plt = pyplot()
     plt.figure(figsize=(8, 4))
     plt.plot(monthly["exit_month"], monthly["exited_clients"], label="Exits")
     plt.plot(monthly["exit_month"], monthly["exits_to_perm_housing"], label="Permanent Housing Exits")
@@ -50,39 +79,102 @@ def main():
     plt.xlabel("Month")
     plt.ylabel("Clients")
     plt.legend()
-    save_fig(os.path.join(FIG_DIR, "monthly_exits.png"))
-
-    # 3) Equity: perm housing by race
-    df = eng.merge(clients, on="client_id", how="left")
-    exited = df[df["exited_flag"] == 1].copy()
-    equity = (
-        exited.groupby("race_ethnicity")
-        .agg(exited_clients=("client_id", "nunique"), perm_exits=("permanent_housing_flag", "sum"))
-        .reset_index()
+    return save_fig(path, dpi)
+
+
+def plot_equity(equity: pd.DataFrame, path: str, dpi: int = DPI) -> str:
+    return plot_rate_bars(
+        equity, "race_ethnicity", "perm_rate", "Permanent Housing Rate by Race/Ethnicity (Synthetic)", path, dpi, figsize=(9, 4), rotate=True
     )
-    equity["perm_rate"] = equity["perm_exits"] / equity["exited_clients"]
-    equity = equity.sort_values("perm_rate", ascending=False)
 
+
+def plot_rate_bands(bands: pd.DataFrame, path: str, dpi: int = DPI) -> str:
+    # Median rate with its central interval across Monte Carlo replicates, one panel per dimension
+    plt = pyplot()
+    dimensions = list(dict.fromkeys(bands["dimension"]))
+    _, axes = plt.subplots(1, len(dimensions), figsize=(11, 4), squeeze=False)
+    for ax, dimension in zip(axes[0], dimensions):
+        d = bands[bands["dimension"] == dimension].sort_values("perm_rate_median", ascending=False)
+        err = [d["perm_rate_median"] - d["perm_rate_lo"], d["perm_rate_hi"] - d["perm_rate_median"]]
+        ax.errorbar(d["group"], d["perm_rate_median"], yerr=err, fmt="o", capsize=4)
+        ax.set_title(f"By {dimension.replace('_', ' ')}")
+        ax.set_ylabel("Rate")
+        ax.tick_params(axis="x", labelrotation=25)
+        for label in ax.get_xticklabels():
+            label.set_ha("right")
+    band, n = bands["band"].iloc[0], int(bands["replicates"].min())
+    plt.suptitle(f"Permanent Housing Rate: median and {band:g}% band over {n:,} synthetic replicates")
+    return save_fig(path, dpi)
+
+
+def plot_access_volume(access: pd.DataFrame, path: str, dpi: int = DPI) -> str:
+    # Engagements per access site per month, straight from the counter store's monthly buckets
+    plt = pyplot()
     plt.figure(figsize=(9, 4))
-    plt.bar(equity["race_ethnicity"], equity["perm_rate"])
-    plt.title("Permanent Housing Rate by Race/Ethnicity (Synthetic)")
-    plt.ylabel("Rate")
-    plt.xticks(rotation=25, ha="right")
-    save_fig(os.path.join(FIG_DIR, "perm_rate_by_race.png"))
+    for site, d in access.groupby("site", sort=True):
+        plt.plot(d["period_start"], d["engagements"], marker="o", label=site)
+    plt.title("Access-Site Engagements by Month")
+    plt.xlabel("Month")
+    plt.ylabel("Engagements")
+    plt.legend(fontsize=7)
+    return save_fig(path, dpi)
+
+
+def render(name: str, plot, data: pd.DataFrame, dpi: int = DPI) -> str:
+    # Worker entry point; instrumentation settings arrive through the inherited environment
+    with stage("analysis", f"figure_{name}") as r:
+        r["rows"] = len(data)
+        return plot(data, FIGURES[name], dpi)
 
-    # Top watchlist (optional helper file)
-    watch = dq[dq["watch_flag"] == 1].copy().head(10)
-    watch.to_csv(os.path.join(BASE, "outputs/watchlist_top10.csv"), index=False)
 
-    # Markdown report
+def figure_path(fig) -> str:
+    # Figures are passed around as worker futures; the PDF only blocks on the ones it embeds
+    return fig.result() if isinstance(fig, Future) else fig
+
+
+def band_section(bands: pd.DataFrame) -> str:
+    band, n = bands["band"].iloc[0], int(bands["replicates"].min())
+    rows = [
+        f"| {r.dimension.replace('_', ' ')} | {r.group} | {r.perm_rate_median:.1%} | {r.perm_rate_lo:.1%} – {r.perm_rate_hi:.1%} |"
+        for r in bands.itertuples()
+    ]
+    return f"""
+## Uncertainty across synthetic replicates
+Permanent housing rates over {n:,} independently seeded draws of the synthetic data (`python -m src.montecarlo`).
+
+| Cut | Group | Median | {band:g}% band |
+|---|---|---|---|
+""" + "\n".join(rows) + "\n"
+
+
+def access_section(access: pd.DataFrame) -> str:
+    # Latest complete month per site (edge months of the event log can be partial), against the trailing mean
+    full = access[access["days"] == access["period_start"].dt.days_in_month]
+    latest = full[full["period_start"] == full["period_start"].max()]
+    totals = access.groupby("site")["engagements"].sum()
+    rows = [
+        f"| {r.site} | {totals[r.site]:,} | {r.engagements:,} | {r.change:+.0f} | {r.trailing_mean:.1f} |"
+        for r in latest.sort_values("site").itertuples()
+    ]
+    month = latest["period_start"].max()
+    return f"""
+## Access-site engagements
+Walk-in engagements per access site, from the per-site daily counter store (`python -m src.access_sites`). Latest complete month: {month:%B %Y}.
+
+| Site | Total | {month:%b %Y} | Change on prior month | Trailing 3-month mean |
+|---|---|---|---|---|
+""" + "\n".join(rows) + "\n"
+
+
+def write_markdown(totals: pd.Series, bands: pd.DataFrame | None = None, access: pd.DataFrame | None = None):
     md = f"""# System Performance & Data Quality POC (Middlesex CoC)
 
 This is an end-to-end mini-project using **synthetic HMIS-style client episodes** calibrated to publicly reported Coming Home system totals (2022–2023).
 
 ## Calibrated totals (synthetic)
-- Total clients: {clients['client_id'].nunique():,}
-- Total exits: {int(eng['exited_flag'].sum()):,}
-- Exits to permanent housing: {int(eng.loc[eng['exited_flag']==1,'permanent_housing_flag'].sum()):,}
+- Total clients: {int(totals['total_clients']):,}
+- Total exits: {int(totals['total_exits']):,}
+- Exits to permanent housing: {int(totals['perm_housing_exits']):,}
 
 ## Outputs
 - Monthly KPIs: `data/processed/system_kpis_monthly.csv`
@@ -91,10 +183,20 @@ This is an end-to-end mini-project using **synthetic HMIS-style client episodes*
 - Tableau extract: `data/processed/tableau_extract.csv`
 - Figures: `outputs/figures/`
 """
+    if bands is not None:
+        md += band_section(bands)
+    if access is not None and len(access):
+        md += access_section(access)
     with open(OUT_MD, "w") as f:
         f.write(md)
 
-    # Simple PDF report (2 pages)
+
+def write_pdf(totals: pd.Series, program_fig, equity_fig, access_fig=None):
+    # Simple PDF report (2 pages, plus an access-site page when there are access-site volumes)
+    from reportlab.lib.pagesizes import letter
+    from reportlab.lib.units import inch
+    from reportlab.pdfgen import canvas
+
     c = canvas.Canvas(OUT_PDF, pagesize=letter)
     width, height = letter
 
@@ -109,16 +211,16 @@ This is an end-to-end mini-project using **synthetic HMIS-style client episodes*
     c.setFont("Helvetica", 11)
     y = height - 1.7 * inch
     bullets = [
-        f"Total clients: {clients['client_id'].nunique():,}",
-        f"Total exits: {int(eng['exited_flag'].sum()):,}",
-        f"Permanent housing exits: {int(eng.loc[eng['exited_flag']==1,'permanent_housing_flag'].sum()):,}",
+        f"Total clients: {int(totals['total_clients']):,}",
+        f"Total exits: {int(totals['total_exits']):,}",
+        f"Permanent housing exits: {int(totals['perm_housing_exits']):,}",
         "Outputs: monthly KPIs, program KPIs, equity cuts, and a data quality watchlist.",
     ]
     for b in bullets:
         c.drawString(1.05 * inch, y, f"• {b}")
         y -= 0.22 * inch
 
-    fig1 = os.path.join(FIG_DIR, "perm_housing_rate_by_program.png")
+    fig1 = figure_path(program_fig)
     c.drawImage(fig1, 1 * inch, y - 3.0 * inch, width=6.5 * inch, height=3.0 * inch, preserveAspectRatio=True)
 
     c.showPage()
@@ -135,16 +237,96 @@ This is an end-to-end mini-project using **synthetic HMIS-style client episodes*
         c.drawString(1.05 * inch, y, f"• {n}")
         y -= 0.22 * inch
 
-    fig2 = os.path.join(FIG_DIR, "perm_rate_by_race.png")
+    fig2 = figure_path(equity_fig)
     c.drawImage(fig2, 1 * inch, y - 2.8 * inch, width=6.5 * inch, height=2.8 * inch, preserveAspectRatio=True)
 
+    if access_fig is not None:
+        c.showPage()
+        header("Access-site engagements")
+        c.setFont("Helvetica", 11)
+        y = height - 1.7 * inch
+        c.drawString(1.05 * inch, y, "• Walk-in engagements per access site per month, from the per-site daily counter store.")
+        y -= 0.22 * inch
+        fig3 = figure_path(access_fig)
+        c.drawImage(fig3, 1 * inch, y - 3.5 * inch, width=6.5 * inch, height=3.5 * inch, preserveAspectRatio=True)
+
     c.save()
 
+
+def main(fmt: str = "csv", dpi: int = DPI, jobs: int | None = None, figures: bool = True, pdf: bool = True, tables: dict | None = None):
+    os.makedirs(FIG_DIR, exist_ok=True)
+    os.makedirs(os.path.join(BASE, "outputs"), exist_ok=True)
+
+    # Everything here is pre-aggregated by the ETL; the raw files are never read. `tables` holds the ETL's
+    # frames when it ran in the same process (python -m src run), and skips the reads
+    with stage("analysis", "read_tables") as r:
+        if tables is None:
+            tables = {
+                "monthly": read_table(MONTHLY, fmt, parse_dates=["exit_month"]),
+                "program": read_table(PROGRAM, fmt),
+                "dq": read_table(DQ, fmt),
+                "equity": read_table(EQUITY, fmt),
+                "totals": read_table(TOTALS, fmt),
+            }
+        monthly, program, dq, equity = tables["monthly"], tables["program"], tables["dq"], tables["equity"]
+        totals = tables["totals"].iloc[0]
+        bands = read_table(BANDS, fmt) if os.path.exists(table_path(BANDS, fmt)) else None
+        access = tables.get("access")
+        if access is None and os.path.exists(table_path(ACCESS, fmt)):
+            access = read_table(ACCESS, fmt, parse_dates=["period_start"])
+        r["rows"] = len(monthly) + len(program) + len(dq) + len(equity)
+
+    # The PDF embeds the program, equity and access-site figures, so it renders those even without --figures
+    plots = {"program": plot_program_rates, "monthly": plot_monthly_exits, "equity": plot_equity}
+    data = {"program": program, "monthly": monthly, "equity": equity}
+    if bands is not None:
+        plots["bands"], data["bands"] = plot_rate_bands, bands
+    if access is not None and len(access):
+        plots["access"], data["access"] = plot_access_volume, access
+    if not figures:
+        plots = {name: plot for name, plot in plots.items() if pdf and name in EMBEDDED}
+
+    # Each figure renders in its own worker process; the PDF below waits only on the images it embeds.
+    # matplotlib is imported here, before the workers fork, so they inherit it instead of each loading it
+    pool, rendered = None, {}
+    if plots:
+        pyplot()
+        pool = ProcessPoolExecutor(max_workers=jobs)
+        rendered = {name: pool.submit(render, name, plot, data[name], dpi) for name, plot in plots.items()}
+
+    # Top watchlist (optional helper file)
+    watch = dq[dq["watch_flag"] == 1].copy().head(10)
+    watch.to_csv(os.path.join(BASE, "outputs/watchlist_top10.csv"), index=False)
+
+    with stage("analysis", "write_markdown"):
+        write_markdown(totals, bands, access)
+    if pdf:
+        with stage("analysis", "write_pdf"):
+            # Includes any wait for the embedded figures
+            write_pdf(totals, rendered["program"], rendered["equity"], rendered.get("access"))
+    if pool is not None:
+        with stage("analysis", "wait_figures"):
+            for name in rendered.keys() - set(EMBEDDED):
+                rendered[name].result()
+            pool.shutdown()
+
     print("Wrote:")
     print(" -", OUT_MD)
-    print(" -", OUT_PDF)
-    print(" -", FIG_DIR)
+    if pdf:
+        print(" -", OUT_PDF)
+    if figures:
+        print(" -", FIG_DIR)
 
 
 if __name__ == "__main__":
-    main()
+    parser = argparse.ArgumentParser(description="Render figures, report.md and report.pdf from the processed KPIs.")
+    parser.add_argument("--format", dest="fmt", choices=FORMATS, default="csv", help="input table format")
+    parser.add_argument("--dpi", type=int, default=DPI, help="figure resolution")
+    parser.add_argument("--draft", action="store_true", help=f"fast draft run: render figures at {DRAFT_DPI} dpi")
+    parser.add_argument("--jobs", type=int, default=None, help="figure worker processes (default: one per core)")
+    parser.add_argument("--no-figures", dest="figures", action="store_false", help="skip the figures the PDF does not embed")
+    parser.add_argument("--no-pdf", dest="pdf", action="store_false", help="skip report.pdf")
+    instrument.add_arguments(parser)
+    args = parser.parse_args()
+    instrument.configure(args.run_log, args.profile)
+    main(fmt=args.fmt, dpi=DRAFT_DPI if args.draft else args.dpi, jobs=args.jobs, figures=args.figures, pdf=args.pdf)
@@ -0,0 +1,134 @@
+import argparse
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+from src import instrument
+from src.storage import FORMATS
+
+BASE = os.path.dirname(os.path.dirname(__file__))
+
+# Stage-level benchmarks of generate -> ETL -> report at several data sizes. Each size runs in a fresh
+# interpreter inside a scratch copy of src/ and sql/, so memory readings start clean and the repo's own
+# data/ and outputs/ are never touched. Stage records come from src.instrument; results land in OUT_DIR
+# as one JSON document per run.
+OUT_DIR = os.path.join(BASE, "outputs/benchmarks")
+SIZES = [10_000, 100_000, 1_000_000, 10_000_000]
+
+
+def run_scale(episodes: int, seed: int = 42, fmt: str = "csv") -> list:
+    # Runs inside the scratch tree: every module resolves its paths against the scratch BASE. The stage
+    # breakdown is the modules' own instrumentation, collected from a run log in the scratch tree.
+    from src import analysis, generate_data
+    from src import etl_build_metrics as etl
+
+    run_log = os.path.join(BASE, "run.jsonl")
+    instrument.configure(run_log)
+    with instrument.stage("benchmark", "generate_data.main"):
+        generate_data.main(seed=seed, total_clients=episodes, fmt=fmt)
+    with instrument.stage("benchmark", "etl_build_metrics.main"):
+        etl.main(fmt=fmt)
+    with instrument.stage("benchmark", "analysis.main"):
+        analysis.main(fmt=fmt)
+
+    with open(run_log) as f:
+        records = [json.loads(line) for line in f]
+    for record in records:
+        record["episodes"] = episodes
+    return records
+
+
+def environment(seed: int, fmt: str) -> dict:
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=BASE, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    versions = {}
+    for module in ["numpy", "pandas", "pyarrow", "matplotlib", "reportlab"]:
+        try:
+            versions[module] = __import__(module).__version__
+        except ImportError:
+            versions[module] = None
+    return {
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "commit": commit,
+        "seed": seed,
+        "format": fmt,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+        "versions": versions,
+    }
+
+
+def regressions(results: list, baseline_path: str, tolerance: float) -> list:
+    # Stages whose wall time grew by more than `tolerance` against a previous run (tiny stages are noise)
+    with open(baseline_path) as f:
+        old = {(r["episodes"], r["step"], r["stage"]): r for r in json.load(f)["results"]}
+    slower = []
+    for r in results:
+        prev = old.get((r["episodes"], r["step"], r["stage"]))
+        if prev and prev["wall_s"] >= 0.05 and r["wall_s"] > prev["wall_s"] * (1 + tolerance):
+            slower.append({**r, "baseline_wall_s": prev["wall_s"]})
+    return slower
+
+
+def main(sizes: list = SIZES, seed: int = 42, fmt: str = "csv", baseline: str | None = None, tolerance: float = 0.2, keep: bool = False) -> int:
+    os.makedirs(OUT_DIR, exist_ok=True)
+    results = []
+    for episodes in sizes:
+        scratch = tempfile.mkdtemp(prefix=f"hmis-bench-{episodes}-")
+        try:
+            for name in ["src", "sql"]:
+                shutil.copytree(os.path.join(BASE, name), os.path.join(scratch, name), ignore=shutil.ignore_patterns("__pycache__"))
+            out = os.path.join(scratch, "records.json")
+            cmd = [sys.executable, "-m", "src.benchmark", "--worker", str(episodes), "--seed", str(seed), "--format", fmt, "--records", out]
+            print(f"Benchmarking {episodes:,} episodes ...", flush=True)
+            subprocess.run(cmd, cwd=scratch, check=True, stdout=subprocess.DEVNULL)
+            with open(out) as f:
+                records = json.load(f)
+        finally:
+            if not keep:
+                shutil.rmtree(scratch, ignore_errors=True)
+        results.extend(records)
+        for r in records:
+            print(f"  {r['step']:<9} {r['stage']:<32} {r['wall_s']:>9.3f}s wall {r['cpu_s']:>9.3f}s cpu {r['peak_rss_mb']:>9.1f} MB peak")
+
+    run = {"environment": environment(seed, fmt), "results": results}
+    path = os.path.join(OUT_DIR, f"bench-{time.strftime('%Y%m%d-%H%M%S')}.json")
+    with open(path, "w") as f:
+        json.dump(run, f, indent=1)
+    print("Wrote:")
+    print(" -", path)
+
+    if baseline:
+        slower = regressions(results, baseline, tolerance)
+        for r in slower:
+            print(f"REGRESSION {r['episodes']:,} {r['step']}/{r['stage']}: {r['baseline_wall_s']:.3f}s -> {r['wall_s']:.3f}s")
+        return 1 if slower else 0
+    return 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Time and memory-profile generate -> ETL -> report, stage by stage, at several data sizes.")
+    parser.add_argument("--sizes", type=int, nargs="+", default=SIZES, help="episode counts to benchmark")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--format", dest="fmt", choices=FORMATS, default="csv", help="table format for every stage")
+    parser.add_argument("--baseline", default=None, help="earlier results JSON; exit 1 if any stage got slower than --tolerance")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="allowed wall-time growth per stage (0.2 = 20%%)")
+    parser.add_argument("--keep", action="store_true", help="keep the scratch directories with the generated data")
+    parser.add_argument("--worker", type=int, default=None, help=argparse.SUPPRESS)
+    parser.add_argument("--records", default=None, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.worker is not None:
+        with open(args.records, "w") as f:
+            json.dump(run_scale(args.worker, seed=args.seed, fmt=args.fmt), f)
+    else:
+        sys.exit(main(sizes=args.sizes, seed=args.seed, fmt=args.fmt, baseline=args.baseline, tolerance=args.tolerance, keep=args.keep))
@@ -0,0 +1,93 @@
+import numpy as np
+
+# Exact-count calibration of a 0/1 column against several marginal targets at once (e.g. exits per
+# program and per year). Rows are grouped into the cells of the cross of the target dimensions, iterative
+# proportional fitting spreads the total over the cells starting from the generated counts, the fitted
+# cells are rounded so every margin stays exact, and each cell is then filled from a seeded random
+# ordering of its rows. Only the small cell table is visited in Python loops; rows are handled by a few
+# array passes, so calibrating ten million rows is one sort.
+FIT_ITERATIONS = 200
+FIT_TOLERANCE = 1e-9
+
+
+def fit_cells(seed: np.ndarray, capacity: np.ndarray, margins: list) -> np.ndarray:
+    # Iterative proportional fitting of a cell cube to one target vector per axis, never above capacity.
+    # Cells that generated no flags but have rows keep a sliver of weight so their levels can be reached.
+    fit = np.where(capacity > 0, np.maximum(seed, 1e-3), 0.0)
+    axes = range(fit.ndim)
+    for _ in range(FIT_ITERATIONS):
+        for axis, target in enumerate(margins):
+            other = tuple(a for a in axes if a != axis)
+            current = fit.sum(axis=other)
+            factor = np.divide(target, current, out=np.zeros(len(target)), where=current > 0)
+            fit = np.minimum(fit * np.expand_dims(factor, other), capacity)
+        worst = max(np.abs(fit.sum(axis=tuple(a for a in axes if a != i)) - t).max() for i, t in enumerate(margins))
+        if worst < FIT_TOLERANCE:
+            break
+    return fit
+
+
+def round_cells(fit: np.ndarray, capacity: np.ndarray, margins: list) -> np.ndarray:
+    # Integer cells with every margin exact: largest remainders settle the grand total, then each axis in
+    # turn moves single units between cells that agree on every other axis, which leaves the margins
+    # already settled untouched. Each unit goes where it pulls the rounding least away from the fit.
+    out = np.floor(fit).astype(np.int64)
+    short = int(margins[0].sum() - out.sum())
+    flat = out.reshape(-1)
+    order = np.argsort(-(fit - out).reshape(-1), kind="stable")
+    flat[order[(capacity.reshape(-1) > flat)[order]][: max(short, 0)]] += 1
+    if out.sum() != margins[0].sum():
+        raise ValueError(f"calibration targets cannot be met by the {int(capacity.sum())} eligible rows")
+
+    for axis, target in enumerate(margins):
+        o = np.moveaxis(out, axis, 0)
+        shape = o.shape
+        o = o.reshape(len(target), -1).copy()
+        f = np.moveaxis(fit, axis, 0).reshape(len(target), -1)
+        c = np.moveaxis(capacity, axis, 0).reshape(len(target), -1)
+        excess = o.sum(axis=1) - target
+        while excess.any():
+            i, j = int(np.argmax(excess)), int(np.argmin(excess))
+            gain = np.where((o[i] > 0) & (o[j] < c[j]), (f[j] - o[j]) - (f[i] - o[i]), -np.inf)
+            r = int(np.argmax(gain))
+            if gain[r] == -np.inf:
+                raise ValueError(f"calibration targets on axis {axis} cannot be met by the available rows")
+            o[i, r] -= 1
+            o[j, r] += 1
+            excess[i] -= 1
+            excess[j] += 1
+        out = np.moveaxis(o.reshape(shape), 0, axis)
+    return out
+
+
+def calibrate(rng: np.random.Generator, flag: np.ndarray, eligible: np.ndarray, total: int, margins: list) -> np.ndarray:
+    # Returns a copy of the 0/1 `flag` whose eligible rows sum to `total` overall and to each target in
+    # `margins`, a list of (codes, targets) pairs: one level code per row and one count per level, each
+    # summing to `total`. Rows outside `eligible` are left as they are. Existing 1s are kept where the
+    # cell allows, so only the difference is flipped, as random draws without replacement.
+    rows = np.flatnonzero(eligible)
+    margins = list(margins) or [(np.zeros(len(flag), dtype=np.int64), np.array([total]))]
+    for _, targets in margins:
+        if int(np.sum(targets)) != total:
+            raise ValueError(f"marginal targets sum to {int(np.sum(targets))}, not the total of {total}")
+    shape = tuple(len(targets) for _, targets in margins)
+    cell = np.ravel_multi_index(tuple(np.asarray(codes)[rows] for codes, _ in margins), shape)
+    current = flag[rows].astype(np.int64)
+
+    ncells = int(np.prod(shape))
+    capacity = np.bincount(cell, minlength=ncells).reshape(shape)
+    seed = np.bincount(cell, weights=current, minlength=ncells).reshape(shape)
+    targets = [np.asarray(t, dtype=float) for _, t in margins]
+    cells = round_cells(fit_cells(seed, capacity, targets), capacity, targets).reshape(-1)
+
+    # Per cell: current 1s first, then the rest in seeded random order; the first cells[c] become 1. A
+    # random permutation and then a stable sort on (cell, not current) gives that order, and small keys
+    # radix-sort, where a float tie-break key would need a comparison sort
+    perm = rng.permutation(len(rows))
+    key = (2 * cell + 1 - current)[perm]
+    order = perm[np.argsort(key.astype(np.int16) if 2 * ncells < 1 << 15 else key, kind="stable")]
+    sorted_cell = cell[order]
+    rank = np.arange(len(rows)) - np.searchsorted(sorted_cell, sorted_cell)
+    out = flag.copy()
+    out[rows[order]] = rank < cells[sorted_cell]
+    return out
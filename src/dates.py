@@ -0,0 +1,39 @@
+import numpy as np
+import pandas as pd
+
+# Date layer for the ETL. HMIS exports repeat a few thousand distinct dates across millions of rows, so
+# each distinct string is parsed once (explicit ISO format) and remembered for later columns and chunks.
+# Months are carried as integer keys (months since 1970-01) and turned back into timestamps only when an
+# output table is written.
+DATE_FORMAT = "%Y-%m-%d"
+MONTH_NA = np.iinfo(np.int32).max  # missing month; sorts after every real month, like NaT in a groupby
+
+_parsed = {}  # date string -> parsed value, shared by every column and chunk in the process
+
+
+def parse_dates(values: pd.Series) -> pd.Series:
+    if pd.api.types.is_datetime64_any_dtype(values):
+        return values
+    codes, uniques = pd.factorize(values)
+    new = [u for u in uniques if u not in _parsed]
+    if new:
+        try:
+            parsed = pd.to_datetime(pd.Index(new), format=DATE_FORMAT)
+        except ValueError:
+            # Not plain ISO dates: fall back to pandas' own inference for this batch
+            parsed = pd.to_datetime(pd.Index(new))
+        _parsed.update(zip(new, parsed))
+    lookup = pd.DatetimeIndex([_parsed[u] for u in uniques] + [pd.NaT])
+    # factorize marks missing values with -1, which picks the trailing NaT
+    return pd.Series(lookup.take(codes, allow_fill=False), index=values.index, name=values.name)
+
+
+def month_key(dates: pd.Series) -> np.ndarray:
+    months = dates.to_numpy(dtype="datetime64[ns]").astype("datetime64[M]")
+    return np.where(np.isnat(months), MONTH_NA, months.astype(np.int64)).astype(np.int32)
+
+
+def month_start(keys) -> pd.Series:
+    keys = np.asarray(keys, dtype=np.int64)
+    months = np.where(keys == MONTH_NA, np.datetime64("NaT"), keys.astype("datetime64[M]"))
+    return pd.Series(months.astype("datetime64[ns]"))
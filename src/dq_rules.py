@@ -0,0 +1,317 @@
+import argparse
+import ast
+import json
+import os
+
+import numpy as np
+import pandas as pd
+
+from src.storage import FORMATS, ChunkWriter, GroupSpill, read_table, table_path, write_table
+
+BASE = os.path.dirname(os.path.dirname(__file__))
+
+# Record-level data quality rules, evaluated together over the Tableau extract columns (etl.TABLEAU_COLS),
+# which every ETL backend produces. Each rule is a vectorized expression over those columns; all rules
+# run in one pass, their hits are counted per provider x program, and every hit is kept in a drill-down
+# table sorted by (provider, program, rule) with a row-offset index, so a provider's list of offending
+# client_ids is one slice rather than a rescan of the export.
+#
+# A rule's rate divides its hits by the group's episodes or exits. A group is watched when it has at least
+# MIN_EXITS exits and any rule with a max_rate exceeds it; rules without one are monitored (counted, scored
+# by their weight and drillable) but never raise the watch flag. `dq_score` is the weighted sum of rates.
+OUT_SCORES = os.path.join(BASE, "data/processed/dq_rule_scores.csv")
+OUT_DRILLDOWN = os.path.join(BASE, "data/processed/dq_drilldown.csv")
+OUT_DRILLDOWN_INDEX = os.path.join(BASE, "data/processed/dq_drilldown_index.csv")
+
+GROUP_KEYS = ["provider", "program_name"]
+FLAG_COLS = GROUP_KEYS + ["rule", "client_id"]  # one row per hit: the drill-down table
+MIN_EXITS = 30
+
+PERMANENT_DESTINATIONS = [
+    "Rental by client, with ongoing housing subsidy",
+    "Rental by client, no ongoing housing subsidy",
+    "Staying with family (permanent)",
+    "Staying with friends (permanent)",
+]
+TEMPORARY_DESTINATIONS = [
+    "Emergency shelter (voucher)",
+    "Hotel/motel without voucher",
+    "Staying with family (temporary)",
+    "Staying with friends (temporary)",
+    "Place not meant for habitation",
+    "Jail/prison/juvenile detention",
+]
+
+RULES = [
+    # The two original watchlist checks, with their original thresholds
+    {"name": "missing_exit_interview", "when": "exit_interview_completed == 0", "per": "exits", "max_rate": 0.12},
+    {
+        "name": "missing_income",
+        "when": "income_at_exit_range.isin(['Data Not Collected']) & (exited_flag == 1)",
+        "per": "exits",
+        "max_rate": 0.10,
+    },
+    # Completeness
+    {"name": "missing_entry_date", "when": "entry_date.isna()", "per": "episodes", "max_rate": 0.0},
+    {"name": "missing_provider", "when": "provider.isna()", "per": "episodes", "max_rate": 0.0},
+    {"name": "missing_exit_destination", "when": "(exited_flag == 1) & exit_destination.isna()", "per": "exits", "max_rate": 0.0},
+    {"name": "missing_exited_flag", "when": "exited_flag.isna()", "per": "episodes", "max_rate": 0.0},
+    {"name": "unknown_client", "when": "race_ethnicity.isna() & gender.isna() & age_group.isna()", "per": "episodes", "max_rate": 0.0},
+    # Consistency
+    {"name": "exit_before_entry", "when": "exit_date < entry_date", "per": "episodes", "max_rate": 0.0},
+    {"name": "exited_without_exit_date", "when": "(exited_flag == 1) & exit_date.isna()", "per": "episodes", "max_rate": 0.0},
+    {"name": "perm_housing_without_exit", "when": "(permanent_housing_flag == 1) & (exited_flag != 1)", "per": "episodes", "max_rate": 0.0},
+    # Monitored only: the synthetic generator draws destinations independently of these flags
+    {
+        "name": "perm_housing_to_temporary_destination",
+        "when": "(permanent_housing_flag == 1) & exit_destination.isin(TEMPORARY_DESTINATIONS)",
+        "per": "exits",
+        "weight": 0.0,
+    },
+    {
+        "name": "permanent_destination_not_flagged",
+        "when": "(exited_flag == 1) & (permanent_housing_flag == 0) & exit_destination.isin(PERMANENT_DESTINATIONS)",
+        "per": "exits",
+        "weight": 0.0,
+    },
+    {
+        "name": "interview_destination_conflict",
+        "when": "(exit_interview_completed == 1) & (exit_destination == 'No Exit Interview completed')",
+        "per": "exits",
+        "weight": 0.0,
+    },
+    {"name": "stay_over_two_years", "when": "days_in_program > 730", "per": "episodes", "weight": 0.0},
+]
+
+CONSTANTS = {"PERMANENT_DESTINATIONS": PERMANENT_DESTINATIONS, "TEMPORARY_DESTINATIONS": TEMPORARY_DESTINATIONS}
+
+# Rules may come from a JSON file, so an expression is checked against a whitelist before it is compiled:
+# column names and CONSTANTS, literals (and lists of them), comparisons, & | ~, parentheses and the column
+# methods in METHODS. Any other syntax (attributes, subscripts, other calls, lambdas, ...) is rejected.
+METHODS = {"isna": 0, "notna": 0, "isin": 1}  # method -> number of positional arguments
+COMPARISONS = (ast.Eq, ast.NotEq, ast.Lt, ast.LtE, ast.Gt, ast.GtE)
+
+
+def load_rules(path: str | None = None) -> list:
+    # RULES, or a JSON list of rules in the same shape
+    if path is None:
+        return RULES
+    with open(path) as f:
+        return json.load(f)
+
+
+def check_node(node: ast.AST, columns: set):
+    # Raises ValueError on the first node outside the whitelist
+    if isinstance(node, ast.Expression):
+        return check_node(node.body, columns)
+    if isinstance(node, ast.Name):
+        if node.id in columns or node.id in CONSTANTS:
+            return
+        raise ValueError(f"{node.id!r} is not a Tableau extract column or a rule constant")
+    if isinstance(node, ast.Constant) and (node.value is None or isinstance(node.value, (bool, int, float, str))):
+        return
+    if isinstance(node, (ast.List, ast.Tuple)):
+        for elt in node.elts:
+            if not isinstance(elt, ast.Constant):
+                raise ValueError("lists in rules may only hold literals")
+            check_node(elt, columns)
+        return
+    if isinstance(node, ast.BinOp) and isinstance(node.op, (ast.BitAnd, ast.BitOr)):
+        check_node(node.left, columns)
+        return check_node(node.right, columns)
+    if isinstance(node, ast.UnaryOp) and isinstance(node.op, (ast.Invert, ast.USub)):
+        return check_node(node.operand, columns)
+    if isinstance(node, ast.Compare) and all(isinstance(op, COMPARISONS) for op in node.ops):
+        for operand in [node.left, *node.comparators]:
+            check_node(operand, columns)
+        return
+    if (
+        isinstance(node, ast.Call)
+        and isinstance(node.func, ast.Attribute)
+        and node.func.attr in METHODS
+        and isinstance(node.func.value, ast.Name)
+        and node.func.value.id in columns
+        and len(node.args) == METHODS[node.func.attr]
+        and not node.keywords
+    ):
+        for arg in node.args:
+            check_node(arg, columns)
+        return
+    raise ValueError(f"{ast.unparse(node)!r} is not allowed in a rule")
+
+
+def compile_rules(rules: list) -> list:
+    # Expressions are checked (check_node) and compiled once; evaluation sees only the frame's columns and CONSTANTS
+    from src.etl_build_metrics import TABLEAU_COLS
+
+    names = [r["name"] for r in rules]
+    if len(set(names)) != len(names):
+        raise ValueError("data quality rule names must be unique")
+    compiled = []
+    for r in rules:
+        if r.get("per", "episodes") not in ("episodes", "exits"):
+            raise ValueError(f"rule {r['name']!r}: 'per' must be 'episodes' or 'exits'")
+        try:
+            tree = ast.parse(r["when"], f"<dq rule {r['name']}>", mode="eval")
+            check_node(tree, set(TABLEAU_COLS))
+        except (SyntaxError, ValueError) as e:
+            raise ValueError(f"rule {r['name']!r}: {e}") from None
+        compiled.append((r["name"], compile(tree, f"<dq rule {r['name']}>", "eval")))
+    return compiled
+
+
+class _Columns(dict):
+    # Namespace that fetches frame columns on first use, so rules touch only the columns they name
+    def __init__(self, df: pd.DataFrame):
+        super().__init__(CONSTANTS)
+        self.df = df
+
+    def __missing__(self, name: str):
+        if name not in self.df.columns:
+            raise NameError(f"data quality rules can only use the Tableau extract columns; {name!r} is not one")
+        self[name] = self.df[name]
+        return self[name]
+
+
+def evaluate(df: pd.DataFrame, compiled: list, keys: list = GROUP_KEYS) -> dict:
+    # One pass: every rule's mask stacked into a rows x rules matrix, whose nonzero cells are the hits.
+    # Counts per `keys` group and the hit list both come from those cells. Finer keys than GROUP_KEYS (the
+    # incremental ETL's partitions) reduce to the provider x program counts with sum_counts.
+    from src.etl_build_metrics import factorize_keys
+
+    namespace = _Columns(df)
+    hits = np.empty((len(df), len(compiled)), dtype=bool)
+    for j, (name, code) in enumerate(compiled):
+        mask = eval(code, {"__builtins__": {}}, namespace)
+        mask = pd.Series(mask, index=df.index) if np.ndim(mask) else pd.Series(bool(mask), index=df.index)
+        # Comparisons against missing values (nullable columns) count as no hit
+        hits[:, j] = mask.fillna(False).to_numpy(dtype=bool)
+    row, rule = np.nonzero(hits)
+
+    group, counts = factorize_keys(df, keys)
+    counts["episodes"] = np.bincount(group, minlength=len(counts))
+    counts["exits"] = np.bincount(group, weights=(df["exited_flag"] == 1).to_numpy(dtype=float, na_value=0), minlength=len(counts)).astype(np.int64)
+    per_rule = np.bincount(group[row] * len(compiled) + rule, minlength=len(counts) * len(compiled))
+    for j, (name, _) in enumerate(compiled):
+        counts[name] = per_rule[j :: len(compiled)]
+
+    flags = df[keys + ["client_id"]].iloc[row].reset_index(drop=True)
+    flags.insert(len(keys), "rule", pd.Categorical.from_codes(rule, [name for name, _ in compiled]))
+    return {"counts": counts, "flags": flags}
+
+
+def add_counts(a: pd.DataFrame | None, b: pd.DataFrame) -> pd.DataFrame:
+    # Rule counts of two chunks of one export, added per group
+    return b if a is None else sum_counts(pd.concat([a, b], ignore_index=True))
+
+
+def flag_spill() -> GroupSpill:
+    # Hit lists of a chunked build, spilled per provider x program as chunks arrive (write each chunk's
+    # evaluate()["flags"]), so only the rule counts stay in memory; write_drilldown reads one group at a time
+    return GroupSpill(GROUP_KEYS, {"rule": str, "client_id": str})
+
+
+def sum_counts(counts: pd.DataFrame, keys: list = GROUP_KEYS) -> pd.DataFrame:
+    # Rule counts added up per `keys` group; every column but the keys is a count
+    from src.etl_build_metrics import factorize_keys
+
+    inverse, out = factorize_keys(counts, keys)
+    for col in counts.columns.drop(keys):
+        out[col] = np.bincount(inverse, weights=counts[col].to_numpy(dtype=float), minlength=len(out)).astype(np.int64)
+    return out
+
+
+def scores(counts: pd.DataFrame, rules: list) -> pd.DataFrame:
+    # One row per provider x program x rule: hits, denominator, rate and whether the rule's max_rate is breached
+    tables = []
+    for r in rules:
+        per = counts[r.get("per", "episodes")].to_numpy()
+        flagged = counts[r["name"]].to_numpy()
+        rate = np.divide(flagged, per, out=np.zeros(len(per)), where=per > 0)
+        max_rate = r.get("max_rate")
+        out = counts[GROUP_KEYS].copy()
+        out["rule"] = r["name"]
+        out["flagged"] = flagged
+        out["denominator"] = per
+        out["rate"] = rate
+        out["max_rate"] = np.nan if max_rate is None else max_rate
+        out["weight"] = r.get("weight", 1.0)
+        out["breached"] = (rate > max_rate).astype(int) if max_rate is not None else 0
+        tables.append(out)
+    return pd.concat(tables, ignore_index=True)
+
+
+def watchlist(dq: pd.DataFrame, scored: pd.DataFrame) -> pd.DataFrame:
+    # Adds watch_flag, rules_breached and dq_score to the provider x program DQ table and ranks it
+    per_group = (
+        scored.assign(weighted=scored["rate"] * scored["weight"])
+        .groupby(GROUP_KEYS, dropna=False, sort=False, observed=True)
+        .agg(rules_breached=("breached", "sum"), dq_score=("weighted", "sum"))
+        .reset_index()
+    )
+    dq = dq.merge(per_group, on=GROUP_KEYS, how="left")
+    dq["rules_breached"] = dq["rules_breached"].fillna(0).astype(int)
+    dq["dq_score"] = dq["dq_score"].fillna(0.0)
+    dq["watch_flag"] = ((dq["exited_clients"] >= MIN_EXITS) & (dq["rules_breached"] > 0)).astype(int)
+    return dq.sort_values(
+        ["watch_flag", "dq_score", "missing_exit_interview_rate", "missing_income_rate"],
+        ascending=[False, False, False, False],
+        kind="stable",
+    )
+
+
+def drilldown_tables(flags: pd.DataFrame):
+    # Hits sorted by (provider, program, rule, client_id), and the start row and length of each group's run
+    flags = flags.sort_values(["provider", "program_name", "rule", "client_id"], kind="stable", na_position="last")
+    flags = flags.reset_index(drop=True)
+    index = flags.groupby(["provider", "program_name", "rule"], dropna=False, sort=False, observed=True).size()
+    index = index.reset_index(name="rows")
+    index.insert(3, "start", np.cumsum(index["rows"].to_numpy()) - index["rows"].to_numpy())
+    return flags, index
+
+
+def write_drilldown(flags, rules: list, fmt: str = "csv") -> pd.DataFrame:
+    # Writes the drill-down table and returns its index. `flags` is evaluate()'s hit list, or a flag_spill()
+    # whose groups are sorted and written one at a time
+    if isinstance(flags, pd.DataFrame):
+        drill, index = drilldown_tables(flags)
+        write_table(drill, OUT_DRILLDOWN, fmt)
+        return index
+    names = [r["name"] for r in rules]
+    writer, indexes, start = ChunkWriter(OUT_DRILLDOWN, fmt), [], 0
+    for group in flags.buckets():
+        group["rule"] = pd.Categorical(group["rule"], names)
+        drill, index = drilldown_tables(group)
+        index["start"] += start
+        writer.write(drill)
+        indexes.append(index)
+        start += len(drill)
+    writer.close()
+    if not indexes:
+        return write_drilldown(pd.DataFrame({k: [] for k in FLAG_COLS}).astype({"rule": pd.CategoricalDtype(names)}), rules, fmt)
+    return pd.concat(indexes, ignore_index=True)
+
+
+def drilldown(provider: str, program_name: str, rule: str | None = None, fmt: str = "csv") -> pd.DataFrame:
+    # Offending records for one provider x program (optionally one rule), read through the index
+    index = read_table(OUT_DRILLDOWN_INDEX, fmt)
+    hit = index[(index["provider"] == provider) & (index["program_name"] == program_name)]
+    if rule is not None:
+        hit = hit[hit["rule"] == rule]
+    parts = []
+    for start, rows in zip(hit["start"], hit["rows"]):
+        if fmt == "csv":
+            parts.append(pd.read_csv(table_path(OUT_DRILLDOWN, fmt), skiprows=range(1, int(start) + 1), nrows=int(rows)))
+        else:
+            parts.append(read_table(OUT_DRILLDOWN, fmt).iloc[int(start) : int(start + rows)])
+    return pd.concat(parts, ignore_index=True) if parts else pd.DataFrame(columns=FLAG_COLS)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="List the records behind a provider x program's data quality flags.")
+    parser.add_argument("provider")
+    parser.add_argument("program_name")
+    parser.add_argument("--rule", default=None, help="only this rule (default: every rule with hits)")
+    parser.add_argument("--format", dest="fmt", choices=FORMATS, default="csv", help="processed table format")
+    args = parser.parse_args()
+    print(drilldown(args.provider, args.program_name, args.rule, args.fmt).to_string(index=False))
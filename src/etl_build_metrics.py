@@ -1,6 +1,25 @@
+import argparse
 import os
+
+import numpy as np
 import pandas as pd
 
+from src import dq_rules, instrument
+from src.intervals import (
+    census,
+    census_monthly,
+    concurrent_enrollments,
+    episodes,
+    interval_counts,
+    interval_index,
+    length_of_stay,
+    merge_counts,
+    returns_to_homelessness,
+)
+from src.dates import month_key, month_start, parse_dates
+from src.instrument import stage
+from src.storage import CATEGORY_DTYPES, FORMATS, ChunkWriter, ClientSpill, compact, concat_compact, iter_table, read_table, table_path, write_table
+
 BASE = os.path.dirname(os.path.dirname(__file__))
 
 RAW_CLIENTS = os.path.join(BASE, "data/raw/clients.csv")
@@ -10,111 +29,632 @@ OUT_KPIS_MONTHLY = os.path.join(BASE, "data/processed/system_kpis_monthly.csv")
 OUT_PROGRAM_KPIS = os.path.join(BASE, "data/processed/program_kpis.csv")
 OUT_DQ = os.path.join(BASE, "data/processed/data_quality_watchlist.csv")
 OUT_TABLEAU = os.path.join(BASE, "data/processed/tableau_extract.csv")
+# Report inputs, so analysis never re-reads or re-merges the raw files
+OUT_EQUITY = os.path.join(BASE, "data/processed/equity_perm_by_race.csv")
+OUT_TOTALS = os.path.join(BASE, "data/processed/headline_totals.csv")
+# Cross-episode metrics from the per-client interval index (src.intervals)
+OUT_RETURNS = os.path.join(BASE, "data/processed/returns_to_homelessness.csv")
+OUT_CONCURRENT = os.path.join(BASE, "data/processed/concurrent_enrollments.csv")
+# Census and length-of-stay KPIs from event sweeps over the same episodes
+OUT_CENSUS = os.path.join(BASE, "data/processed/census_daily.csv")
+OUT_CENSUS_MONTHLY = os.path.join(BASE, "data/processed/census_monthly.csv")
+OUT_LOS = os.path.join(BASE, "data/processed/length_of_stay_distribution.csv")
 
+# Tableau extract (flattened)
+TABLEAU_COLS = [
+    "client_id",
+    "program_name",
+    "provider",
+    "entry_date",
+    "exit_date",
+    "days_in_program",
+    "exited_flag",
+    "permanent_housing_flag",
+    "exit_interview_completed",
+    "exit_destination",
+    "income_at_exit_range",
+    "year",
+    "household_type",
+    "age_group",
+    "race_ethnicity",
+    "gender",
+]
 
-def month_floor(d: pd.Series) -> pd.Series:
-    dt = pd.to_datetime(d, errors="coerce")
-    return dt.dt.to_period("M").dt.to_timestamp()
+CLIENT_PREFIX = "C"  # client IDs are CLIENT_PREFIX + zero-padded digits (generate_data.client_id_labels)
 
+# Finest grain every KPI table rolls up from (streaming partial aggregates)
+PARTIAL_KEYS = ["exit_month", "provider", "program_name"]
+PARTIAL_SUMS = ["exited_flag", "permanent_housing_flag", "missing_exit_interview", "income_missing_flag"]
+# Length-of-stay quantiles, read off the (group, days_in_program) histogram the partials carry. The
+# histogram is exact and merges by adding counts, so chunks, partitions and incremental runs combine losslessly.
+DAYS_QUANTILES = {"median_days_in_program": 0.5, "p90_days_in_program": 0.9, "p99_days_in_program": 0.99}
+# Added after the median: kept as the last columns of each table so existing Tableau sources keep their
+# column positions, and reported in whole days
+TAIL_QUANTILES = ["p90_days_in_program", "p99_days_in_program"]
 
-def main():
-    clients = pd.read_csv(RAW_CLIENTS)
-    eng = pd.read_csv(RAW_ENG)
+# KPI table layouts shared by every backend (rate columns follow, then TAIL_QUANTILES)
+MONTHLY_COLS = [
+    "exit_month",
+    "exited_clients",
+    "exits_to_perm_housing",
+    "missing_exit_interviews",
+    "median_days_in_program",
+    *TAIL_QUANTILES,
+]
+PROGRAM_COLS = [
+    "program_name",
+    "total_clients",
+    "exited_clients",
+    "exits_to_perm_housing",
+    "median_days_in_program",
+    "missing_exit_interviews",
+    *TAIL_QUANTILES,
+]
+DQ_COLS = [
+    "provider",
+    "program_name",
+    "exited_clients",
+    "missing_exit_interviews",
+    "missing_income",
+    "median_days_in_program",
+    *TAIL_QUANTILES,
+]
 
-    eng["entry_date"] = pd.to_datetime(eng["entry_date"])
-    eng["exit_date"] = pd.to_datetime(eng["exit_date"])
-    eng["entry_month"] = month_floor(eng["entry_date"])
-    eng["exit_month"] = month_floor(eng["exit_date"])
-    eng["days_in_program"] = (eng["exit_date"] - eng["entry_date"]).dt.days.clip(lower=0)
 
-    df = eng.merge(clients, on="client_id", how="left", validate="many_to_one", suffixes=("", "_client"))
+def add_episode_fields(eng: pd.DataFrame) -> pd.DataFrame:
+    with stage("etl", "parse_dates") as r:
+        eng["entry_date"] = parse_dates(eng["entry_date"])
+        eng["exit_date"] = parse_dates(eng["exit_date"])
+        r["rows"] = len(eng)
+    with stage("etl", "month_keys") as r:
+        # Integer month keys (src.dates); output tables convert them back with month_start
+        eng["entry_month"] = month_key(eng["entry_date"])
+        eng["exit_month"] = month_key(eng["exit_date"])
+        # Nullable ints: a missing exit date must not turn the whole column (or one chunk of it) into floats
+        eng["days_in_program"] = (eng["exit_date"] - eng["entry_date"]).dt.days.clip(lower=0).astype("Int64")
+        r["rows"] = len(eng)
+    return eng
 
-    # Monthly KPIs
-    monthly = (
-        df.groupby("exit_month", dropna=False)
-        .agg(
-            exited_clients=("exited_flag", "sum"),
-            exits_to_perm_housing=("permanent_housing_flag", "sum"),
-            missing_exit_interviews=("exit_interview_completed", lambda s: (s == 0).sum()),
-            median_days_in_program=("days_in_program", "median"),
-        )
-        .reset_index()
-        .sort_values("exit_month")
-    )
+
+def tail_last(table: pd.DataFrame) -> pd.DataFrame:
+    return table[[c for c in table.columns if c not in TAIL_QUANTILES] + TAIL_QUANTILES]
+
+
+def finalize_monthly(monthly: pd.DataFrame) -> pd.DataFrame:
     monthly["perm_housing_rate"] = (monthly["exits_to_perm_housing"] / monthly["exited_clients"]).fillna(0)
     monthly["missing_exit_interview_rate"] = (monthly["missing_exit_interviews"] / monthly["exited_clients"]).fillna(0)
+    return tail_last(monthly)
 
-    os.makedirs(os.path.join(BASE, "data/processed"), exist_ok=True)
-    monthly.to_csv(OUT_KPIS_MONTHLY, index=False)
-
-    # Program KPIs
-    program = (
-        df.groupby(["program_name"], dropna=False)
-        .agg(
-            total_clients=("client_id", "nunique"),
-            exited_clients=("exited_flag", "sum"),
-            exits_to_perm_housing=("permanent_housing_flag", "sum"),
-            median_days_in_program=("days_in_program", "median"),
-            missing_exit_interviews=("exit_interview_completed", lambda s: (s == 0).sum()),
-        )
-        .reset_index()
-    )
+
+def finalize_program(program: pd.DataFrame) -> pd.DataFrame:
     program["perm_housing_rate"] = (program["exits_to_perm_housing"] / program["exited_clients"]).fillna(0)
     program["missing_exit_interview_rate"] = (program["missing_exit_interviews"] / program["exited_clients"]).fillna(0)
-    program.to_csv(OUT_PROGRAM_KPIS, index=False)
-
-    # Data Quality Watchlist
-    df["income_missing_flag"] = df["income_at_exit_range"].isin(["Data Not Collected"]) & (df["exited_flag"] == 1)
-
-    dq = (
-        df.groupby(["provider", "program_name"], dropna=False)
-        .agg(
-            exited_clients=("exited_flag", "sum"),
-            missing_exit_interviews=("exit_interview_completed", lambda s: (s == 0).sum()),
-            missing_income=("income_missing_flag", "sum"),
-            median_days_in_program=("days_in_program", "median"),
-        )
-        .reset_index()
-    )
+    return tail_last(program)
+
+
+def finalize_dq(dq: pd.DataFrame) -> pd.DataFrame:
     dq["missing_exit_interview_rate"] = (dq["missing_exit_interviews"] / dq["exited_clients"]).fillna(0)
     dq["missing_income_rate"] = (dq["missing_income"] / dq["exited_clients"]).fillna(0)
-    dq["watch_flag"] = (
-        (dq["exited_clients"] >= 30)
-        & ((dq["missing_exit_interview_rate"] > 0.12) | (dq["missing_income_rate"] > 0.10))
-    ).astype(int)
-
-    dq.sort_values(
-        ["watch_flag", "missing_exit_interview_rate", "missing_income_rate"],
-        ascending=[False, False, False],
-    ).to_csv(OUT_DQ, index=False)
-
-    # Tableau extract (flattened)
-    tableau_cols = [
-        "client_id",
-        "program_name",
-        "provider",
-        "entry_date",
-        "exit_date",
-        "days_in_program",
-        "exited_flag",
-        "permanent_housing_flag",
-        "exit_interview_completed",
-        "exit_destination",
-        "income_at_exit_range",
-        "year",
-        "household_type",
-        "age_group",
-        "race_ethnicity",
-        "gender",
-    ]
-    df[tableau_cols].to_csv(OUT_TABLEAU, index=False)
+    # watch_flag and the ranking come from the rule engine (dq_rules.watchlist)
+    return dq
+
+
+def finalize_equity(equity: pd.DataFrame) -> pd.DataFrame:
+    equity["perm_rate"] = equity["perm_exits"] / equity["exited_clients"]
+    return equity.sort_values("perm_rate", ascending=False)
+
+
+def unique_inverse(codes: np.ndarray):
+    # np.unique(codes, return_inverse=True), via a bincount instead of a sort when the code space is small
+    if len(codes) and 0 <= codes.min() and codes.max() < max(4 * len(codes), 1 << 16):
+        present = np.bincount(codes) > 0
+        remap = np.cumsum(present) - 1
+        return np.flatnonzero(present), remap[codes]
+    return np.unique(codes, return_inverse=True)
+
+
+def factorize_keys(df: pd.DataFrame, keys: list):
+    # One joint integer code per row for a multi-column key, in groupby(sort=True, dropna=False) order
+    codes = np.zeros(len(df), dtype=np.int64)
+    levels = []
+    for k in keys:
+        c, u = pd.factorize(df[k], sort=True, use_na_sentinel=False)
+        codes = codes * max(len(u), 1) + c
+        levels.append(pd.Index(u))
+    groups, inverse = unique_inverse(codes)
+
+    labels = {}
+    rem = groups
+    for k, u in reversed(list(zip(keys, levels))):
+        labels[k] = u.take(rem % max(len(u), 1))
+        rem = rem // max(len(u), 1)
+    return inverse, pd.DataFrame({k: labels[k] for k in keys})
+
+
+def group_sums(inverse: np.ndarray, values: pd.DataFrame, out: pd.DataFrame) -> pd.DataFrame:
+    for col in PARTIAL_SUMS:
+        weights = np.nan_to_num(values[col].to_numpy(dtype=float))
+        out[col] = np.bincount(inverse, weights=weights, minlength=len(out)).astype(np.int64)
+    return out
+
+
+def equity_pairs(pairs: pd.DataFrame) -> pd.DataFrame:
+    # Exited episodes deduplicated to (race_ethnicity, client_key), keeping each pair's permanent housing exits
+    inverse, out = factorize_keys(pairs, ["race_ethnicity", "client_key"])
+    out["perm_exits"] = np.bincount(
+        inverse, weights=np.nan_to_num(pairs["perm_exits"].to_numpy(dtype=float)), minlength=len(out)
+    ).astype(np.int64)
+    return out
+
+
+def days_histogram(group: np.ndarray, days: np.ndarray, n: np.ndarray) -> pd.DataFrame:
+    # (group, days_in_program) -> count, deduplicated on the pair packed into one int64
+    width = int(days.max()) + 1 if len(days) else 1
+    packed, inverse = unique_inverse(group * width + days)
+    return pd.DataFrame(
+        {
+            "group": packed // width,
+            "days_in_program": packed % width,
+            "n": np.bincount(inverse, weights=n, minlength=len(packed)).astype(np.int64),
+        }
+    )
+
+
+def weighted_quantiles(group: np.ndarray, days: np.ndarray, n: np.ndarray, ngroups: int, qs) -> list:
+    # Quantiles per group from (group, days, count) rows, interpolated between the two nearest order
+    # statistics like np.quantile's default (the median is the mean of the two middle values)
+    total = np.bincount(group, weights=n, minlength=ngroups).astype(np.int64)
+    if not len(days):
+        return [np.full(ngroups, np.nan) for _ in qs]
+    order = np.lexsort((days, group))
+    days = days[order]
+    cum = np.cumsum(n[order])
+    start = np.cumsum(total) - total
+
+    def order_stat(k: np.ndarray) -> np.ndarray:
+        return days[np.minimum(np.searchsorted(cum, start + k, side="right"), len(days) - 1)]
+
+    out = []
+    for q in qs:
+        rank = (total - 1) * q
+        k = np.floor(rank).astype(np.int64)
+        lo, hi = order_stat(k), order_stat(np.minimum(k + 1, total - 1))
+        out.append(np.where(total > 0, lo + (hi - lo) * (rank - k), np.nan))
+    return out
+
+
+def set_days_quantiles(out: pd.DataFrame, quantiles: list) -> pd.DataFrame:
+    # The median keeps its half days (mean of the two middle episodes); the tail quantiles round to whole days
+    for col, values in zip(DAYS_QUANTILES, quantiles):
+        out[col] = pd.array(np.round(values), dtype="Int64") if col in TAIL_QUANTILES else values
+    return out
+
+
+def days_quantiles(hist: pd.DataFrame, keys: list) -> pd.DataFrame:
+    # DAYS_QUANTILES per `keys` group from a (keys..., days_in_program, n) histogram, e.g. the SQLite one
+    inverse, out = factorize_keys(hist, keys)
+    quantiles = weighted_quantiles(
+        inverse, hist["days_in_program"].to_numpy(np.int64), hist["n"].to_numpy(), len(out), DAYS_QUANTILES.values()
+    )
+    return set_days_quantiles(out, quantiles)
+
+
+def client_hash(client_id: pd.Series) -> np.ndarray:
+    # Stable 64-bit client keys so distinct-client sets merge across chunks (exact barring hash collisions)
+    return pd.util.hash_array(client_id.to_numpy(dtype=object))
+
+
+def client_numbers(client_id: pd.Series, width: int) -> np.ndarray:
+    # "C00001" -> 1, read from the fixed-width characters; anything but the prefix and `width` digits is -1
+    chars = np.asarray(client_id.fillna(""), dtype=f"U{width + 2}").view(np.uint32).reshape(-1, width + 2)
+    digits = chars[:, 1 : width + 1] - np.uint32(ord("0"))  # non-digits wrap around to large values
+    ok = (chars[:, 0] == ord(CLIENT_PREFIX)) & (chars[:, -1] == 0) & (digits <= 9).all(axis=1)
+    return np.where(ok, digits @ 10 ** np.arange(width - 1, -1, -1, dtype=np.int64), -1)
+
+
+def client_lookup(client_id: pd.Series):
+    # Maps a column of client IDs to row positions in the client table (-1: no such client). Packed IDs
+    # index a dense position array; IDs that do not pack fall back to a hash lookup on the strings.
+    if not client_id.is_unique:
+        raise pd.errors.MergeError("client_id is not unique in the clients table")
+    packable = pd.api.types.is_string_dtype(client_id) and len(client_id)
+    width = int(client_id.str.len().max()) - 1 if packable else 0
+    numbers = client_numbers(client_id, width) if 0 < width <= 18 else np.full(len(client_id), -1)
+    if (numbers < 0).any() or numbers.max(initial=0) >= 4 * len(numbers) + (1 << 16):
+        index = pd.Index(client_id)
+        return lambda ids: index.get_indexer(ids)
+
+    positions = np.full(numbers.max(initial=0) + 1, -1, dtype=np.int64)
+    positions[numbers] = np.arange(len(numbers))
+
+    def rows(ids: pd.Series) -> np.ndarray:
+        n = client_numbers(ids, width)
+        return np.where((n >= 0) & (n < len(positions)), positions[np.clip(n, 0, len(positions) - 1)], -1)
+
+    return rows
+
+
+def client_codes(client_id: pd.Series, rows: np.ndarray, nclients: int) -> np.ndarray:
+    # Dense client keys for a single pass: the client table row, with unknown IDs numbered after the table
+    codes = rows.astype(np.int64)
+    unknown = codes < 0
+    if unknown.any():
+        codes[unknown] = nclients + pd.factorize(client_id[unknown], use_na_sentinel=False)[0]
+    return codes
+
+
+def load_clients(fmt: str = "csv", frame: pd.DataFrame | None = None, chunksize: int | None = None) -> pd.DataFrame:
+    # One row per client: attributes as sorted categoricals, disability flags as int8. `frame` is the
+    # generated table when generate_data ran in the same process, and replaces the file read. With
+    # `chunksize` the file is parsed and compacted a chunk at a time, so parsing never holds the whole
+    # table as text (the streaming build's memory bound)
+    if frame is None and chunksize:
+        chunks = [compact(chunk, dates=False) for chunk in iter_table(RAW_CLIENTS, fmt, chunksize=chunksize, dtype=CATEGORY_DTYPES)]
+        if chunks:
+            return concat_compact(chunks)
+    if frame is None:
+        frame = read_table(RAW_CLIENTS, fmt, dtype=CATEGORY_DTYPES)
+    return compact(frame, dates=False)
+
+
+def load_engagements(fmt: str = "csv", frame: pd.DataFrame | None = None) -> pd.DataFrame:
+    if frame is None:
+        frame = read_table(RAW_ENG, fmt, dtype=CATEGORY_DTYPES)
+    return compact(frame, dates=False)
+
+
+def nullable(col: pd.Series) -> pd.Series:
+    # Integer attributes (year, disability flags) as nullable ints: an episode whose client_id is not in the
+    # client table gets <NA>, not a float column, so every chunk of the extract prints years alike
+    if pd.api.types.is_integer_dtype(col) and not isinstance(col.dtype, pd.api.extensions.ExtensionDtype):
+        return col.astype(col.dtype.name.capitalize())
+    return col
+
+
+def join_clients(eng: pd.DataFrame, clients: pd.DataFrame, rows: np.ndarray | None = None) -> pd.DataFrame:
+    # Left join of client attributes onto episodes as a positional take (same columns as
+    # eng.merge(clients, on="client_id", how="left", suffixes=("", "_client")))
+    if rows is None:
+        rows = client_lookup(clients["client_id"])(eng["client_id"])
+    attrs = {
+        (c + "_client" if c in eng.columns else c): pd.api.extensions.take(nullable(clients[c]).array, rows, allow_fill=True)
+        for c in clients.columns
+        if c != "client_id"
+    }
+    return pd.concat([eng, pd.DataFrame(attrs, index=eng.index)], axis=1)
+
+
+def episode_indicators(df: pd.DataFrame) -> pd.DataFrame:
+    # The PARTIAL_SUMS columns, one 0/1 value per episode
+    return pd.DataFrame(
+        {
+            "exited_flag": df["exited_flag"],
+            "permanent_housing_flag": df["permanent_housing_flag"],
+            "missing_exit_interview": df["exit_interview_completed"] == 0,
+            "income_missing_flag": df["income_at_exit_range"].isin(["Data Not Collected"]) & (df["exited_flag"] == 1),
+        }
+    )
+
+
+def aggregate_partials(df: pd.DataFrame, client_key: np.ndarray | None = None, dense: bool = False) -> dict:
+    # Shared aggregation kernel: indicator columns are built once, the PARTIAL_KEYS grain is factorized
+    # once, and every KPI table rolls up from the resulting bincounts and days histogram. client_key is
+    # either client_hash keys (mergeable across chunks and runs) or, with dense=True, client_codes
+    group, sums = factorize_keys(df, PARTIAL_KEYS)
+    sums = group_sums(group, episode_indicators(df), sums)
+
+    days = df["days_in_program"].to_numpy(dtype=float, na_value=np.nan)
+    valid = ~np.isnan(days)
+    hist = days_histogram(group[valid], days[valid].astype(np.int64), np.ones(int(valid.sum())))
+
+    # Distinct (program, client) pairs; a single in-memory pass can use small dense codes
+    if client_key is None:
+        client_key, dense = pd.factorize(df["client_id"])[0], True
+    if dense:
+        prog, programs = pd.factorize(df["program_name"], use_na_sentinel=False)
+        width = max(len(programs), 1)
+        pairs = unique_inverse(client_key * width + prog)[0]
+        clients = pd.DataFrame({"program_name": pd.Index(programs).take(pairs % width), "client_key": pairs // width})
+    else:
+        clients = pd.DataFrame({"program_name": df["program_name"], "client_key": client_key}).drop_duplicates()
+
+    exited = (df["exited_flag"] == 1).to_numpy()
+    equity = equity_pairs(
+        pd.DataFrame(
+            {
+                "race_ethnicity": df["race_ethnicity"].to_numpy()[exited],
+                "client_key": client_key[exited],
+                "perm_exits": df["permanent_housing_flag"].to_numpy()[exited],
+            }
+        )
+    )
+    return {"sums": sums, "hist": hist, "clients": clients, "equity": equity}
+
+
+def merge_partials(a: dict, b: dict) -> dict:
+    if a is None:
+        return b
+    stacked = pd.concat([a["sums"], b["sums"]], ignore_index=True)
+    inverse, sums = factorize_keys(stacked, PARTIAL_KEYS)
+    sums = group_sums(inverse, stacked, sums)
+
+    # Re-point both histograms at the merged group ids before combining counts
+    group = np.concatenate(
+        [inverse[a["hist"]["group"].to_numpy()], inverse[len(a["sums"]) + b["hist"]["group"].to_numpy()]]
+    )
+    hist = pd.concat([a["hist"], b["hist"]], ignore_index=True)
+    hist = days_histogram(group, hist["days_in_program"].to_numpy(), hist["n"].to_numpy())
+
+    merged = {"sums": sums, "hist": hist}
+    if "clients" in a:
+        merged["clients"] = pd.concat([a["clients"], b["clients"]]).drop_duplicates()
+        merged["equity"] = equity_pairs(pd.concat([a["equity"], b["equity"]], ignore_index=True))
+    return merged
+
+
+def rollup(partials: dict, keys: list) -> pd.DataFrame:
+    inverse, out = factorize_keys(partials["sums"], keys)
+    out = group_sums(inverse, partials["sums"], out)
+    hist = partials["hist"]
+    quantiles = weighted_quantiles(
+        inverse[hist["group"].to_numpy()],
+        hist["days_in_program"].to_numpy(),
+        hist["n"].to_numpy(),
+        len(out),
+        DAYS_QUANTILES.values(),
+    )
+    out = set_days_quantiles(out, quantiles)
+    return out.rename(
+        columns={
+            "exited_flag": "exited_clients",
+            "permanent_housing_flag": "exits_to_perm_housing",
+            "missing_exit_interview": "missing_exit_interviews",
+            "income_missing_flag": "missing_income",
+        }
+    )
+
+
+def program_clients(clients: pd.DataFrame) -> pd.Series:
+    # Distinct clients per program, from deduplicated (program_name, client_key) pairs
+    return clients.groupby("program_name", dropna=False, sort=True).size()
+
+
+def race_exits(pairs: pd.DataFrame) -> pd.DataFrame:
+    # Exited clients and permanent housing exits per race/ethnicity (missing race included), from equity_pairs
+    return pairs.groupby("race_ethnicity", dropna=False, sort=True, observed=True).agg(
+        exited_clients=("client_key", "size"), perm_exits=("perm_exits", "sum")
+    )
+
+
+def spilled_counts(clients: ClientSpill, equity: ClientSpill):
+    # program_clients and race_exits over pairs spilled by client key. A client's pairs all sit in one
+    # bucket, so deduplicating bucket by bucket and adding the counts is exact, and only one bucket is
+    # in memory at a time
+    per_program = [program_clients(bucket.drop_duplicates()) for bucket in clients.buckets()]
+    per_race = [race_exits(equity_pairs(bucket)) for bucket in equity.buckets()]
+    return (
+        pd.concat(per_program).groupby(level=0, dropna=False, sort=True).sum(),
+        pd.concat(per_race).groupby(level=0, dropna=False, sort=True).sum(),
+    )
+
+
+def kpis_from_partials(partials: dict, total_clients: int, counts: tuple | None = None):
+    # counts: (program_clients, race_exits) when the streaming build has already reduced its spilled
+    # pairs; otherwise they come from the pairs in the partials
+    per_program, per_race = counts or (program_clients(partials["clients"]), race_exits(partials["equity"]))
+    monthly = rollup(partials, ["exit_month"])[MONTHLY_COLS]
+    monthly = monthly.sort_values("exit_month")
+    monthly["exit_month"] = month_start(monthly["exit_month"]).to_numpy()
+    monthly = finalize_monthly(monthly)
+
+    program = rollup(partials, ["program_name"])
+    program.insert(1, "total_clients", per_program.reindex(program["program_name"]).to_numpy())
+    program = finalize_program(program[PROGRAM_COLS])
+
+    dq = rollup(partials, ["provider", "program_name"])[DQ_COLS]
+
+    # Equity cut over exited clients with a known race/ethnicity; the headline totals count every exit
+    equity = per_race[per_race.index.notna()].reset_index()
+    totals = pd.DataFrame(
+        {
+            "total_clients": [total_clients],
+            "total_exits": [int(partials["sums"]["exited_flag"].sum())],
+            "perm_housing_exits": [int(per_race["perm_exits"].sum())],
+        }
+    )
+    return monthly, program, finalize_dq(dq), finalize_equity(equity), totals
+
+
+def build_streaming(chunksize: int, fmt: str = "csv", rules: list | None = None):
+    with stage("etl", "read_clients") as r:
+        clients = load_clients(fmt, chunksize=chunksize)
+        lookup = client_lookup(clients["client_id"])
+        r["rows"] = len(clients)
+
+    compiled = dq_rules.compile_rules(rules or dq_rules.RULES)
+    partials, rule_counts = None, None
+    # Rule hits grow with the export: only their per-group counts are added up in memory, the hit list
+    # itself is spilled per provider x program and becomes the drill-down one group at a time
+    flags = dq_rules.flag_spill()
+    # Distinct-client pairs grow with the number of clients, not the chunk, so they are spilled to disk
+    # by client key and counted bucket by bucket at the end rather than merged in memory
+    program_pairs = ClientSpill(["program_name"], {})
+    race_pairs = ClientSpill(["race_ethnicity"], {"perm_exits": np.int64})
+    # Returns and concurrency follow each client across chunks: episodes are spilled the same way and the
+    # interval index runs over one bucket (a set of whole clients) at a time
+    spilled_episodes = ClientSpill(["program_name"], {"entry": np.int32, "exit": np.int32, "perm_exit": bool})
+    tableau = ChunkWriter(OUT_TABLEAU, fmt)
+    with stage("etl", "stream_engagements") as streamed:
+        streamed["rows"] = 0
+        for eng in iter_table(RAW_ENG, fmt, chunksize=chunksize, dtype=CATEGORY_DTYPES):
+            eng = add_episode_fields(compact(eng, dates=False))
+            with stage("etl", "merge") as r:
+                df = join_clients(eng, clients, lookup(eng["client_id"]))
+                r["rows"] = len(df)
+            with stage("etl", "write_tableau") as r:
+                tableau.write(df[TABLEAU_COLS])
+                r["rows"] = len(df)
+            with stage("etl", "dq_rules") as r:
+                hits = dq_rules.evaluate(df[TABLEAU_COLS], compiled)
+                rule_counts = dq_rules.add_counts(rule_counts, hits["counts"])
+                flags.write(hits["flags"])
+                r["rows"] = len(df)
+            with stage("etl", "aggregate") as r:
+                client_key = client_hash(df["client_id"])
+                chunk = aggregate_partials(df, client_key)
+                program_pairs.write(chunk.pop("clients"))
+                race_pairs.write(chunk.pop("equity"))
+                partials = merge_partials(partials, chunk)
+                spilled_episodes.write(episodes(df, client_key).rename(columns={"client": "client_key"}))
+                r["rows"] = len(partials["sums"])
+            streamed["rows"] += len(df)
+        tableau.close()
+
+    with stage("etl", "distinct_clients") as r:
+        counts = spilled_counts(program_pairs, race_pairs)
+        r["rows"] = program_pairs.rows + race_pairs.rows
+    with stage("etl", "interval_counts") as r:
+        pieces = [interval_counts(*interval_index(b.rename(columns={"client_key": "client"}))) for b in spilled_episodes.buckets()]
+        intervals = merge_counts(pieces)
+        r["rows"] = spilled_episodes.rows
+    for spill in (program_pairs, race_pairs, spilled_episodes):
+        spill.close()
+    with stage("etl", "kpi_tables"):
+        hits = {"counts": rule_counts, "flags": flags}
+        return *kpis_from_partials(partials, clients["client_id"].nunique(), counts), intervals, hits
+
+
+def build_in_memory(fmt: str = "csv", rules: list | None = None, raw: dict | None = None):
+    raw = raw or {}
+    with stage("etl", "read_clients") as r:
+        clients = load_clients(fmt, raw.get("clients"))
+        r["rows"] = len(clients)
+    with stage("etl", "read_engagements") as r:
+        eng = load_engagements(fmt, raw.get("engagements"))
+        r["rows"] = len(eng)
+    eng = add_episode_fields(eng)
+
+    with stage("etl", "merge") as r:
+        rows = client_lookup(clients["client_id"])(eng["client_id"])
+        df = join_clients(eng, clients, rows)
+        r["rows"] = len(df)
+    with stage("etl", "write_tableau") as r:
+        write_table(df[TABLEAU_COLS], OUT_TABLEAU, fmt)
+        r["rows"] = len(df)
+    with stage("etl", "dq_rules") as r:
+        hits = dq_rules.evaluate(df[TABLEAU_COLS], dq_rules.compile_rules(rules or dq_rules.RULES))
+        r["rows"] = len(df)
+
+    with stage("etl", "aggregate") as r:
+        client_key = client_codes(df["client_id"], rows, len(clients))
+        partials = aggregate_partials(df, client_key, dense=True)
+        r["rows"] = len(partials["sums"])
+    with stage("etl", "interval_counts") as r:
+        intervals = interval_counts(*interval_index(episodes(df, client_key)))
+        r["rows"] = len(df)
+    with stage("etl", "kpi_tables"):
+        return *kpis_from_partials(partials, clients["client_id"].nunique()), intervals, hits
+
+
+def main(
+    chunksize: int | None = None,
+    fmt: str = "csv",
+    incremental: bool = False,
+    backend: str = "pandas",
+    rules: str | None = None,
+    raw: dict | None = None,
+):
+    # `raw`: generate_data's frames when it ran in the same process; only the in-memory build uses them,
+    # the streaming, incremental and sqlite builds read the files it also wrote
+    os.makedirs(os.path.join(BASE, "data/processed"), exist_ok=True)
+    rules = dq_rules.load_rules(rules)
+
+    if backend == "sqlite":
+        from src.sql_backend import build_sqlite
+
+        with stage("etl", "build_sqlite"):
+            monthly, program, dq, equity, totals, intervals, hits = build_sqlite(fmt, rules)
+    elif incremental:
+        from src.incremental import build_incremental
+
+        with stage("etl", "build_incremental") as r:
+            monthly, program, dq, equity, totals, intervals, hits, summary = build_incremental(fmt, rules)
+            r.update(summary)
+    elif chunksize:
+        monthly, program, dq, equity, totals, intervals, hits = build_streaming(chunksize, fmt, rules)
+    else:
+        monthly, program, dq, equity, totals, intervals, hits = build_in_memory(fmt, rules, raw)
+
+    # Rule counts from every backend share one scoring and ranking; the hits become the drill-down index
+    with stage("etl", "dq_watchlist") as r:
+        scored = dq_rules.scores(hits["counts"], rules)
+        dq = tail_last(dq_rules.watchlist(dq, scored))
+        r["rows"] = len(scored)
+    with stage("etl", "write_dq_drilldown") as r:
+        # Chunked builds hand over a spill of the hits, written out one provider x program at a time
+        drill_index = dq_rules.write_drilldown(hits["flags"], rules, fmt)
+        r["rows"] = int(drill_index["rows"].sum())
+        if not isinstance(hits["flags"], pd.DataFrame):
+            hits["flags"].close()
+
+    # Returns, concurrent enrollments, census and length of stay span months and partitions; every backend
+    # hands over the same per-program interval count tables (src.intervals.COUNT_KEYS)
+    with stage("etl", "interval_metrics") as r:
+        returns = returns_to_homelessness(intervals)
+        concurrent = concurrent_enrollments(intervals)
+        r["rows"] = len(intervals["returns"])
+    with stage("etl", "census") as r:
+        daily = census(intervals)
+        monthly_census = census_monthly(daily)
+        los = length_of_stay(intervals)
+        r["rows"] = len(daily)
 
     print("Wrote:")
-    print(" -", OUT_KPIS_MONTHLY)
-    print(" -", OUT_PROGRAM_KPIS)
-    print(" -", OUT_DQ)
-    print(" -", OUT_TABLEAU)
+    for table, path in [
+        (monthly, OUT_KPIS_MONTHLY),
+        (program, OUT_PROGRAM_KPIS),
+        (dq, OUT_DQ),
+        (equity, OUT_EQUITY),
+        (totals, OUT_TOTALS),
+        (returns, OUT_RETURNS),
+        (concurrent, OUT_CONCURRENT),
+        (daily, OUT_CENSUS),
+        (monthly_census, OUT_CENSUS_MONTHLY),
+        (los, OUT_LOS),
+        (scored, dq_rules.OUT_SCORES),
+        (drill_index, dq_rules.OUT_DRILLDOWN_INDEX),
+    ]:
+        with stage("etl", "write_" + os.path.splitext(os.path.basename(path))[0]) as r:
+            print(" -", write_table(table, path, fmt))
+            r["rows"] = len(table)
+    print(" -", table_path(dq_rules.OUT_DRILLDOWN, fmt))
+    print(" -", table_path(OUT_TABLEAU, fmt))
+    # The report tables, for src.analysis in the same process
+    return {"monthly": monthly, "program": program, "dq": dq, "equity": equity, "totals": totals}
 
 
 if __name__ == "__main__":
-    main()
+    parser = argparse.ArgumentParser(description="Build KPI tables and the Tableau extract from raw HMIS-style CSVs.")
+    parser.add_argument(
+        "--chunksize",
+        type=int,
+        default=None,
+        help="stream program_engagements in chunks of this many rows (bounded memory)",
+    )
+    parser.add_argument("--format", dest="fmt", choices=FORMATS, default="csv", help="raw input and processed output format")
+    parser.add_argument(
+        "--incremental",
+        action="store_true",
+        help="reuse per-partition state in data/processed/state and recompute only changed exit_month x provider x program partitions",
+    )
+    parser.add_argument(
+        "--backend",
+        choices=["pandas", "sqlite"],
+        default="pandas",
+        help="sqlite: bulk-load the raw files into data/processed/hmis.sqlite and run the KPIs in sql/queries.sql",
+    )
+    parser.add_argument("--dq-rules", default=None, help="JSON list of data quality rules (default: src.dq_rules.RULES)")
+    instrument.add_arguments(parser)
+    args = parser.parse_args()
+    instrument.configure(args.run_log, args.profile)
+    main(chunksize=args.chunksize, fmt=args.fmt, incremental=args.incremental, backend=args.backend, rules=args.dq_rules)
@@ -1,30 +1,131 @@
+import argparse
+import json
 import os
 import random
-from datetime import datetime, timedelta
 
 import numpy as np
 import pandas as pd
 
+from src import instrument
+from src.calibrate import calibrate
+from src.instrument import stage
+from src.storage import FORMATS, write_table
+
 BASE = os.path.dirname(os.path.dirname(__file__))
 
 OUT_CLIENTS = os.path.join(BASE, "data/raw/clients.csv")
 OUT_ENG = os.path.join(BASE, "data/raw/program_engagements.csv")
 OUT_ACCESS = os.path.join(BASE, "data/raw/access_site_engagements.csv")
 
-
-def main(seed: int = 42):
+# Calibrated to publicly reported totals (Coming Home Annual Report 2022–2023)
+TOTAL_CLIENTS = 2495
+YEAR_SPLIT = {2022: 1047, 2023: 1448}
+EXITS_TOTAL = 2261
+EXITS_PERM_HOUSING = 855
+
+# Program volumes (reported program counts used as anchors)
+PROGRAM_SIZES = {"HHCM": 291, "SHI": 358, "CEA": 240}
+PROGRAM_SIZES["OTHER_COC"] = TOTAL_CLIENTS - sum(PROGRAM_SIZES.values())
+
+# Multi-episode histories (--episodes-per-client > 1): later episodes are concurrent enrollments with this
+# probability, otherwise returns after a lognormal gap in days (median ~ e^5.3 = 200 days)
+CONCURRENT_SHARE = 0.15
+RETURN_GAP_MEAN = 5.3
+RETURN_GAP_SIGMA = 0.9
+
+
+def scale_counts(counts: dict, total: int) -> dict:
+    # Largest-remainder apportionment: keeps the reported proportions and sums exactly to total
+    keys = list(counts)
+    raw = np.array([counts[k] for k in keys], dtype=float)
+    raw = raw / raw.sum() * total
+    out = np.floor(raw).astype(np.int64)
+    short = int(total - out.sum())
+    out[np.argsort(-(raw - out), kind="stable")[:short]] += 1
+    return dict(zip(keys, out.tolist()))
+
+
+# Flags that take marginal targets (--targets): {flag: {dimension: {level: count}}}, e.g.
+# {"exits": {"program_name": {"HHCM": 250, ...}}, "perm_housing": {"year": {"2022": 360, "2023": 495}}}
+MARGIN_FLAGS = {"exits": "exits_total", "perm_housing": "exits_perm_housing"}
+
+
+def calibrated_targets(scale: float = 1.0, total_clients: int | None = None, margins: dict | None = None) -> dict:
+    n = int(total_clients) if total_clients is not None else int(round(TOTAL_CLIENTS * scale))
+    ratio = n / TOTAL_CLIENTS
+    targets = {
+        "total_clients": n,
+        "year_split": scale_counts(YEAR_SPLIT, n),
+        "program_sizes": scale_counts(PROGRAM_SIZES, n),
+        "exits_total": int(round(EXITS_TOTAL * ratio)),
+        "exits_perm_housing": int(round(EXITS_PERM_HOUSING * ratio)),
+    }
+    margins = margins or {}
+    unknown = set(margins) - set(MARGIN_FLAGS)
+    if unknown:
+        raise ValueError(f"unknown calibration targets {sorted(unknown)}; expected {sorted(MARGIN_FLAGS)}")
+    # Each reported marginal is apportioned to its flag's system total, so every dimension agrees on it
+    for flag, total in MARGIN_FLAGS.items():
+        targets[flag + "_margins"] = {
+            dim: scale_counts({str(k): v for k, v in counts.items()}, targets[total])
+            for dim, counts in margins.get(flag, {}).items()
+        }
+    return targets
+
+
+def margin_targets(spec: dict, dims: dict) -> list:
+    # {dimension: {level: count}} -> (codes, targets) pairs for src.calibrate, in each dimension's level order
+    out = []
+    for dim, counts in spec.items():
+        if dim not in dims:
+            raise ValueError(f"unknown calibration dimension {dim!r}; expected one of {sorted(dims)}")
+        codes, labels = dims[dim]
+        labels = [str(x) for x in labels]
+        missing, extra = set(labels) - set(counts), set(counts) - set(labels)
+        if missing or extra:
+            raise ValueError(f"{dim} targets must list exactly its levels (missing {sorted(missing)}, unknown {sorted(extra)})")
+        out.append((codes, np.array([counts[x] for x in labels], dtype=np.int64)))
+    return out
+
+
+def client_id_labels(n: int) -> np.ndarray:
+    # "C00001"-style IDs built from digit arrays; zero-padded to a fixed width so they sort
+    width = max(5, len(str(n)))
+    digits = (np.arange(1, n + 1)[:, None] // 10 ** np.arange(width - 1, -1, -1)) % 10
+    buf = np.empty((n, width + 1), dtype=np.uint8)
+    buf[:, 0] = ord("C")
+    buf[:, 1:] = digits + ord("0")
+    return buf.view(f"S{width + 1}").ravel().astype(str)
+
+
+def choice_codes(rng: np.random.Generator, p, size: int) -> np.ndarray:
+    # Index draws instead of rng.choice(labels): keeps columns as compact integer codes
+    return rng.choice(len(p), size=size, p=p).astype(np.int16)
+
+
+def episode_durations(rng: np.random.Generator, is_shi: np.ndarray, is_hhcm: np.ndarray) -> np.ndarray:
+    # Program duration assumptions: lognormal(mean, sigma) clipped to [lo, hi] days
+    mean = np.select([is_shi, is_hhcm], [6.0, 5.2], 5.0)
+    sigma = np.select([is_shi, is_hhcm], [0.6, 0.5], 0.6)
+    lo = np.select([is_shi, is_hhcm], [60, 14], 7)
+    hi = np.select([is_shi, is_hhcm], [900, 240], 365)
+    return np.clip(rng.lognormal(mean=mean, sigma=sigma), lo, hi).astype(np.int64)
+
+
+def generate(
+    seed: int = 42,
+    scale: float = 1.0,
+    total_clients: int | None = None,
+    episodes_per_client: float = 1.0,
+    margins: dict | None = None,
+):
     rng = np.random.default_rng(seed)
     random.seed(seed)
 
-    # Calibrated to publicly reported totals (Coming Home Annual Report 2022–2023)
-    TOTAL_CLIENTS = 2495
-    YEAR_SPLIT = {2022: 1047, 2023: 1448}
-    EXITS_TOTAL = 2261
-    EXITS_PERM_HOUSING = 855
-
-    # Program volumes (reported program counts used as anchors)
-    PROGRAM_SIZES = {"HHCM": 291, "SHI": 358, "CEA": 240}
-    PROGRAM_SIZES["OTHER_COC"] = TOTAL_CLIENTS - sum(PROGRAM_SIZES.values())
+    targets = calibrated_targets(scale, total_clients, margins)
+    n = targets["total_clients"]
+    year_split = targets["year_split"]
+    program_sizes = targets["program_sizes"]
 
     # Demographic distributions (based on report charts; approximations)
     age_groups = ["Under 5","5-12","13-17","18-24","25-34","35-44","45-54","55-64","65+"]
@@ -111,176 +212,235 @@ def main(seed: int = 42):
     shi_exit_probs = np.array([0.20, 0.14, 0.17, 0.11, 0.06, 0.11, 0.03, 0.09, 0.06, 0.03])
     shi_exit_probs = shi_exit_probs / shi_exit_probs.sum()
 
+    other_exit_dest = [
+        "Rental by client, with ongoing housing subsidy",
+        "Rental by client, no ongoing housing subsidy",
+        "Staying with family (temporary)",
+        "Staying with friends (temporary)",
+        "Emergency shelter (voucher)",
+        "No Exit Interview completed",
+        "Other",
+    ]
+    other_exit_probs = np.array([0.18, 0.18, 0.18, 0.18, 0.12, 0.06, 0.10])
+
     # Providers in system (simulate 17 providers)
     providers = [f"Provider_{i:02d}" for i in range(1, 18)]
     provider_probs = rng.dirichlet(np.ones(len(providers)))  # uneven, realistic
 
     # Client IDs
-    client_ids = [f"C{str(i).zfill(5)}" for i in range(1, TOTAL_CLIENTS + 1)]
+    client_ids = client_id_labels(n)
 
     # Assign year totals
-    years = [2022] * YEAR_SPLIT[2022] + [2023] * YEAR_SPLIT[2023]
+    years = np.repeat(list(year_split), list(year_split.values()))
     rng.shuffle(years)
 
     # Assign primary program
-    program_labels = (
-        ["HHCM"] * PROGRAM_SIZES["HHCM"]
-        + ["SHI"] * PROGRAM_SIZES["SHI"]
-        + ["CEA"] * PROGRAM_SIZES["CEA"]
-        + ["OTHER_COC"] * PROGRAM_SIZES["OTHER_COC"]
-    )
-    rng.shuffle(program_labels)
+    programs = list(program_sizes)
+    prog = np.repeat(np.arange(len(programs), dtype=np.int8), list(program_sizes.values()))
+    rng.shuffle(prog)
+    provider_codes = choice_codes(rng, provider_probs, n)
 
     clients = pd.DataFrame(
         {
             "client_id": client_ids,
             "year": years,
-            "household_type": rng.choice(hh_types, size=TOTAL_CLIENTS, p=hh_probs),
-            "age_group": rng.choice(age_groups, size=TOTAL_CLIENTS, p=age_probs),
-            "race_ethnicity": rng.choice(race_groups, size=TOTAL_CLIENTS, p=race_probs),
-            "gender": rng.choice(gender_groups, size=TOTAL_CLIENTS, p=gender_probs),
-            "primary_program": program_labels,
-            "provider": rng.choice(providers, size=TOTAL_CLIENTS, p=provider_probs),
+            "household_type": pd.Categorical.from_codes(choice_codes(rng, hh_probs, n), hh_types),
+            "age_group": pd.Categorical.from_codes(choice_codes(rng, age_probs, n), age_groups),
+            "race_ethnicity": pd.Categorical.from_codes(choice_codes(rng, race_probs, n), race_groups),
+            "gender": pd.Categorical.from_codes(choice_codes(rng, gender_probs, n), gender_groups),
+            "primary_program": pd.Categorical.from_codes(prog, programs),
+            "provider": pd.Categorical.from_codes(provider_codes, providers),
         }
     )
 
     for d in disability_types:
         col = f"dis_{d.replace(' ', '_').replace('/', '_')}"
-        clients[col] = (rng.random(TOTAL_CLIENTS) < disability_base_probs[d]).astype(int)
-
-    def random_date_in_year(y: int) -> datetime:
-        start = datetime(y, 1, 1)
-        end = datetime(y, 12, 31)
-        return start + timedelta(days=int(rng.integers(0, (end - start).days + 1)))
-
-    # 1 episode per client (simple but realistic for a POC)
-    rows = []
-    for _, row in clients.iterrows():
-        y = int(row["year"])
-        entry = random_date_in_year(y)
-        prog = row["primary_program"]
-
-        # Program duration assumptions
-        if prog == "SHI":
-            dur_days = int(np.clip(rng.lognormal(mean=6.0, sigma=0.6), 60, 900))
-        elif prog == "HHCM":
-            dur_days = int(np.clip(rng.lognormal(mean=5.2, sigma=0.5), 14, 240))
-        else:
-            dur_days = int(np.clip(rng.lognormal(mean=5.0, sigma=0.6), 7, 365))
-
-        exit_date = entry + timedelta(days=dur_days)
-
-        # Clip to end of 2023 window
-        if exit_date > datetime(2023, 12, 31):
-            exit_date = datetime(2023, 12, 31)
-            exited = 0
-        else:
-            exited = 1
-
-        # Exit interview completeness
-        missing_exit_interview = rng.random() < (0.08 if prog in ["HHCM", "SHI"] else 0.05)
-        exit_interview_completed = 0 if missing_exit_interview else 1
-
-        # Permanent housing probability
-        perm_prob = 0.32 if prog == "SHI" else (0.35 if prog == "HHCM" else 0.30)
-        perm = 1 if (exited and rng.random() < perm_prob) else 0
-
-        # Destination
-        if prog == "SHI":
-            dest = rng.choice(shi_exit_dest, p=shi_exit_probs)
-        elif prog == "HHCM":
-            dest = rng.choice(hhcm_exit_dest, p=hhcm_exit_probs)
-        else:
-            dest = rng.choice(
-                [
-                    "Rental by client, with ongoing housing subsidy",
-                    "Rental by client, no ongoing housing subsidy",
-                    "Staying with family (temporary)",
-                    "Staying with friends (temporary)",
-                    "Emergency shelter (voucher)",
-                    "No Exit Interview completed",
-                    "Other",
-                ],
-                p=[0.18, 0.18, 0.18, 0.18, 0.12, 0.06, 0.10],
-            )
-
-        if missing_exit_interview:
-            dest = "No Exit Interview completed"
-
-        income = rng.choice(income_bins, p=income_probs) if exited else "Data Not Collected"
-
-        rows.append(
-            {
-                "client_id": row["client_id"],
-                "program_name": prog,
-                "provider": row["provider"],
-                "entry_date": entry.date().isoformat(),
-                "exit_date": exit_date.date().isoformat(),
-                "exited_flag": exited,
-                "exit_interview_completed": exit_interview_completed,
-                "exit_destination": dest,
-                "income_at_exit_range": income,
-                "permanent_housing_flag": perm,
-            }
+        clients[col] = (rng.random(n) < disability_base_probs[d]).astype(int)
+
+    # Primary episode: one per client, the calibrated snapshot
+    is_shi = prog == programs.index("SHI")
+    is_hhcm = prog == programs.index("HHCM")
+
+    # Entry date: uniform day within the client's year
+    year_start = (years - 1970).astype("datetime64[Y]").astype("datetime64[D]")
+    year_len = ((years - 1969).astype("datetime64[Y]").astype("datetime64[D]") - year_start).astype(np.int64)
+    entry = year_start + rng.integers(0, year_len)
+    dur_days = episode_durations(rng, is_shi, is_hhcm)
+
+    # Optional later episodes, each chained to the client's previous one: a return after a gap, or a
+    # concurrent enrollment that starts while the previous episode is still open
+    client_idx, primary = np.arange(n), np.ones(n, dtype=bool)
+    if episodes_per_client > 1:
+        share = np.array(list(program_sizes.values()), dtype=float)
+        share = share / share.sum()
+        parts = [(client_idx, prog, provider_codes, entry, dur_days)]
+        who, prev_entry, prev_dur = client_idx, entry, dur_days
+        remaining = rng.poisson(episodes_per_client - 1, size=n)
+        while (remaining > 0).any():
+            more = remaining > 0
+            who, prev_entry, prev_dur, remaining = who[more], prev_entry[more], prev_dur[more], remaining[more] - 1
+            k = len(who)
+            concurrent = rng.random(k) < CONCURRENT_SHARE
+            gap = np.ceil(rng.lognormal(mean=RETURN_GAP_MEAN, sigma=RETURN_GAP_SIGMA, size=k)).astype(np.int64)
+            start = np.where(concurrent, prev_entry + rng.integers(0, np.maximum(prev_dur, 1)), prev_entry + prev_dur + gap)
+            p = choice_codes(rng, share, k).astype(np.int8)
+            d = episode_durations(rng, p == programs.index("SHI"), p == programs.index("HHCM"))
+            parts.append((who, p, choice_codes(rng, provider_probs, k), start, d))
+            prev_entry, prev_dur = start, d
+
+        client_idx, prog, provider_codes, entry, dur_days = (np.concatenate(c) for c in zip(*parts))
+        primary = np.arange(len(client_idx)) < n
+        # Episodes starting after the reporting window are never observed; rows ordered by client, then entry
+        keep = np.flatnonzero(entry <= np.datetime64(f"{max(year_split)}-12-31"))
+        keep = keep[np.lexsort((entry[keep], client_idx[keep]))]
+        client_idx, prog, provider_codes, entry, dur_days, primary = (
+            a[keep] for a in (client_idx, prog, provider_codes, entry, dur_days, primary)
         )
+        is_shi = prog == programs.index("SHI")
+        is_hhcm = prog == programs.index("HHCM")
+    m = len(client_idx)
+
+    exit_date = entry + dur_days
+
+    # Clip to end of reporting window
+    window_end = np.datetime64(f"{max(year_split)}-12-31")
+    exited = (exit_date <= window_end).astype(int)
+    exit_date = np.minimum(exit_date, window_end)
+
+    # Exit interview completeness
+    missing_exit_interview = rng.random(m) < np.where(is_shi | is_hhcm, 0.08, 0.05)
+    exit_interview_completed = (~missing_exit_interview).astype(int)
+
+    # Permanent housing probability
+    perm_prob = np.select([is_shi, is_hhcm], [0.32, 0.35], 0.30)
+    perm = ((exited == 1) & (rng.random(m) < perm_prob)).astype(int)
+
+    # Destination: draw within each program's table, then map onto one shared category list
+    dest_labels = list(dict.fromkeys(hhcm_exit_dest + shi_exit_dest + other_exit_dest))
+    dest = np.empty(m, dtype=np.int16)
+    for mask, labels, p in [
+        (is_shi, shi_exit_dest, shi_exit_probs),
+        (is_hhcm, hhcm_exit_dest, hhcm_exit_probs),
+        (~(is_shi | is_hhcm), other_exit_dest, other_exit_probs),
+    ]:
+        lookup = np.array([dest_labels.index(x) for x in labels], dtype=np.int16)
+        dest[mask] = lookup[choice_codes(rng, p, int(mask.sum()))]
+
+    dest[missing_exit_interview] = dest_labels.index("No Exit Interview completed")
+
+    income = choice_codes(rng, income_probs, m)
+    income[exited == 0] = income_bins.index("Data Not Collected")
+
+    # Calibrate exact exits, then permanent housing exits among them, to the system totals and any marginal
+    # targets (src.calibrate). Only primary episodes are calibrated; later episodes are extra history
+    # beyond the reported snapshot.
+    dims = {
+        "program_name": (prog, programs),
+        "provider": (provider_codes, providers),
+        "year": (np.searchsorted(sorted(year_split), years)[client_idx], sorted(year_split)),
+    }
+    for col in ["race_ethnicity", "household_type", "age_group", "gender"]:
+        dims[col] = (clients[col].cat.codes.to_numpy()[client_idx], clients[col].cat.categories)
+    with stage("generate", "calibrate") as r:
+        exited = calibrate(rng, exited, primary, targets["exits_total"], margin_targets(targets["exits_margins"], dims))
+        perm = calibrate(
+            rng,
+            perm & exited,
+            primary & (exited == 1),
+            targets["exits_perm_housing"],
+            margin_targets(targets["perm_housing_margins"], dims),
+        )
+        r["rows"] = m
 
-    engagements = pd.DataFrame(rows)
-
-    # Calibrate exact system totals for exits and perm housing
-    current_exits = int(engagements["exited_flag"].sum())
-    if current_exits != EXITS_TOTAL:
-        idx_open = engagements.index[engagements["exited_flag"] == 0].tolist()
-        idx_exit = engagements.index[engagements["exited_flag"] == 1].tolist()
-        if current_exits < EXITS_TOTAL:
-            flip = rng.choice(idx_open, size=EXITS_TOTAL - current_exits, replace=False)
-            engagements.loc[flip, "exited_flag"] = 1
-        else:
-            flip = rng.choice(idx_exit, size=current_exits - EXITS_TOTAL, replace=False)
-            engagements.loc[flip, "exited_flag"] = 0
-
-    exited_idx = engagements.index[engagements["exited_flag"] == 1].tolist()
-    current_perm = int(engagements.loc[exited_idx, "permanent_housing_flag"].sum())
-    if current_perm != EXITS_PERM_HOUSING:
-        perm_idx = engagements.index[
-            (engagements["exited_flag"] == 1) & (engagements["permanent_housing_flag"] == 1)
-        ].tolist()
-        nonperm_idx = engagements.index[
-            (engagements["exited_flag"] == 1) & (engagements["permanent_housing_flag"] == 0)
-        ].tolist()
-        if current_perm < EXITS_PERM_HOUSING:
-            flip = rng.choice(nonperm_idx, size=EXITS_PERM_HOUSING - current_perm, replace=False)
-            engagements.loc[flip, "permanent_housing_flag"] = 1
-        else:
-            flip = rng.choice(perm_idx, size=current_perm - EXITS_PERM_HOUSING, replace=False)
-            engagements.loc[flip, "permanent_housing_flag"] = 0
+    engagements = pd.DataFrame(
+        {
+            "client_id": client_ids[client_idx],
+            "program_name": pd.Categorical.from_codes(prog, programs),
+            "provider": pd.Categorical.from_codes(provider_codes, providers),
+            "entry_date": entry,
+            "exit_date": exit_date,
+            "exited_flag": exited,
+            "exit_interview_completed": exit_interview_completed,
+            "exit_destination": pd.Categorical.from_codes(dest, dest_labels),
+            "income_at_exit_range": pd.Categorical.from_codes(income, income_bins),
+            "permanent_housing_flag": perm,
+        }
+    )
 
     engagements.loc[engagements["exit_interview_completed"] == 0, "exit_destination"] = "No Exit Interview completed"
 
-    # Physical access site engagements (reported counts)
-    access_sites = [
-        ("Unity Square Community Center, New Brunswick", 91),
-        ("Middlesex College Resource Hub, Edison", 31),
-        ("First Presbyterian Church of Metuchen, Metuchen", 41),
-        ("Center for Support, Success & Prosperity, Perth Amboy", 71),
-    ]
-    access_rows = []
-    start = datetime(2023, 6, 1)
-    for site, n in access_sites:
-        for _ in range(n):
-            dt = start + timedelta(days=int(rng.integers(0, 240)))
-            access_rows.append({"site": site, "engagement_date": dt.date().isoformat()})
-    access_df = pd.DataFrame(access_rows)
+    # Physical access site engagements (reported counts, scaled with the client population)
+    access_sites = {
+        "Unity Square Community Center, New Brunswick": 91,
+        "Middlesex College Resource Hub, Edison": 31,
+        "First Presbyterian Church of Metuchen, Metuchen": 41,
+        "Center for Support, Success & Prosperity, Perth Amboy": 71,
+    }
+    access_counts = scale_counts(access_sites, int(round(sum(access_sites.values()) * n / TOTAL_CLIENTS)))
+    start = np.datetime64("2023-06-01")
+    access_df = pd.DataFrame(
+        {
+            "site": np.repeat(list(access_counts), list(access_counts.values())),
+            "engagement_date": start + rng.integers(0, 240, size=sum(access_counts.values())),
+        }
+    )
 
-    os.makedirs(os.path.join(BASE, "data/raw"), exist_ok=True)
-    clients.to_csv(OUT_CLIENTS, index=False)
-    engagements.to_csv(OUT_ENG, index=False)
-    access_df.to_csv(OUT_ACCESS, index=False)
+    return clients, engagements, access_df
+
+
+def main(
+    seed: int = 42,
+    scale: float = 1.0,
+    total_clients: int | None = None,
+    fmt: str = "csv",
+    episodes_per_client: float = 1.0,
+    targets: str | None = None,
+):
+    margins = None
+    if targets:
+        with open(targets) as f:
+            margins = json.load(f)
+    with stage("generate", "synthesize") as r:
+        clients, engagements, access_df = generate(
+            seed=seed, scale=scale, total_clients=total_clients, episodes_per_client=episodes_per_client, margins=margins
+        )
+        r["rows"] = len(engagements)
 
+    os.makedirs(os.path.join(BASE, "data/raw"), exist_ok=True)
     print("Wrote:")
-    print(" -", OUT_CLIENTS)
-    print(" -", OUT_ENG)
-    print(" -", OUT_ACCESS)
+    for table, path in [(clients, OUT_CLIENTS), (engagements, OUT_ENG), (access_df, OUT_ACCESS)]:
+        with stage("generate", "write_" + os.path.splitext(os.path.basename(path))[0]) as r:
+            print(" -", write_table(table, path, fmt))
+            r["rows"] = len(table)
+    # Handed on to the ETL when both run in one process (python -m src run)
+    return {"clients": clients, "engagements": engagements, "access": access_df}
 
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Generate synthetic HMIS-style raw data.")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--scale", type=float, default=1.0, help="multiplier on the calibrated 2,495-client population")
+    parser.add_argument("--total-clients", type=int, default=None, help="exact client count (overrides --scale)")
+    parser.add_argument("--format", dest="fmt", choices=FORMATS, default="csv", help="raw table format")
+    parser.add_argument(
+        "--episodes-per-client",
+        type=float,
+        default=1.0,
+        help="mean episodes per client; above 1 adds returns and concurrent enrollments after each primary episode",
+    )
+    parser.add_argument(
+        "--targets",
+        default=None,
+        help="JSON file of marginal targets for exits / perm_housing by program_name, year, provider or a client attribute",
+    )
+    instrument.add_arguments(parser)
+    args = parser.parse_args()
+    instrument.configure(args.run_log, args.profile)
+    main(
+        seed=args.seed,
+        scale=args.scale,
+        total_clients=args.total_clients,
+        fmt=args.fmt,
+        episodes_per_client=args.episodes_per_client,
+        targets=args.targets,
+    )
@@ -0,0 +1,288 @@
+import glob
+import hashlib
+import json
+import os
+import shutil
+
+import numpy as np
+import pandas as pd
+
+from src import dq_rules
+from src import etl_build_metrics as etl
+from src.dates import MONTH_NA, month_key, month_start, parse_dates
+from src.instrument import stage
+from src.intervals import concurrent_flags, episode_counts, episodes, interval_index, return_gaps
+from src.storage import EXTENSIONS, ChunkWriter, read_table, table_path, write_table
+
+# Incremental ETL: per-partition state persisted between runs. A partition is one exit_month x provider x
+# program_name cell (etl.PARTIAL_KEYS). The state records a content hash of every raw engagement row and
+# the partition it fell in, so a run hashes the raw rows, looks up the partitions of rows it has seen
+# before without parsing them, and parses, joins and aggregates only:
+#   - rows it has not seen, to find their partitions;
+#   - the rows of partitions whose set of row hashes changed (new, edited or deleted rows), for their
+#     partial aggregates, rule counts and hits, and episodes;
+#   - the rows of the exit months those partitions belong to, for the Tableau extract parts.
+# Returns and concurrency link a client's episodes across partitions, so the stored episodes carry their
+# return gap and concurrency flag, and only the clients with an episode in a changed partition are
+# re-indexed. A new clients table, new rules or another --format invalidate the state (full rebuild).
+#
+# The Tableau extract is one part per exit month, concatenated in month order with missing exit dates
+# last, and rows within a month in raw file order: the full build's rows stable-sorted by exit month.
+STATE_DIR = os.path.join(etl.BASE, "data/processed/state")
+STATE_META = os.path.join(STATE_DIR, "meta.json")
+STATE_ROWS = os.path.join(STATE_DIR, "rows.npy")
+ROW_DTYPE = np.dtype([("hash", np.uint64), ("part", np.int64)])  # raw row hash -> row of the partitions state
+
+
+def state_path(name: str) -> str:
+    return os.path.join(STATE_DIR, f"{name}.csv")
+
+
+def read_state(name: str, fmt: str) -> pd.DataFrame | None:
+    if not os.path.exists(table_path(state_path(name), fmt)):
+        return None
+    df = read_table(state_path(name), fmt, parse_dates=["exit_month"])
+    # State files hold readable month dates; in memory partitions are keyed by integer months
+    df["exit_month"] = month_key(df["exit_month"])
+    if "client_key" in df.columns:
+        # client_hash keys are uint64; a file whose keys all fit in int64 reads back as int64
+        df["client_key"] = df["client_key"].astype(np.uint64)
+    # Categories from different runs need not line up; compare and concatenate as plain values
+    return df.astype({c: object for c in df.select_dtypes("category").columns})
+
+
+def write_state(df: pd.DataFrame, name: str, fmt: str):
+    write_table(df.assign(exit_month=month_start(df["exit_month"]).to_numpy()), state_path(name), fmt)
+
+
+def digest(text: str) -> str:
+    return hashlib.blake2b(text.encode(), digest_size=16).hexdigest()
+
+
+def state_meta(fmt: str, clients: pd.DataFrame, rules: list) -> dict:
+    # What the stored state was built from, besides the engagements themselves
+    client_sum = pd.util.hash_pandas_object(clients, index=False).sum() if len(clients) else 0
+    return {"fmt": fmt, "clients": f"{client_sum:x}", "rules": digest(json.dumps(rules, sort_keys=True))}
+
+
+def load_state(meta: dict, fmt: str):
+    # (stored row hashes, stored partitions), or None when there is no usable state; stale state is cleared
+    if os.path.exists(STATE_META):
+        with open(STATE_META) as f:
+            stored = json.load(f)
+        parts = read_state("partitions", fmt)
+        if stored == meta and parts is not None and os.path.exists(STATE_ROWS):
+            return np.load(STATE_ROWS), parts
+    shutil.rmtree(STATE_DIR, ignore_errors=True)
+    return None
+
+
+def partition_hashes(keys: pd.DataFrame, row_hash: np.ndarray):
+    # Order-independent content hash per partition: wrapping uint64 sum of row hashes, plus the row count
+    part, parts = etl.factorize_keys(keys, etl.PARTIAL_KEYS)
+    order = np.argsort(part, kind="stable")
+    starts = np.flatnonzero(np.r_[True, np.diff(part[order]) != 0]) if len(part) else np.array([], dtype=int)
+    parts["rows"] = np.bincount(part, minlength=len(parts))
+    sums = np.add.reduceat(row_hash[order], starts) if len(part) else []
+    # Stored as text: uint64 does not round-trip through every format, and a bare digit string would parse as a number
+    parts["hash"] = [f"h{h:016x}" for h in sums]
+    return part, parts
+
+
+def row_partitions(eng: pd.DataFrame, row_hash: np.ndarray, state) -> pd.DataFrame:
+    # PARTIAL_KEYS of every raw row. Rows whose hash is in the state take their stored partition (identical
+    # rows always share one); only the exit dates of the other rows are parsed.
+    known = np.zeros(len(eng), dtype=bool)
+    keys = None
+    if state is not None:
+        rows, parts = state
+        order = np.argsort(rows["hash"], kind="stable")
+        stored = rows["hash"][order]
+        pos = np.minimum(np.searchsorted(stored, row_hash), max(len(stored) - 1, 0))
+        known = (stored[pos] == row_hash) if len(stored) else known
+        seen = parts[etl.PARTIAL_KEYS].take(rows["part"][order][pos[known]])
+        keys = seen.set_axis(eng.index[known])
+    new = eng[~known]
+    fresh = pd.DataFrame(
+        {
+            "exit_month": month_key(parse_dates(new["exit_date"])),
+            "provider": new["provider"].astype(object),
+            "program_name": new["program_name"].astype(object),
+        },
+        index=new.index,
+    )
+    return pd.concat([keys, fresh]).loc[eng.index] if known.any() else fresh
+
+
+def month_label(month: int) -> str:
+    return "unknown" if month == MONTH_NA else month_start([month])[0].strftime("%Y-%m")
+
+
+def keyed(df: pd.DataFrame, keys: pd.DataFrame) -> np.ndarray:
+    # Boolean mask: rows of df whose PARTIAL_KEYS appear in keys (NaN keys match NaN)
+    if df is None or not len(df):
+        return np.zeros(0 if df is None else len(df), dtype=bool)
+    return df[etl.PARTIAL_KEYS].merge(keys[etl.PARTIAL_KEYS].drop_duplicates(), how="left", indicator=True)[
+        "_merge"
+    ].eq("both").to_numpy()
+
+
+def replace_state(name: str, fresh: pd.DataFrame, touched: pd.DataFrame, fmt: str) -> tuple:
+    # Stored rows of untouched partitions plus the recomputed rows of touched ones, and the replaced rows
+    prev = read_state(name, fmt)
+    if prev is None:
+        return fresh.reset_index(drop=True), fresh.iloc[:0]
+    stale = keyed(prev, touched)
+    return pd.concat([prev[~stale], fresh], ignore_index=True), prev[stale]
+
+
+def episode_state(delta: pd.DataFrame, touched: pd.DataFrame, fmt: str) -> pd.DataFrame:
+    # Stored episodes with each one's return gap and concurrency flag. Episodes of touched partitions are
+    # replaced; every episode of a client with an old or new episode there is re-indexed, since a
+    # return or an overlap can link it to an episode in any other partition
+    client_key = etl.client_hash(delta["client_id"])
+    fresh = episodes(delta, client_key).rename(columns={"client": "client_key"})
+    fresh.insert(0, "exit_month", delta["exit_month"].to_numpy()[fresh.index])
+    fresh.insert(1, "provider", delta["provider"].to_numpy()[fresh.index])
+    fresh = fresh.assign(gap=0, concurrent=False).reset_index(drop=True)
+    eps, replaced = replace_state("episodes", fresh, touched, fmt)
+    affected = np.isin(eps["client_key"].to_numpy(), np.union1d(replaced["client_key"], fresh["client_key"]))
+    if affected.any():
+        idx, _ = interval_index(eps[affected].rename(columns={"client_key": "client"}).assign(row=np.flatnonzero(affected)))
+        row = idx["row"].to_numpy()
+        gap = eps["gap"].to_numpy(np.int64).copy()
+        concurrent = eps["concurrent"].to_numpy(bool).copy()
+        gap[row], concurrent[row] = return_gaps(idx), concurrent_flags(idx)
+        eps["gap"], eps["concurrent"] = gap, concurrent
+    write_state(eps, "episodes", fmt)
+    return eps
+
+
+def write_extract(fmt: str):
+    # The month parts in order ("unknown" sorts after every YYYY-MM). CSV parts are joined as text, each
+    # part's header dropped after the first, so values print exactly as they did when the part was written
+    paths = sorted(glob.glob(os.path.join(STATE_DIR, "tableau", "*" + EXTENSIONS[fmt])))
+    if fmt == "csv":
+        with open(table_path(etl.OUT_TABLEAU, fmt), "wb") as out:
+            for i, path in enumerate(paths):
+                with open(path, "rb") as f:
+                    header = f.readline()
+                    if i == 0:
+                        out.write(header)
+                    shutil.copyfileobj(f, out)
+        return
+    writer = ChunkWriter(etl.OUT_TABLEAU, fmt)
+    for path in paths:
+        writer.write(read_table(path, fmt))
+    writer.close()
+
+
+def build_incremental(fmt: str = "csv", rules: list | None = None):
+    rules = rules or dq_rules.RULES
+    compiled = dq_rules.compile_rules(rules)
+    with stage("etl", "read_raw") as r:
+        clients = etl.load_clients(fmt)
+        eng = etl.load_engagements(fmt)
+        r["rows"] = len(eng)
+    state = load_state(state_meta(fmt, clients, rules), fmt)
+    os.makedirs(os.path.join(STATE_DIR, "tableau"), exist_ok=True)
+
+    # 1) Which partitions did this export touch? Only rows not seen before are parsed to find out
+    with stage("etl", "hash_partitions") as r:
+        row_hash = pd.util.hash_pandas_object(eng, index=False).to_numpy()
+        part, parts = partition_hashes(row_partitions(eng, row_hash, state), row_hash)
+        r["rows"] = len(parts)
+    if state is None:
+        changed = np.ones(len(parts), dtype=bool)
+        removed = parts.iloc[:0]
+    else:
+        old = state[1]
+        cmp = parts.merge(old, on=etl.PARTIAL_KEYS, how="left", suffixes=("", "_old"))
+        changed = (cmp["hash"] != cmp["hash_old"]).to_numpy()
+        removed = old[~keyed(old, parts)]
+    touched = pd.concat([parts[changed], removed], ignore_index=True)[etl.PARTIAL_KEYS]
+
+    # 2) Parse and join the rows of touched exit months only; the touched partitions among them are the delta
+    months = np.isin(parts["exit_month"].to_numpy()[part], touched["exit_month"].to_numpy())
+    eng = etl.add_episode_fields(eng[months].copy())
+    with stage("etl", "merge") as r:
+        df = etl.join_clients(eng, clients)
+        r["rows"] = len(df)
+    delta = df[changed[part[months]]]
+    with stage("etl", "write_tableau") as r:
+        for month in touched["exit_month"].drop_duplicates():
+            rows = df[df["exit_month"] == month]
+            path = os.path.join(STATE_DIR, "tableau", f"{month_label(month)}.csv")
+            if len(rows):
+                write_table(rows[etl.TABLEAU_COLS], path, fmt)
+            elif os.path.exists(table_path(path, fmt)):
+                os.remove(table_path(path, fmt))
+        write_extract(fmt)
+        r["rows"] = len(df)
+
+    # 3) Partials, rule counts and hits for the delta rows; stored state kept for untouched partitions
+    with stage("etl", "aggregate") as r:
+        partials = etl.aggregate_partials(delta, etl.client_hash(delta["client_id"]))
+        hist = partials["sums"][etl.PARTIAL_KEYS].take(partials["hist"]["group"]).reset_index(drop=True)
+        hist[["days_in_program", "n"]] = partials["hist"][["days_in_program", "n"]].to_numpy()
+        pairs = delta[etl.PARTIAL_KEYS].assign(client_key=etl.client_hash(delta["client_id"])).drop_duplicates()
+        exits = delta[delta["exited_flag"] == 1]
+        equity = (
+            exits[etl.PARTIAL_KEYS + ["race_ethnicity"]]
+            .assign(client_key=etl.client_hash(exits["client_id"]), perm_exits=exits["permanent_housing_flag"])
+            .groupby(etl.PARTIAL_KEYS + ["race_ethnicity", "client_key"], dropna=False, observed=True)["perm_exits"]
+            .sum()
+            .reset_index()
+        )
+        r["rows"] = len(delta)
+    with stage("etl", "dq_rules") as r:
+        fresh_hits = dq_rules.evaluate(delta[etl.TABLEAU_COLS + ["exit_month"]], compiled, etl.PARTIAL_KEYS)
+        r["rows"] = len(delta)
+    stored = {}
+    for name, fresh in [
+        ("sums", partials["sums"]),
+        ("hist", hist),
+        ("clients", pairs),
+        ("equity", equity),
+        ("dq", fresh_hits["counts"]),
+        ("flags", fresh_hits["flags"]),
+    ]:
+        stored[name] = replace_state(name, fresh, touched, fmt)[0]
+        write_state(stored[name], name, fmt)
+    with stage("etl", "interval_counts") as r:
+        eps = episode_state(delta, touched, fmt)
+        r["rows"] = len(eps)
+    write_state(parts, "partitions", fmt)
+    np.save(STATE_ROWS, np.rec.fromarrays([row_hash, part], dtype=ROW_DTYPE))
+    with open(STATE_META, "w") as f:
+        json.dump(state_meta(fmt, clients, rules), f, indent=1)
+
+    # 4) Rollups from the stored state
+    sums = stored["sums"]
+    group = (
+        stored["hist"][etl.PARTIAL_KEYS]
+        .merge(sums[etl.PARTIAL_KEYS].reset_index(), on=etl.PARTIAL_KEYS, how="left")["index"]
+        .to_numpy()
+    )
+    merged = {
+        "sums": sums,
+        "hist": pd.DataFrame(
+            {"group": group, "days_in_program": stored["hist"]["days_in_program"].to_numpy(), "n": stored["hist"]["n"].to_numpy()}
+        ),
+        "clients": stored["clients"][["program_name", "client_key"]].drop_duplicates(),
+        "equity": etl.equity_pairs(stored["equity"][["race_ethnicity", "client_key", "perm_exits"]]),
+    }
+    flags = stored["flags"].drop(columns="exit_month")
+    flags["rule"] = pd.Categorical(flags["rule"], [name for name, _ in compiled])
+    hits = {"counts": dq_rules.sum_counts(stored["dq"].drop(columns="exit_month")), "flags": flags}
+    codes, programs = pd.factorize(eps["program_name"], sort=True, use_na_sentinel=False)
+    intervals = episode_counts(
+        eps.assign(program_name=codes), programs, eps["gap"].to_numpy(np.int64), eps["concurrent"].to_numpy(bool)
+    )
+    # What this run redid, returned with the tables (and recorded in the run log by etl_build_metrics.main)
+    summary = {"partitions": len(parts), "recomputed": int(changed.sum()), "removed": len(removed), "rows_parsed": len(df)}
+    print(
+        f"Incremental: {summary['recomputed']} of {summary['partitions']} partitions recomputed, "
+        f"{summary['removed']} removed, {summary['rows_parsed']} rows parsed"
+    )
+    return *etl.kpis_from_partials(merged, clients["client_id"].nunique()), intervals, hits, summary
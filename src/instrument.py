@@ -0,0 +1,113 @@
+import cProfile
+import json
+import os
+import resource
+import sys
+import threading
+import time
+from contextlib import contextmanager
+
+# Opt-in stage instrumentation. Setting HMIS_RUN_LOG (or passing --run-log to any entry point) appends
+# one JSON line per named stage -- wall time, CPU time, peak RSS, rows -- to that file. Settings live in
+# environment variables so pipeline stages and worker processes log into the same run.
+RUN_LOG_ENV = "HMIS_RUN_LOG"
+RUN_ID_ENV = "HMIS_RUN_ID"
+PROFILE_ENV = "HMIS_PROFILE"
+
+PAGE_SIZE = os.sysconf("SC_PAGE_SIZE") if hasattr(os, "sysconf") else 4096
+
+_depth = threading.local()
+_slowest = {"wall_s": -1.0}
+
+
+def configure(run_log: str | None = None, profile: bool = False):
+    if run_log:
+        os.environ[RUN_LOG_ENV] = os.path.abspath(run_log)
+        os.environ.setdefault(RUN_ID_ENV, f"{time.strftime('%Y%m%d-%H%M%S')}-{os.getpid()}")
+    if profile:
+        os.environ[PROFILE_ENV] = "1"
+
+
+def enabled() -> bool:
+    return bool(os.environ.get(RUN_LOG_ENV))
+
+
+def current_rss() -> int:
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * PAGE_SIZE
+    except OSError:
+        # No procfs: fall back to the process high-water mark (KiB on Linux, bytes on macOS)
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak if sys.platform == "darwin" else peak * 1024
+
+
+@contextmanager
+def measure(records: list, step: str, stage: str):
+    # Wall and CPU time plus the peak RSS seen by a 5 ms sampler thread while the stage runs
+    record = {"step": step, "stage": stage, "rows": None}
+    before = current_rss()
+    peak = [before]
+    stop = threading.Event()
+
+    def sample():
+        while not stop.wait(0.005):
+            peak[0] = max(peak[0], current_rss())
+
+    sampler = threading.Thread(target=sample, daemon=True)
+    sampler.start()
+    wall, cpu = time.perf_counter(), time.process_time()
+    try:
+        yield record
+    finally:
+        record["wall_s"] = round(time.perf_counter() - wall, 4)
+        record["cpu_s"] = round(time.process_time() - cpu, 4)
+        stop.set()
+        sampler.join()
+        record["rss_before_mb"] = round(before / 2**20, 1)
+        record["peak_rss_mb"] = round(max(peak[0], current_rss()) / 2**20, 1)
+        records.append(record)
+
+
+def profile_path(step: str, name: str) -> str:
+    return os.path.splitext(os.environ[RUN_LOG_ENV])[0] + f"-{step}-{name}.prof"
+
+
+@contextmanager
+def stage(step: str, name: str):
+    # Instrument one named stage; set record["rows"] inside the block. A no-op unless a run log is configured.
+    if not enabled():
+        yield {}
+        return
+
+    depth = getattr(_depth, "n", 0)
+    profiler = cProfile.Profile() if os.environ.get(PROFILE_ENV) and depth == 0 else None
+    records = []
+    _depth.n = depth + 1
+    try:
+        with measure(records, step, name) as record:
+            if profiler:
+                profiler.enable()
+            try:
+                yield record
+            finally:
+                if profiler:
+                    profiler.disable()
+    finally:
+        _depth.n = depth
+        record = records[0]
+        record.update(run_id=os.environ.get(RUN_ID_ENV), pid=os.getpid(), depth=depth, ts=time.time())
+        # Only a top-level stage slower than every earlier one in this process dumps its profile;
+        # the slowest stage of the run is the slowest log record with a "profile" path
+        if profiler and record["wall_s"] > _slowest["wall_s"]:
+            _slowest["wall_s"] = record["wall_s"]
+            record["profile"] = profile_path(step, name)
+            profiler.dump_stats(record["profile"])
+        # One short line per write: O_APPEND keeps lines from concurrent processes intact
+        with open(os.environ[RUN_LOG_ENV], "a") as f:
+            f.write(json.dumps(record) + "\n")
+
+
+def add_arguments(parser):
+    parser.add_argument("--run-log", default=None, help="append per-stage timing/memory records to this JSON-lines file")
+    parser.add_argument("--profile", action="store_true", help="with --run-log: cProfile the slowest stage")
@@ -0,0 +1,316 @@
+import numpy as np
+import pandas as pd
+
+# Per-client interval index over program episodes. Episodes are sorted once by (client, entry day), so
+# each client's history is one contiguous run: "first entry after this exit" is a binary search on a
+# packed (run, day) key and "was an earlier enrollment still open" is a running max. Neither needs a
+# self-join on client_id, which grows with the square of a client's episode count.
+#
+# The index only ever sees one piece of the clients at a time. Each piece reduces to COUNT_KEYS count
+# tables, and the counts add up across any split that keeps a client's episodes together (the streaming
+# ETL's client-keyed spill buckets, the incremental state, the SQLite window-function queries). The
+# returns, concurrency, census and length-of-stay tables are built from the merged counts.
+RETURN_WINDOWS = {6: 180, 12: 365, 24: 730}  # months -> days after a permanent housing exit (HUD SPM 2 bands)
+NO_RETURN = max(RETURN_WINDOWS.values()) + 1  # gap recorded for exits with no return inside the longest window
+OPEN = np.iinfo(np.int32).max  # exit day of an enrollment with no recorded exit
+ALL_PROGRAMS = "All programs"
+LOS_BANDS = [0, 8, 31, 91, 181, 366, 731]  # length-of-stay band lower bounds, days
+LOS_LABELS = ["0-7", "8-30", "31-90", "91-180", "181-365", "366-730", "731+"]
+
+# Count table -> its key columns; every other column is a count
+COUNT_KEYS = {
+    "episodes": ["program_name"],  # episodes, concurrent_episodes
+    "returns": ["program_name", "exit_day", "gap"],  # exits: permanent housing exits by day and days to return
+    "events": ["program_name", "day"],  # entries, ends (day after the last day), exits, perm_housing_exits
+    "stays": ["program_name", "days"],  # exits: completed stays by length
+}
+
+
+def days(dates: pd.Series) -> np.ndarray:
+    # Days since 1970-01-01 as int32; NaT -> OPEN
+    d = dates.to_numpy(dtype="datetime64[ns]").astype("datetime64[D]")
+    return np.where(np.isnat(d), OPEN, d.astype(np.int64)).astype(np.int32)
+
+
+def episodes(df: pd.DataFrame, client_key: np.ndarray) -> pd.DataFrame:
+    # The few columns the index needs, one row per episode with an entry date. client_key must identify
+    # the same client identically across every piece of one build (client_hash for chunked reads)
+    exited = (df["exited_flag"] == 1).to_numpy() & df["exit_date"].notna().to_numpy()
+    out = pd.DataFrame(
+        {
+            "client": np.asarray(client_key),
+            "program_name": df["program_name"].array,
+            "entry": days(df["entry_date"]),
+            "exit": np.where(exited, days(df["exit_date"]), OPEN),
+            "perm_exit": exited & (df["permanent_housing_flag"] == 1).to_numpy(),
+        }
+    )
+    return out[out["entry"] != OPEN]
+
+
+def interval_index(eps: pd.DataFrame):
+    # Episodes sorted by (client, entry), ties in input order, with a dense run number per client and its
+    # first row flagged. Programs become integer codes into the returned (sorted) program labels.
+    idx = eps.take(np.lexsort((eps["entry"].to_numpy(), eps["client"].to_numpy()))).reset_index(drop=True)
+    client = idx["client"].to_numpy()
+    idx["first"] = np.r_[True, client[1:] != client[:-1]] if len(idx) else np.zeros(0, dtype=bool)
+    idx["run"] = np.cumsum(idx["first"].to_numpy()) - 1
+    idx["program_name"], programs = pd.factorize(idx["program_name"], sort=True, use_na_sentinel=False)
+    return idx, programs
+
+
+def packed(idx: pd.DataFrame):
+    # (run, day) -> one int64 that sorts like the pair; open exits pack after every real day of the run
+    entry = idx["entry"].to_numpy(np.int64)
+    exit_ = idx["exit"].to_numpy(np.int64)
+    closed = exit_ != OPEN
+    lo = int(entry.min()) if len(entry) else 0
+    span = int(max(entry.max(initial=lo), exit_[closed].max(initial=lo))) - lo + 2
+    base = idx["run"].to_numpy(np.int64) * span
+    return base + entry - lo, base + np.where(closed, exit_ - lo, span - 1)
+
+
+def return_gaps(idx: pd.DataFrame) -> np.ndarray:
+    # Per episode: days from a permanent housing exit to the same client's first entry strictly after the
+    # exit day, capped at NO_RETURN (also the value for every other episode)
+    entry_key, exit_key = packed(idx)
+    run = idx["run"].to_numpy()
+    gap = np.full(len(idx), NO_RETURN, dtype=np.int64)
+    exits = np.flatnonzero(idx["perm_exit"].to_numpy())
+    nxt = np.searchsorted(entry_key, exit_key[exits], side="right")
+    nxt_row = np.minimum(nxt, len(idx) - 1)
+    returned = (nxt < len(idx)) & (run[nxt_row] == run[exits])
+    gap[exits] = np.where(returned, np.minimum(entry_key[nxt_row] - exit_key[exits], NO_RETURN), NO_RETURN)
+    return gap
+
+
+def concurrent_flags(idx: pd.DataFrame) -> np.ndarray:
+    # An episode is concurrent when it starts before an earlier-starting enrollment of the same client has
+    # ended (a same-day transfer is not). Packed exits never compare across runs, so one running max
+    # over the whole index stays within each client.
+    entry_key, exit_key = packed(idx)
+    latest_exit = np.r_[-1, np.maximum.accumulate(exit_key)][:-1]  # over the episodes before each row
+    return ~idx["first"].to_numpy() & (entry_key < latest_exit)
+
+
+def tally(keys: dict, counts: dict) -> pd.DataFrame:
+    # `counts` summed per distinct combination of the integer `keys` columns (one packed int64 key)
+    from src.etl_build_metrics import unique_inverse
+
+    packed_key = np.zeros(len(next(iter(keys.values()))), dtype=np.int64)
+    bounds = []
+    for values in keys.values():
+        values = np.asarray(values, dtype=np.int64)
+        lo = int(values.min()) if len(values) else 0
+        width = int(values.max()) - lo + 1 if len(values) else 1
+        packed_key = packed_key * width + (values - lo)
+        bounds.append((lo, width))
+    groups, inverse = unique_inverse(packed_key)
+    out = {}
+    for name, (lo, width) in reversed(list(zip(keys, bounds))):
+        out[name] = groups % width + lo
+        groups = groups // width
+    out = pd.DataFrame({name: out[name] for name in keys})
+    for name, values in counts.items():
+        out[name] = np.bincount(inverse, weights=values, minlength=len(out)).astype(np.int64)
+    return out
+
+
+def interval_counts(idx: pd.DataFrame, programs) -> dict:
+    # COUNT_KEYS tables for a piece of clients, from its index (every episode of a client in this piece)
+    return episode_counts(idx, programs, return_gaps(idx), concurrent_flags(idx))
+
+
+def episode_counts(idx: pd.DataFrame, programs, gap: np.ndarray, concurrent: np.ndarray) -> dict:
+    # COUNT_KEYS tables from per-episode columns (program codes into `programs`, entry, exit, perm_exit)
+    # and each episode's return gap and concurrency flag
+    code = idx["program_name"].to_numpy()
+    entry = idx["entry"].to_numpy(np.int64)
+    exit_ = idx["exit"].to_numpy(np.int64)
+    perm = idx["perm_exit"].to_numpy()
+    closed = exit_ != OPEN
+    last = np.maximum(exit_, entry)[closed]
+    n, c = len(idx), int(closed.sum())
+
+    tables = {
+        "episodes": tally({"program_name": code}, {"episodes": np.ones(n), "concurrent_episodes": concurrent}),
+        "returns": tally({"program_name": code[perm], "exit_day": exit_[perm], "gap": gap[perm]}, {"exits": np.ones(int(perm.sum()))}),
+        "events": tally(
+            {"program_name": np.r_[code, code[closed], code[closed]], "day": np.r_[entry, last + 1, last]},
+            {
+                "entries": np.r_[np.ones(n), np.zeros(2 * c)],
+                "ends": np.r_[np.zeros(n), np.ones(c), np.zeros(c)],
+                "exits": np.r_[np.zeros(n + c), np.ones(c)],
+                "perm_housing_exits": np.r_[np.zeros(n + c), perm[closed]],
+            },
+        ),
+        "stays": tally({"program_name": code[closed], "days": np.maximum(last - entry[closed], 0)}, {"exits": np.ones(c)}),
+    }
+    labels = np.array(list(programs), dtype=object)
+    for table in tables.values():
+        table["program_name"] = labels[table["program_name"].to_numpy()] if len(table) else table["program_name"].astype(object)
+    return tables
+
+
+def merge_counts(pieces: list) -> dict:
+    # Count tables of disjoint client pieces, added up key by key
+    out = {}
+    for name, keys in COUNT_KEYS.items():
+        stacked = pd.concat([p[name] for p in pieces], ignore_index=True)
+        out[name] = stacked.groupby(keys, dropna=False, sort=True).sum().reset_index()
+    return out
+
+
+def program_codes(table: pd.DataFrame, programs) -> np.ndarray:
+    return pd.Index(programs).get_indexer(table["program_name"])
+
+
+def day_counts(program: np.ndarray, offset: np.ndarray, nprograms: int, width: int, weights=None) -> np.ndarray:
+    # (program, offset) event counts as a programs x width matrix, plus an all-programs row at the bottom
+    counts = np.bincount(program * width + offset, weights=weights, minlength=nprograms * width)
+    counts = counts.astype(np.int64).reshape(nprograms, width)
+    return np.vstack([counts, counts.sum(axis=0, keepdims=True)])
+
+
+def by_program(programs, codes: np.ndarray, counts: dict) -> pd.DataFrame:
+    # Sum count columns per program, plus an all-programs row
+    out = pd.DataFrame({"program_name": list(programs) + [ALL_PROGRAMS]})
+    for name, values in counts.items():
+        per = np.bincount(codes, weights=values, minlength=len(programs)).astype(np.int64)
+        out[name] = np.r_[per, per.sum()]
+    return out
+
+
+def interval_programs(counts: dict):
+    # Sorted program labels (missing last) of every episode in the counts
+    return pd.factorize(counts["episodes"]["program_name"], sort=True, use_na_sentinel=False)[1]
+
+
+def day_range(counts: dict):
+    # First entry day and last day in the data (latest entry or recorded exit)
+    ev = counts["events"]
+    seen = ev["day"].to_numpy()[(ev["entries"] > 0).to_numpy() | (ev["exits"] > 0).to_numpy()]
+    entered = ev["day"].to_numpy()[(ev["entries"] > 0).to_numpy()]
+    if not len(entered):
+        return 0, -1
+    return int(entered.min()), int(seen.max())
+
+
+def returns_to_homelessness(counts: dict) -> pd.DataFrame:
+    # For every permanent housing exit: days until the same client's next entry (a return), checked against
+    # each window. Only exits whose whole window lies inside the data are counted, so late exits do not
+    # dilute the rates.
+    programs = interval_programs(counts)
+    ret = counts["returns"]
+    codes = program_codes(ret, programs)
+    exit_day = ret["exit_day"].to_numpy(np.int64)
+    gap = ret["gap"].to_numpy(np.int64)
+    exits = ret["exits"].to_numpy()
+    as_of = day_range(counts)[1]
+    tables = []
+    for months, window in RETURN_WINDOWS.items():
+        eligible = exit_day + window <= as_of
+        out = by_program(programs, codes, {"exits_to_perm_housing": exits * eligible, "returns": exits * (eligible & (gap <= window))})
+        out.insert(1, "window_months", months)
+        tables.append(out)
+    out = pd.concat(tables, ignore_index=True)
+    out["return_rate"] = (out["returns"] / out["exits_to_perm_housing"]).fillna(0)
+    return out
+
+
+def concurrent_enrollments(counts: dict) -> pd.DataFrame:
+    programs = interval_programs(counts)
+    eps = counts["episodes"]
+    out = by_program(
+        programs,
+        program_codes(eps, programs),
+        {"episodes": eps["episodes"].to_numpy(), "concurrent_episodes": eps["concurrent_episodes"].to_numpy()},
+    )
+    out["concurrent_rate"] = (out["concurrent_episodes"] / out["episodes"]).fillna(0)
+    return out
+
+
+def census(counts: dict) -> pd.DataFrame:
+    # Active enrollments per day as an event sweep: +1 on the entry day, -1 the day after the exit (open
+    # enrollments run through the last day), then a cumulative sum along each program's day axis. Cost
+    # is O(episodes + days), never episodes x days.
+    programs = interval_programs(counts)
+    lo, hi = day_range(counts)
+    ndays = hi - lo + 1
+    ev = counts["events"]
+    ev = ev[(ev["day"] >= lo).to_numpy() & (ev["day"] <= hi + 1).to_numpy()]
+    code = program_codes(ev, programs)
+    offset = ev["day"].to_numpy(np.int64) - lo
+    n = len(programs)
+
+    def matrix(col: str) -> np.ndarray:
+        return day_counts(code, offset, n, ndays + 1, ev[col].to_numpy(dtype=float))
+
+    entries = matrix("entries")
+    active = np.cumsum(entries - matrix("ends"), axis=1)
+    exits = matrix("exits")
+    perm_exits = matrix("perm_housing_exits")
+    return pd.DataFrame(
+        {
+            "date": np.tile((lo + np.arange(ndays)).astype("datetime64[D]"), n + 1),
+            "program_name": np.repeat(np.array(list(programs) + [ALL_PROGRAMS], dtype=object), ndays),
+            "active_enrollments": active[:, :ndays].ravel(),
+            "entries": entries[:, :ndays].ravel(),
+            "exits": exits[:, :ndays].ravel(),
+            "perm_housing_exits": perm_exits[:, :ndays].ravel(),
+        }
+    )
+
+
+def trailing(counts: np.ndarray, months: int = 12) -> np.ndarray:
+    # Trailing window sums as differences of one prefix sum; NaN until a full window has elapsed
+    c = np.r_[0, np.cumsum(counts)]
+    full = (c[months:] - c[:-months]).astype(float) if len(counts) >= months else np.zeros(0)
+    return np.r_[np.full(min(months - 1, len(counts)), np.nan), full]
+
+
+def census_monthly(daily: pd.DataFrame) -> pd.DataFrame:
+    # System-wide month view of the daily census, with rolling 12-month permanent housing rates
+    system = daily[daily["program_name"] == ALL_PROGRAMS]
+    month = system["date"].to_numpy().astype("datetime64[M]")
+    first = np.r_[True, month[1:] != month[:-1]] if len(month) else np.zeros(0, dtype=bool)
+    starts = np.flatnonzero(first)
+    active = system["active_enrollments"].to_numpy()
+    entries = system["entries"].to_numpy()
+
+    def month_sum(values: np.ndarray) -> np.ndarray:
+        return np.add.reduceat(values, starts) if len(starts) else values[:0]
+
+    exits = month_sum(system["exits"].to_numpy())
+    perm = month_sum(system["perm_housing_exits"].to_numpy())
+    out = pd.DataFrame(
+        {
+            "month": month[first].astype("datetime64[D]"),
+            "active_month_end": active[np.r_[starts[1:] - 1, len(active) - 1]] if len(starts) else active[:0],
+            # Served: enrolled on the month's first day, or entering on any later day of it
+            "enrollments_served": month_sum(np.where(first, active, entries)),
+            "exits": exits,
+            "perm_housing_exits": perm,
+            "exits_12m": trailing(exits),
+            "perm_housing_exits_12m": trailing(perm),
+        }
+    )
+    out["perm_housing_rate_12m"] = out["perm_housing_exits_12m"] / out["exits_12m"]
+    return out
+
+
+def length_of_stay(counts: dict) -> pd.DataFrame:
+    # Completed stays (entry to recorded exit) counted into LOS_BANDS per program
+    programs = interval_programs(counts)
+    stays = counts["stays"]
+    band = np.searchsorted(LOS_BANDS, stays["days"].to_numpy(np.int64), side="right") - 1
+    counts = day_counts(program_codes(stays, programs), band, len(programs), len(LOS_BANDS), stays["exits"].to_numpy(dtype=float))
+    totals = counts.sum(axis=1, keepdims=True)
+    return pd.DataFrame(
+        {
+            "program_name": np.repeat(np.array(list(programs) + [ALL_PROGRAMS], dtype=object), len(LOS_BANDS)),
+            "days_band": np.tile(LOS_LABELS, len(programs) + 1),
+            "exits": counts.ravel(),
+            "share": np.divide(counts, totals, out=np.zeros(counts.shape), where=totals > 0).ravel(),
+        }
+    )
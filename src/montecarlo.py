@@ -0,0 +1,140 @@
+import argparse
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from src import instrument
+from src.instrument import stage
+from src.storage import FORMATS, compact, write_table
+
+BASE = os.path.dirname(os.path.dirname(__file__))
+
+# Uncertainty bands across synthetic replicates: seeds seed, seed+1, ... are each generated and
+# aggregated in memory by a worker process (generate_data.generate -> the ETL's aggregation kernel), and
+# only the few KPI rows per replicate travel back. Replicate 0 is the published seed's draw.
+OUT_REPLICATES = os.path.join(BASE, "data/processed/montecarlo_replicates.csv")
+OUT_BANDS = os.path.join(BASE, "data/processed/montecarlo_bands.csv")
+
+BAND = 95  # central interval, percent
+
+
+def replicate(seed: int, scale: float = 1.0, total_clients: int | None = None, episodes_per_client: float = 1.0, margins: dict | None = None) -> pd.DataFrame:
+    # Permanent housing rate by program and by race/ethnicity for one seed, defined exactly as the ETL does
+    from src.etl_build_metrics import add_episode_fields, aggregate_partials, client_codes, client_lookup, join_clients, kpis_from_partials
+    from src.generate_data import generate
+
+    clients, eng, _ = generate(seed=seed, scale=scale, total_clients=total_clients, episodes_per_client=episodes_per_client, margins=margins)
+    clients, eng = compact(clients, dates=False), add_episode_fields(compact(eng, dates=False))
+    rows = client_lookup(clients["client_id"])(eng["client_id"])
+    df = join_clients(eng, clients, rows)
+    partials = aggregate_partials(df, client_codes(df["client_id"], rows, len(clients)), dense=True)
+    _, program, _, equity, _ = kpis_from_partials(partials, len(clients))
+    return pd.concat(
+        [
+            pd.DataFrame(
+                {
+                    "dimension": "program_name",
+                    "group": program["program_name"].astype(str),
+                    "exited_clients": program["exited_clients"],
+                    "perm_exits": program["exits_to_perm_housing"],
+                    "perm_rate": program["perm_housing_rate"],
+                }
+            ),
+            pd.DataFrame(
+                {
+                    "dimension": "race_ethnicity",
+                    "group": equity["race_ethnicity"].astype(str),
+                    "exited_clients": equity["exited_clients"],
+                    "perm_exits": equity["perm_exits"],
+                    "perm_rate": equity["perm_rate"],
+                }
+            ),
+        ],
+        ignore_index=True,
+    ).assign(seed=seed)
+
+
+def _replicate(args: tuple) -> pd.DataFrame:
+    seed, kwargs = args
+    return replicate(seed, **kwargs)
+
+
+def bands(replicates: pd.DataFrame, band: float = BAND) -> pd.DataFrame:
+    # Mean, median and the central `band`% interval of each group's rate across replicates
+    lo, hi = (100 - band) / 200, 1 - (100 - band) / 200
+    grouped = replicates.groupby(["dimension", "group"], sort=True)["perm_rate"]
+    out = grouped.agg(replicates="size", perm_rate_mean="mean").reset_index()
+    q = grouped.quantile([lo, 0.5, hi]).unstack()
+    out["perm_rate_lo"] = q[lo].to_numpy()
+    out["perm_rate_median"] = q[0.5].to_numpy()
+    out["perm_rate_hi"] = q[hi].to_numpy()
+    out["band"] = band
+    return out
+
+
+def main(
+    replicates: int = 100,
+    seed: int = 42,
+    scale: float = 1.0,
+    total_clients: int | None = None,
+    episodes_per_client: float = 1.0,
+    targets: str | None = None,
+    band: float = BAND,
+    fmt: str = "csv",
+    jobs: int | None = None,
+):
+    margins = None
+    if targets:
+        with open(targets) as f:
+            margins = json.load(f)
+    kwargs = {"scale": scale, "total_clients": total_clients, "episodes_per_client": episodes_per_client, "margins": margins}
+    seeds = seed + np.arange(replicates)
+
+    with stage("montecarlo", "replicates") as r:
+        # Results stream back in seed order; batching seeds per task keeps pickling overhead small
+        chunksize = max(1, replicates // (4 * (jobs or os.cpu_count() or 1)))
+        with ProcessPoolExecutor(max_workers=jobs) as pool:
+            parts = list(pool.map(_replicate, [(int(s), kwargs) for s in seeds], chunksize=chunksize))
+        runs = pd.concat(parts, ignore_index=True)
+        r["rows"] = replicates
+
+    with stage("montecarlo", "bands") as r:
+        out = bands(runs, band)
+        r["rows"] = len(out)
+
+    os.makedirs(os.path.join(BASE, "data/processed"), exist_ok=True)
+    print("Wrote:")
+    for table, path in [(runs, OUT_REPLICATES), (out, OUT_BANDS)]:
+        with stage("montecarlo", "write_" + os.path.splitext(os.path.basename(path))[0]) as r:
+            print(" -", write_table(table, path, fmt))
+            r["rows"] = len(table)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Permanent housing rate bands across synthetic replicates (one seed each).")
+    parser.add_argument("--replicates", type=int, default=100, help="number of seeds to generate and aggregate")
+    parser.add_argument("--seed", type=int, default=42, help="first seed; replicate i uses seed + i")
+    parser.add_argument("--scale", type=float, default=1.0, help="multiplier on the calibrated 2,495-client population")
+    parser.add_argument("--total-clients", type=int, default=None, help="exact client count (overrides --scale)")
+    parser.add_argument("--episodes-per-client", type=float, default=1.0, help="mean episodes per client in each replicate")
+    parser.add_argument("--targets", default=None, help="JSON file of marginal calibration targets (see generate_data)")
+    parser.add_argument("--band", type=float, default=BAND, help="central interval to report, percent")
+    parser.add_argument("--format", dest="fmt", choices=FORMATS, default="csv", help="output table format")
+    parser.add_argument("--jobs", type=int, default=None, help="worker processes (default: one per core)")
+    instrument.add_arguments(parser)
+    args = parser.parse_args()
+    instrument.configure(args.run_log, args.profile)
+    main(
+        replicates=args.replicates,
+        seed=args.seed,
+        scale=args.scale,
+        total_clients=args.total_clients,
+        episodes_per_client=args.episodes_per_client,
+        targets=args.targets,
+        band=args.band,
+        fmt=args.fmt,
+        jobs=args.jobs,
+    )
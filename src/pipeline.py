@@ -0,0 +1,304 @@
+import argparse
+import ast
+import hashlib
+import importlib
+import json
+import os
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+from src import instrument
+
+BASE = os.path.dirname(os.path.dirname(__file__))
+
+# Content hashes of every stage input/output, plus the key each stage last ran with
+STATE_PATH = os.path.join(BASE, "data/processed/pipeline_state.json")
+
+FORMATS = ["csv", "parquet", "feather"]  # mirrors src.storage; not imported so a no-op run never loads pandas
+
+
+def src(*names: str) -> list:
+    return [os.path.join(BASE, name) for name in names]
+
+
+def module_path(module: str) -> str:
+    return os.path.join(BASE, *module.split(".")) + ".py"
+
+
+def imported_modules(path: str) -> set:
+    # src.* modules a file imports, including function-level imports, read from its syntax tree
+    with open(path) as f:
+        tree = ast.parse(f.read(), path)
+    found = set()
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Import):
+            found.update(a.name for a in node.names)
+        elif isinstance(node, ast.ImportFrom) and node.module:
+            found.add(node.module)
+            found.update(f"{node.module}.{a.name}" for a in node.names)  # from src import dq_rules
+    return {m for m in found if m.startswith("src.") and os.path.exists(module_path(m))}
+
+
+def code(module: str) -> list:
+    # A stage's code is one of its inputs: the module and every src module it imports, transitively, so
+    # editing any of them invalidates the stage's outputs
+    seen, todo = set(), [module]
+    while todo:
+        m = todo.pop()
+        if m not in seen:
+            seen.add(m)
+            todo.extend(imported_modules(module_path(m)) - seen)
+    return sorted(module_path(m) for m in seen)
+
+
+def table(rel: str, fmt: str) -> str:
+    # Same naming as src.storage.table_path: the CSV path with the format's extension
+    return os.path.join(BASE, os.path.splitext(rel)[0] + "." + fmt)
+
+
+def stages(opts: argparse.Namespace) -> list:
+    # opts: the parsed command line (build_parser), or a Namespace with the same fields
+    fmt, montecarlo, targets, dq_rules = opts.fmt, opts.montecarlo, opts.targets, opts.dq_rules
+    raw = [table("data/raw/clients.csv", fmt), table("data/raw/program_engagements.csv", fmt)]
+    processed = [
+        table("data/processed/system_kpis_monthly.csv", fmt),
+        table("data/processed/program_kpis.csv", fmt),
+        table("data/processed/data_quality_watchlist.csv", fmt),
+        table("data/processed/equity_perm_by_race.csv", fmt),
+        table("data/processed/headline_totals.csv", fmt),
+    ]
+    figures = [
+        os.path.join(BASE, "outputs/figures", name)
+        for name in ["perm_housing_rate_by_program.png", "monthly_exits.png", "perm_rate_by_race.png"]
+    ]
+    bands = table("data/processed/montecarlo_bands.csv", fmt)
+    access = table("data/processed/access_site_monthly.csv", fmt)
+    generate_inputs = code("src.generate_data") + ([os.path.abspath(targets)] if targets else [])
+    pipeline = [
+        {
+            "name": "generate",
+            "target": "src.generate_data:main",
+            "params": {
+                "seed": opts.seed,
+                "scale": opts.scale,
+                "total_clients": opts.total_clients,
+                "fmt": fmt,
+                "episodes_per_client": opts.episodes_per_client,
+                "targets": targets,
+            },
+            # A targets file is an input like the code: editing it regenerates the data
+            "inputs": generate_inputs,
+            "outputs": raw + [table("data/raw/access_site_engagements.csv", fmt)],
+        },
+        {
+            "name": "etl",
+            "target": "src.etl_build_metrics:main",
+            "params": {"chunksize": opts.chunksize, "fmt": fmt, "backend": opts.backend, "rules": dq_rules},
+            "inputs": raw
+            + code("src.etl_build_metrics")
+            + src("sql/schema.sql", "sql/indexes.sql", "sql/queries.sql")
+            + ([os.path.abspath(dq_rules)] if dq_rules else []),
+            "outputs": processed
+            + [
+                table("data/processed/tableau_extract.csv", fmt),
+                table("data/processed/returns_to_homelessness.csv", fmt),
+                table("data/processed/concurrent_enrollments.csv", fmt),
+                table("data/processed/census_daily.csv", fmt),
+                table("data/processed/census_monthly.csv", fmt),
+                table("data/processed/length_of_stay_distribution.csv", fmt),
+                table("data/processed/dq_rule_scores.csv", fmt),
+                table("data/processed/dq_drilldown.csv", fmt),
+                table("data/processed/dq_drilldown_index.csv", fmt),
+            ],
+        },
+        {
+            "name": "access",
+            "target": "src.access_sites:main",
+            "params": {"fmt": fmt},
+            # Reads only the access-site log (past its stored cursor), so it runs alongside the ETL
+            "inputs": [table("data/raw/access_site_engagements.csv", fmt)] + code("src.access_sites"),
+            "outputs": [
+                table("data/processed/access_store/daily.csv", fmt),
+                table("data/processed/access_site_weekly.csv", fmt),
+                access,
+            ],
+        },
+        {
+            "name": "analysis",
+            "target": "src.analysis:main",
+            "params": {"fmt": fmt},
+            # The Monte Carlo bands are optional; when present they add a figure and a report section
+            "inputs": processed + [bands, access] + code("src.analysis"),
+            "outputs": figures
+            + [os.path.join(BASE, "outputs/figures/access_site_volume.png")]
+            + [os.path.join(BASE, "outputs", name) for name in ["report.md", "report.pdf", "watchlist_top10.csv"]]
+            + ([os.path.join(BASE, "outputs/figures/perm_rate_bands.png")] if montecarlo else []),
+        },
+    ]
+    if montecarlo:
+        # Generates its replicates in memory from the same parameters, so it runs alongside generate
+        pipeline.append(
+            {
+                "name": "montecarlo",
+                "target": "src.montecarlo:main",
+                "params": {
+                    "replicates": montecarlo,
+                    "seed": opts.seed,
+                    "scale": opts.scale,
+                    "total_clients": opts.total_clients,
+                    "episodes_per_client": opts.episodes_per_client,
+                    "targets": targets,
+                    "fmt": fmt,
+                },
+                "inputs": code("src.montecarlo") + ([os.path.abspath(targets)] if targets else []),
+                "outputs": [table("data/processed/montecarlo_replicates.csv", fmt), bands],
+            }
+        )
+    if opts.packs:
+        # Reads only the raw files, so it runs alongside the ETL
+        pipeline.append(
+            {
+                "name": "packs",
+                "target": "src.report_packs:main",
+                "params": {"fmt": fmt},
+                "inputs": raw + code("src.report_packs"),
+                "outputs": [table("data/processed/report_cube.csv", fmt), os.path.join(BASE, "outputs/packs/index.md")],
+            }
+        )
+    return pipeline
+
+
+def read_state() -> dict:
+    if not os.path.exists(STATE_PATH):
+        return {"files": {}, "stages": {}}
+    with open(STATE_PATH) as f:
+        return json.load(f)
+
+
+def write_state(state: dict):
+    os.makedirs(os.path.dirname(STATE_PATH), exist_ok=True)
+    tmp = STATE_PATH + ".tmp"
+    with open(tmp, "w") as f:
+        json.dump(state, f, indent=1, sort_keys=True)
+    os.replace(tmp, STATE_PATH)
+
+
+def file_digest(path: str, files: dict) -> str | None:
+    # Content hash, re-read only when size or mtime changed since it was last recorded
+    try:
+        st = os.stat(path)
+    except FileNotFoundError:
+        return None
+    stamp = [st.st_size, st.st_mtime_ns]
+    cached = files.get(path)
+    if cached and cached[:2] == stamp:
+        return cached[2]
+    h = hashlib.blake2b(digest_size=16)
+    with open(path, "rb") as f:
+        while block := f.read(1 << 20):
+            h.update(block)
+    files[path] = stamp + [h.hexdigest()]
+    return h.hexdigest()
+
+
+def stage_key(stage: dict, files: dict) -> str:
+    inputs = {os.path.relpath(p, BASE): file_digest(p, files) for p in stage["inputs"]}
+    payload = json.dumps([stage["target"], stage["params"], inputs], sort_keys=True)
+    return hashlib.blake2b(payload.encode(), digest_size=16).hexdigest()
+
+
+def up_to_date(stage: dict, key: str, state: dict) -> bool:
+    last = state["stages"].get(stage["name"])
+    if not last or last["key"] != key:
+        return False
+    # Outputs deleted or edited by hand since the last run also force a rerun
+    return all(file_digest(p, state["files"]) == last["outputs"].get(p) for p in stage["outputs"])
+
+
+def run_stage(target: str, params: dict) -> float:
+    module, func = target.split(":")
+    start = time.perf_counter()
+    with instrument.stage("pipeline", module.rsplit(".", 1)[-1]):
+        getattr(importlib.import_module(module), func)(**params)
+    return time.perf_counter() - start
+
+
+def upstream(stage: dict, all_stages: list) -> set:
+    # Dependencies are implied by the declarations: any stage producing one of this stage's inputs
+    inputs = set(stage["inputs"])
+    return {s["name"] for s in all_stages if s is not stage and inputs & set(s["outputs"])}
+
+
+def run(all_stages: list, force: bool = False, jobs: int | None = None) -> dict:
+    state = read_state()
+    deps = {s["name"]: upstream(s, all_stages) for s in all_stages}
+    pending = {s["name"]: s for s in all_stages}
+    done, running, report = set(), {}, {}
+
+    with ProcessPoolExecutor(max_workers=jobs) as pool:
+        while pending or running:
+            # Keys are computed only once every upstream stage has finished, so they see its fresh outputs
+            for name in [n for n in pending if deps[n] <= done]:
+                stage = pending.pop(name)
+                key = stage_key(stage, state["files"])
+                if not force and up_to_date(stage, key, state):
+                    done.add(name)
+                    report[name] = "cached"
+                    continue
+                running[pool.submit(run_stage, stage["target"], stage["params"])] = (stage, key)
+            if not running:
+                if any(deps[n] <= done for n in pending):
+                    continue  # a cached stage unblocked others
+                if pending:
+                    raise RuntimeError(f"Stages with unsatisfiable inputs: {sorted(pending)}")
+                break
+
+            finished, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in finished:
+                stage, key = running.pop(future)
+                seconds = future.result()
+                state["stages"][stage["name"]] = {
+                    "key": key,
+                    "outputs": {p: file_digest(p, state["files"]) for p in stage["outputs"]},
+                }
+                write_state(state)
+                done.add(stage["name"])
+                report[stage["name"]] = f"ran in {seconds:.1f}s"
+
+    write_state(state)
+    return report
+
+
+def main(opts: argparse.Namespace):
+    start = time.perf_counter()
+    report = run(stages(opts), force=opts.force, jobs=opts.jobs)
+    for name, status in report.items():
+        print(f" - {name}: {status}")
+    print(f"Pipeline finished in {time.perf_counter() - start:.2f}s")
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(
+        description="Run generate -> ETL / access sites -> analysis, skipping stages whose inputs, code and parameters are unchanged."
+    )
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--scale", type=float, default=1.0, help="multiplier on the calibrated 2,495-client population")
+    parser.add_argument("--total-clients", type=int, default=None, help="exact client count (overrides --scale)")
+    parser.add_argument("--episodes-per-client", type=float, default=1.0, help="mean episodes per client in the generated data")
+    parser.add_argument("--targets", default=None, help="JSON file of marginal calibration targets for generate_data")
+    parser.add_argument("--dq-rules", default=None, help="JSON list of data quality rules for the ETL")
+    parser.add_argument("--format", dest="fmt", choices=FORMATS, default="csv", help="table format for every stage")
+    parser.add_argument("--chunksize", type=int, default=None, help="stream the ETL in chunks of this many rows")
+    parser.add_argument("--backend", choices=["pandas", "sqlite"], default="pandas", help="ETL backend")
+    parser.add_argument("--packs", action="store_true", help="also render the per-provider / per-program report packs")
+    parser.add_argument("--montecarlo", type=int, default=0, metavar="N", help="also compute rate bands over N seeded replicates")
+    parser.add_argument("--force", action="store_true", help="rerun every stage regardless of the cache")
+    parser.add_argument("--jobs", type=int, default=None, help="worker processes for independent stages")
+    instrument.add_arguments(parser)
+    return parser
+
+
+if __name__ == "__main__":
+    args = build_parser().parse_args()
+    instrument.configure(args.run_log, args.profile)
+    main(args)
@@ -0,0 +1,160 @@
+import argparse
+import os
+import re
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from src import analysis
+from src import etl_build_metrics as etl
+from src.dates import month_key, month_start, parse_dates
+from src.storage import FORMATS, write_table
+
+# Report packs: one figures / report.md / report.pdf set per provider and per program. The raw files are
+# read and merged once into an additive cube at CUBE_KEYS grain; every slice rolls up from its rows of the cube.
+# Rates by race/ethnicity count distinct exited clients, like the ETL's equity table, and distinct counts do
+# not add up across cube rows: they come from exited (PAIR_KEYS) pairs carrying their permanent housing exits.
+CUBE_KEYS = ["provider", "program_name", "exit_month", "race_ethnicity", "age_group"]
+PAIR_KEYS = ["provider", "program_name", "race_ethnicity", "client_key"]
+SLICES = {"provider": "program_name", "program": "provider"}  # slice kind -> dimension compared within it
+
+OUT_CUBE = os.path.join(etl.BASE, "data/processed/report_cube.csv")
+PACK_DIR = os.path.join(etl.BASE, "outputs/packs")
+OUT_INDEX = os.path.join(PACK_DIR, "index.md")
+
+
+def build_cube(fmt: str = "csv"):
+    clients = etl.load_clients(fmt)[["client_id", "race_ethnicity", "age_group"]]
+    eng = etl.load_engagements(fmt)
+    eng["exit_month"] = month_key(parse_dates(eng["exit_date"]))
+    df = etl.join_clients(eng, clients)
+
+    group, cube = etl.factorize_keys(df, CUBE_KEYS)
+    cube["exit_month"] = month_start(cube["exit_month"]).to_numpy()
+    cube["episodes"] = np.bincount(group, minlength=len(cube))
+    cube = etl.group_sums(group, etl.episode_indicators(df), cube)
+
+    exits = df[df["exited_flag"] == 1]
+    group, pairs = etl.factorize_keys(exits.assign(client_key=pd.factorize(exits["client_id"])[0]), PAIR_KEYS)
+    pairs["perm_exits"] = np.bincount(
+        group, weights=np.nan_to_num(exits["permanent_housing_flag"].to_numpy(dtype=float)), minlength=len(pairs)
+    ).astype(np.int64)
+    return cube, pairs
+
+
+def rates(cube: pd.DataFrame, by: str) -> pd.DataFrame:
+    out = cube.groupby(by, dropna=False, observed=True, sort=True)[["episodes"] + etl.PARTIAL_SUMS].sum().reset_index()
+    out = out.rename(columns={"exited_flag": "exited_clients", "permanent_housing_flag": "exits_to_perm_housing"})
+    out["perm_rate"] = (out["exits_to_perm_housing"] / out["exited_clients"]).fillna(0)
+    return out
+
+
+def race_rates(pairs: pd.DataFrame) -> pd.DataFrame:
+    # The equity table's definition (etl.race_exits): exited clients with a known race/ethnicity, each
+    # counted once however many exits they had in the slice, and their permanent housing exits
+    per_race = etl.race_exits(etl.equity_pairs(pairs[["race_ethnicity", "client_key", "perm_exits"]]))
+    out = per_race[per_race.index.notna()].reset_index()
+    out["perm_rate"] = out["perm_exits"] / out["exited_clients"]
+    return out
+
+
+def slug(value) -> str:
+    return re.sub(r"[^A-Za-z0-9_-]+", "_", str(value)).strip("_") or "unknown"
+
+
+def render_pack(kind: str, name: str, cube: pd.DataFrame, pairs: pd.DataFrame, dpi: int = analysis.DPI) -> str:
+    # Runs in a worker process with only this slice's rows of the cube and of the exited client pairs
+    out_dir = os.path.join(PACK_DIR, kind, slug(name))
+    fig_dir = os.path.join(out_dir, "figures")
+    os.makedirs(fig_dir, exist_ok=True)
+
+    within = SLICES[kind]
+    by_within = rates(cube, within).sort_values("perm_rate", ascending=False)
+    by_race = race_rates(pairs).sort_values("perm_rate", ascending=False)
+    monthly = rates(cube.dropna(subset=["exit_month"]), "exit_month")
+
+    fig1 = analysis.plot_rate_bars(
+        by_within, within, "perm_rate", f"Permanent Housing Rate by {within.replace('_', ' ').title()} ({name})",
+        os.path.join(fig_dir, f"perm_rate_by_{within}.png"), dpi, rotate=len(by_within) > 6,
+    )
+    fig2 = analysis.plot_rate_bars(
+        by_race, "race_ethnicity", "perm_rate", f"Permanent Housing Rate by Race/Ethnicity ({name})",
+        os.path.join(fig_dir, "perm_rate_by_race.png"), dpi, figsize=(9, 4), rotate=True,
+    )
+    analysis.plot_monthly_exits(monthly, os.path.join(fig_dir, "monthly_exits.png"), dpi)
+
+    totals = cube[["episodes"] + etl.PARTIAL_SUMS].sum()
+    perm_rate = totals["permanent_housing_flag"] / totals["exited_flag"] if totals["exited_flag"] else 0
+    bullets = [
+        f"Episodes: {int(totals['episodes']):,}",
+        f"Exits: {int(totals['exited_flag']):,}",
+        f"Exits to permanent housing: {int(totals['permanent_housing_flag']):,} ({perm_rate:.1%})",
+        f"Missing exit interviews: {int(totals['missing_exit_interview']):,}",
+    ]
+
+    with open(os.path.join(out_dir, "report.md"), "w") as f:
+        f.write(f"# {name} — {kind.title()} Report Pack (Synthetic)\n\n")
+        f.write("\n".join(f"- {b}" for b in bullets) + "\n\n## Figures\n")
+        f.write("".join(f"- `figures/{os.path.basename(p)}`\n" for p in sorted(os.listdir(fig_dir))))
+
+    write_pack_pdf(os.path.join(out_dir, "report.pdf"), f"{name} — {kind.title()} Report Pack", bullets, fig1, fig2)
+    return out_dir
+
+
+def write_pack_pdf(path: str, title: str, bullets: list, fig1: str, fig2: str):
+    # reportlab is imported here, like analysis.write_pdf, so importing this module does not need it
+    from reportlab.lib.pagesizes import letter
+    from reportlab.lib.units import inch
+    from reportlab.pdfgen import canvas
+
+    c = canvas.Canvas(path, pagesize=letter)
+    width, height = letter
+    c.setFont("Helvetica-Bold", 16)
+    c.drawString(1 * inch, height - 1 * inch, title)
+    c.setFont("Helvetica", 10)
+    c.drawString(1 * inch, height - 1.25 * inch, "System Performance & Data Quality POC (Synthetic, calibrated)")
+    c.line(1 * inch, height - 1.35 * inch, width - 1 * inch, height - 1.35 * inch)
+    c.setFont("Helvetica", 11)
+    y = height - 1.7 * inch
+    for b in bullets:
+        c.drawString(1.05 * inch, y, f"• {b}")
+        y -= 0.22 * inch
+    c.drawImage(fig1, 1 * inch, y - 3.0 * inch, width=6.5 * inch, height=3.0 * inch, preserveAspectRatio=True)
+    c.drawImage(fig2, 1 * inch, y - 6.2 * inch, width=6.5 * inch, height=2.8 * inch, preserveAspectRatio=True)
+    c.save()
+
+
+def main(fmt: str = "csv", kinds: list | None = None, dpi: int = analysis.DPI, jobs: int | None = None):
+    cube, pairs = build_cube(fmt)
+    cube_path = write_table(cube, OUT_CUBE, fmt)
+
+    # Slices go to the workers as their own cube rows, so per-slice cost is independent of the raw data size
+    columns = {"provider": "provider", "program": "program_name"}
+    analysis.pyplot()  # loaded once here; the forked workers inherit it
+    with ProcessPoolExecutor(max_workers=jobs) as pool:
+        futures = []
+        for kind in kinds or list(SLICES):
+            slice_pairs = dict(list(pairs.groupby(columns[kind], observed=True, sort=True)))
+            for name, rows in cube.groupby(columns[kind], observed=True, sort=True):
+                args = (kind, name, rows, slice_pairs.get(name, pairs.iloc[:0]), dpi)
+                futures.append((kind, name, pool.submit(render_pack, *args)))
+        packs = [(kind, name, f.result()) for kind, name, f in futures]
+
+    with open(OUT_INDEX, "w") as f:
+        f.write("# Report Packs\n\n")
+        f.write("".join(f"- {kind}: [{name}]({os.path.relpath(d, PACK_DIR)}/report.md)\n" for kind, name, d in packs))
+
+    print("Wrote:")
+    print(" -", cube_path)
+    print(" -", OUT_INDEX, f"({len(packs)} packs)")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Render one report pack per provider and per program from a shared aggregate cube.")
+    parser.add_argument("--format", dest="fmt", choices=FORMATS, default="csv", help="raw input and cube output format")
+    parser.add_argument("--kind", dest="kinds", action="append", choices=list(SLICES), help="slice kinds to render (default: all)")
+    parser.add_argument("--draft", action="store_true", help=f"render figures at {analysis.DRAFT_DPI} dpi")
+    parser.add_argument("--jobs", type=int, default=None, help="worker processes (default: one per core)")
+    args = parser.parse_args()
+    main(fmt=args.fmt, kinds=args.kinds, dpi=analysis.DRAFT_DPI if args.draft else analysis.DPI, jobs=args.jobs)
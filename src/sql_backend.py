@@ -0,0 +1,151 @@
+import argparse
+import os
+import re
+import sqlite3
+
+import numpy as np
+import pandas as pd
+
+from src.instrument import stage
+from src.storage import FORMATS, ChunkWriter, iter_table
+
+BASE = os.path.dirname(os.path.dirname(__file__))
+
+SCHEMA_SQL = os.path.join(BASE, "sql/schema.sql")
+INDEXES_SQL = os.path.join(BASE, "sql/indexes.sql")
+QUERIES_SQL = os.path.join(BASE, "sql/queries.sql")
+
+DB_PATH = os.path.join(BASE, "data/processed/hmis.sqlite")
+
+RAW_TABLES = {
+    "clients": os.path.join(BASE, "data/raw/clients.csv"),
+    "program_engagements": os.path.join(BASE, "data/raw/program_engagements.csv"),
+}
+
+
+def named_queries(path: str = QUERIES_SQL) -> dict:
+    # Blocks in queries.sql are introduced by a "-- name: <query>" line
+    with open(path) as f:
+        parts = re.split(r"^-- name: (\w+)\s*$", f.read(), flags=re.M)
+    return {name: sql.strip() for name, sql in zip(parts[1::2], parts[2::2])}
+
+
+def connect(path: str = DB_PATH) -> sqlite3.Connection:
+    con = sqlite3.connect(path)
+    # Bulk-load settings: the database is a rebuildable cache of the raw files
+    con.execute("PRAGMA journal_mode = OFF")
+    con.execute("PRAGMA synchronous = OFF")
+    con.execute("PRAGMA temp_store = MEMORY")
+    return con
+
+
+def _sql_rows(chunk: pd.DataFrame):
+    # Column-wise tolist() gives plain Python values; float NaN binds as NULL in SQLite
+    cols = []
+    for c in chunk.columns:
+        col = chunk[c]
+        if pd.api.types.is_datetime64_any_dtype(col):
+            col = col.dt.strftime("%Y-%m-%d")
+        cols.append(col.astype(object).tolist() if isinstance(col.dtype, pd.CategoricalDtype) else col.tolist())
+    return zip(*cols)
+
+
+def script(path: str) -> str:
+    with open(path) as f:
+        return f.read()
+
+
+def load(con: sqlite3.Connection, fmt: str = "csv", chunksize: int = 200_000):
+    con.executescript(script(SCHEMA_SQL))
+    for table, path in RAW_TABLES.items():
+        cols = [r[1] for r in con.execute(f"PRAGMA table_xinfo({table})") if r[6] == 0]  # skip generated columns
+        insert = f"INSERT INTO {table} ({', '.join(cols)}) VALUES ({', '.join('?' * len(cols))})"
+        for chunk in iter_table(path, fmt, chunksize=chunksize):
+            con.executemany(insert, _sql_rows(chunk[cols]))
+    con.executescript(script(INDEXES_SQL))
+    con.commit()
+
+
+def build_sqlite(fmt: str = "csv", rules: list | None = None):
+    from src import dq_rules
+    from src.dates import parse_dates
+    from src.etl_build_metrics import (
+        DQ_COLS,
+        MONTHLY_COLS,
+        OUT_TABLEAU,
+        PROGRAM_COLS,
+        days_quantiles,
+        finalize_dq,
+        finalize_equity,
+        finalize_monthly,
+        finalize_program,
+    )
+    from src.intervals import COUNT_KEYS, NO_RETURN
+
+    queries = named_queries()
+    con = connect()
+    try:
+        with stage("etl", "sqlite_load"):
+            load(con, fmt)
+
+        with stage("etl", "sqlite_kpi_queries"):
+            # Length-of-stay quantiles come from one histogram, rolled up to each table's keys in Python
+            hist = pd.read_sql_query(queries["kpi_days_hist"], con)
+            monthly = pd.read_sql_query(queries["kpi_monthly"], con)
+            monthly = monthly.merge(days_quantiles(hist, ["exit_month"]), on="exit_month", how="left")[MONTHLY_COLS]
+            monthly["exit_month"] = pd.to_datetime(monthly["exit_month"])
+            program = pd.read_sql_query(queries["kpi_program"], con)
+            program = program.merge(days_quantiles(hist, ["program_name"]), on="program_name", how="left")[PROGRAM_COLS]
+            dq = pd.read_sql_query(queries["kpi_dq"], con)
+            dq = dq.merge(days_quantiles(hist, ["provider", "program_name"]), on=["provider", "program_name"], how="left")[
+                DQ_COLS
+            ]
+            equity = pd.read_sql_query(queries["kpi_equity"], con)
+            totals = pd.read_sql_query(queries["kpi_totals"], con)
+        with stage("etl", "sqlite_interval_queries"):
+            # src.intervals' count tables straight from the interval_* window-function queries
+            intervals = {}
+            for name in COUNT_KEYS:
+                table = pd.read_sql_query(queries[f"interval_{name}"], con, params={"no_return": NO_RETURN})
+                table["program_name"] = table["program_name"].astype(object).where(table["program_name"].notna(), np.nan)
+                intervals[name] = table
+
+        with stage("etl", "write_tableau") as r:
+            # The data quality rules read the same extract columns, so they run on each chunk as it passes
+            r["rows"] = 0
+            compiled, rule_counts, flags = dq_rules.compile_rules(rules or dq_rules.RULES), None, dq_rules.flag_spill()
+            tableau = ChunkWriter(OUT_TABLEAU, fmt)
+            for chunk in pd.read_sql_query(queries["tableau_extract"], con, chunksize=200_000):
+                chunk["days_in_program"] = chunk["days_in_program"].astype("Int64")
+                tableau.write(chunk)
+                parsed = chunk.assign(entry_date=parse_dates(chunk["entry_date"]), exit_date=parse_dates(chunk["exit_date"]))
+                hits = dq_rules.evaluate(parsed, compiled)
+                rule_counts = dq_rules.add_counts(rule_counts, hits["counts"])
+                flags.write(hits["flags"])
+                r["rows"] += len(chunk)
+            tableau.close()
+    finally:
+        con.close()
+
+    hits = {"counts": rule_counts, "flags": flags}
+    return finalize_monthly(monthly), finalize_program(program), finalize_dq(dq), finalize_equity(equity), totals, intervals, hits
+
+
+def main(query: str, fmt: str = "csv", reload: bool = False):
+    # Ad hoc access to the named queries in sql/queries.sql against the loaded database
+    con = connect()
+    try:
+        if reload or not con.execute("SELECT name FROM sqlite_master WHERE name = 'program_engagements'").fetchone():
+            load(con, fmt)
+        print(pd.read_sql_query(named_queries()[query], con).to_string(index=False))
+    finally:
+        con.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run a named query from sql/queries.sql against the SQLite KPI database.")
+    parser.add_argument("query", choices=sorted(named_queries()))
+    parser.add_argument("--format", dest="fmt", choices=FORMATS, default="csv", help="raw table format for (re)loading")
+    parser.add_argument("--reload", action="store_true", help="rebuild the database from the raw files first")
+    args = parser.parse_args()
+    main(args.query, fmt=args.fmt, reload=args.reload)
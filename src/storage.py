@@ -0,0 +1,242 @@
+import os
+import tempfile
+
+import numpy as np
+import pandas as pd
+from pandas.api.types import union_categoricals
+
+# CSV stays the default (and what Tableau reads). Parquet / Feather are optional columnar formats that
+# keep low-cardinality text as dictionary-encoded categoricals, flags as int8 and dates as native dates,
+# so nothing is re-parsed from strings on the next run. Both need pyarrow.
+FORMATS = ["csv", "parquet", "feather"]
+EXTENSIONS = {"csv": ".csv", "parquet": ".parquet", "feather": ".feather"}
+
+CATEGORY_COLS = [
+    "program_name",
+    "primary_program",
+    "provider",
+    "exit_destination",
+    "income_at_exit_range",
+    "household_type",
+    "age_group",
+    "race_ethnicity",
+    "gender",
+    "site",
+]
+CATEGORY_DTYPES = {c: "category" for c in CATEGORY_COLS}  # read_csv(dtype=...): parse straight into categoricals
+FLAG_COLS = ["exited_flag", "exit_interview_completed", "permanent_housing_flag", "watch_flag"]
+DATE_COLS = ["entry_date", "exit_date", "entry_month", "exit_month", "engagement_date"]
+
+
+def _pyarrow():
+    try:
+        import pyarrow
+        import pyarrow.feather
+        import pyarrow.parquet
+    except ImportError as e:
+        raise ImportError("Parquet/Feather storage needs pyarrow: pip install pyarrow") from e
+    return pyarrow
+
+
+def table_path(csv_path: str, fmt: str = "csv") -> str:
+    # Every table is configured by its CSV path; columnar formats swap the extension
+    return os.path.splitext(csv_path)[0] + EXTENSIONS[fmt]
+
+
+def is_flag(col: pd.Series) -> bool:
+    # 0/1 values with nothing missing; a column named like a flag that holds counts (the incremental ETL's
+    # per-partition sums) keeps its integer type
+    return pd.api.types.is_numeric_dtype(col) and not col.isna().any() and bool(col.between(0, 1).all())
+
+
+def compact(df: pd.DataFrame, dates: bool = True) -> pd.DataFrame:
+    # dates=False leaves DATE_COLS alone, for frames whose dates are already parsed or integer month keys
+    df = df.copy(deep=False)
+    for c in df.columns:
+        if c in CATEGORY_COLS:
+            # Sorted categories keep groupby/factorize order identical to the plain-string columns
+            cat = df[c].astype("category")
+            if list(cat.cat.categories) != sorted(cat.cat.categories):
+                cat = cat.cat.set_categories(sorted(cat.cat.categories))
+            df[c] = cat
+        elif (c in FLAG_COLS or c.startswith("dis_")) and is_flag(df[c]):
+            df[c] = df[c].astype("int8")
+        elif dates and c in DATE_COLS:
+            df[c] = pd.to_datetime(df[c])
+    return df
+
+
+def concat_compact(chunks: list) -> pd.DataFrame:
+    # compact() chunks of one table stacked into one compact frame. Categoricals are unioned with sorted
+    # categories (what compact gives the whole table) instead of decoding to strings as pd.concat would
+    out = {}
+    for c in chunks[0].columns:
+        cols = [chunk[c] for chunk in chunks]
+        if all(isinstance(col.dtype, pd.CategoricalDtype) for col in cols):
+            out[c] = pd.Series(union_categoricals(cols, sort_categories=True), name=c)
+        else:
+            out[c] = pd.concat(cols, ignore_index=True)
+    return pd.DataFrame(out)
+
+
+def _to_arrow(df: pd.DataFrame):
+    pa = _pyarrow()
+    table = pa.Table.from_pandas(compact(df), preserve_index=False)
+    for i, name in enumerate(table.column_names):
+        if name in DATE_COLS:
+            table = table.set_column(i, name, table.column(name).cast(pa.date32()))
+    return table
+
+
+def _to_pandas(table) -> pd.DataFrame:
+    return compact(table.to_pandas(date_as_object=False))
+
+
+def write_table(df: pd.DataFrame, csv_path: str, fmt: str = "csv") -> str:
+    path = table_path(csv_path, fmt)
+    if fmt == "csv":
+        df.to_csv(path, index=False)
+    elif fmt == "parquet":
+        _pyarrow().parquet.write_table(_to_arrow(df), path)
+    else:
+        # Uncompressed so readers can memory-map the columns without a decode pass
+        _pyarrow().feather.write_feather(_to_arrow(df), path, compression="uncompressed")
+    return path
+
+
+def read_table(csv_path: str, fmt: str = "csv", **csv_kwargs) -> pd.DataFrame:
+    path = table_path(csv_path, fmt)
+    if fmt == "csv":
+        return pd.read_csv(path, **csv_kwargs)
+    if fmt == "parquet":
+        return _to_pandas(_pyarrow().parquet.read_table(path))
+    # Feather files are memory-mapped; only the columns pandas materializes get paged in
+    return _to_pandas(_pyarrow().feather.read_table(path, memory_map=True))
+
+
+def iter_table(csv_path: str, fmt: str = "csv", chunksize: int = 500_000, **csv_kwargs):
+    path = table_path(csv_path, fmt)
+    if fmt == "csv":
+        yield from pd.read_csv(path, chunksize=chunksize, **csv_kwargs)
+    elif fmt == "parquet":
+        for batch in _pyarrow().parquet.ParquetFile(path).iter_batches(batch_size=chunksize):
+            yield _to_pandas(batch)
+    else:
+        for batch in _pyarrow().feather.read_table(path, memory_map=True).to_batches(max_chunksize=chunksize):
+            yield _to_pandas(batch)
+
+
+class ChunkWriter:
+    # Appends DataFrame chunks to one table file; columnar files keep the first chunk's schema
+    def __init__(self, csv_path: str, fmt: str = "csv"):
+        self.path = table_path(csv_path, fmt)
+        self.fmt = fmt
+        self._writer = None
+        self._schema = None
+        self._started = False
+
+    def write(self, df: pd.DataFrame):
+        if self.fmt == "csv":
+            df.to_csv(self.path, index=False, mode="a" if self._started else "w", header=not self._started)
+            self._started = True
+            return
+        pa = _pyarrow()
+        table = _to_arrow(df)
+        if self._writer is None:
+            # Chunks carry different category sets, so dictionary columns are stored as plain strings
+            # (Parquet still dictionary-encodes them on disk) and re-categorized on read
+            self._schema = pa.schema(
+                [pa.field(f.name, f.type.value_type) if pa.types.is_dictionary(f.type) else f for f in table.schema]
+            )
+            if self.fmt == "parquet":
+                self._writer = pa.parquet.ParquetWriter(self.path, self._schema)
+            else:
+                self._writer = pa.ipc.new_file(self.path, self._schema)
+        self._writer.write_table(table.cast(self._schema))
+
+    def close(self):
+        if self._writer is not None:
+            self._writer.close()
+
+
+class ClientSpill:
+    # Per-client records spilled to SPILL_BUCKETS binary files by client key, so every record of one client
+    # lands in the same bucket and a pass over the buckets holds one bucket in memory at a time. `labels`
+    # columns are stored as int32 codes (-1: missing) and `values` as the given numpy dtypes.
+    BUCKETS = 64
+
+    def __init__(self, labels: list, values: dict):
+        self._dir = tempfile.TemporaryDirectory(prefix="spill-")
+        self.labels = {c: {} for c in labels}
+        self.dtype = np.dtype([("client_key", np.uint64)] + [(c, np.int32) for c in labels] + list(values.items()))
+        self.rows = 0
+
+    def path(self, bucket: int) -> str:
+        return os.path.join(self._dir.name, f"{bucket}.bin")
+
+    def write(self, df: pd.DataFrame):
+        records = np.empty(len(df), dtype=self.dtype)
+        for name in self.dtype.names:
+            if name in self.labels:
+                codes, uniques = pd.factorize(df[name])
+                seen = self.labels[name]
+                lookup = np.array([seen.setdefault(u, len(seen)) for u in uniques] + [-1], dtype=np.int32)
+                records[name] = lookup[codes]
+            else:
+                records[name] = df[name].to_numpy()
+        bucket = (records["client_key"] % np.uint64(self.BUCKETS)).astype(np.int64)
+        order = np.argsort(bucket, kind="stable")
+        bounds = np.searchsorted(bucket[order], np.arange(self.BUCKETS + 1))
+        for b in np.flatnonzero(np.diff(bounds)):
+            with open(self.path(b), "ab") as f:
+                records[order[bounds[b] : bounds[b + 1]]].tofile(f)
+        self.rows += len(df)
+
+    def buckets(self):
+        # One frame per non-empty bucket, records in the order they were written
+        for b in range(self.BUCKETS):
+            if not os.path.exists(self.path(b)):
+                continue
+            records = np.fromfile(self.path(b), dtype=self.dtype)
+            out = pd.DataFrame({name: records[name] for name in self.dtype.names})
+            for name, seen in self.labels.items():
+                out[name] = pd.api.extensions.take(np.array(list(seen), dtype=object), records[name], allow_fill=True)
+            yield out
+
+    def close(self):
+        self._dir.cleanup()
+
+
+class GroupSpill:
+    # Rows spilled to one temporary CSV per distinct value of the `keys` columns, so a pass over the groups
+    # holds one group in memory at a time. Key values are held once per group; the other columns are
+    # appended as text and read back with `dtype`.
+    def __init__(self, keys: list, dtype: dict):
+        self._dir = tempfile.TemporaryDirectory(prefix="spill-")
+        self.keys = keys
+        self.dtype = dtype
+        self.groups = {}  # key values (None for missing) -> file number
+        self.rows = 0
+
+    def path(self, n: int) -> str:
+        return os.path.join(self._dir.name, f"{n}.csv")
+
+    def write(self, df: pd.DataFrame):
+        for key, rows in df.groupby(self.keys, dropna=False, sort=False, observed=True):
+            # NaN is not equal to itself, so missing key values are held as None to find their group again
+            key = tuple(None if pd.isna(v) else v for v in key)
+            n = self.groups.setdefault(key, len(self.groups))
+            rows[list(self.dtype)].to_csv(self.path(n), mode="a", header=False, index=False)
+        self.rows += len(df)
+
+    def buckets(self):
+        # One frame per group (key columns first) in sorted key order, missing values last
+        order = pd.DataFrame(list(self.groups), columns=self.keys).assign(file=list(self.groups.values()))
+        for row in order.sort_values(self.keys, na_position="last", kind="stable").itertuples(index=False):
+            rows = pd.read_csv(self.path(row.file), names=list(self.dtype), dtype=self.dtype, keep_default_na=False, na_values=[""])
+            for i, k in enumerate(self.keys):
+                rows.insert(i, k, row[i])
+            yield rows
+
+    def close(self):
+        self._dir.cleanup()
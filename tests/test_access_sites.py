@@ -0,0 +1,91 @@
+import io
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from src import access_sites
+
+HEADER = "site,engagement_date\n"
+
+
+@pytest.fixture
+def log(tmp_path, monkeypatch):
+    # The event log and the counter store under tmp_path
+    monkeypatch.setattr(access_sites, "RAW_ACCESS", str(tmp_path / "access_site_engagements.csv"))
+    monkeypatch.setattr(access_sites, "STORE_DIR", str(tmp_path / "store"))
+    monkeypatch.setattr(access_sites, "STORE_DAILY", str(tmp_path / "store" / "daily.csv"))
+    monkeypatch.setattr(access_sites, "STORE_CURSOR", str(tmp_path / "store" / "cursor.json"))
+    return tmp_path / "access_site_engagements.csv"
+
+
+def events(n: int, seed: int) -> str:
+    rng = np.random.default_rng(seed)
+    sites = rng.choice(["Hub_A", "Hub_B", "Hub_C"], n)
+    days = np.datetime64("2023-01-01") + rng.integers(0, 120, n)
+    return "".join(f"{s},{d}\n" for s, d in zip(sites, days))
+
+
+def expected(text: str) -> pd.DataFrame:
+    # Daily counts of every complete line, as a full rebuild would store them
+    complete = text[: text.rfind("\n") + 1]
+    return access_sites.daily_counts(pd.read_csv(io.StringIO(complete), dtype={"site": "category"}))
+
+
+def assert_store(store: access_sites.CounterStore, text: str):
+    # The stored per-site daily counts equal a rebuild's, and so do the store's monthly buckets
+    want = expected(text)
+    daily = pd.read_csv(access_sites.STORE_DAILY, parse_dates=["engagement_date"])
+    pd.testing.assert_frame_equal(daily, want, check_dtype=False)
+    month = store.buckets("month").groupby("site")["engagements"].sum()
+    assert month.to_dict() == want.groupby("site")["engagements"].sum().to_dict()
+
+
+def test_appended_events_are_added(log, capsys):
+    text = HEADER + events(500, 1)
+    log.write_text(text)
+    assert_store(access_sites.ingest(), text)
+
+    # An append ending in a line still being written: only the complete lines are ingested
+    text += events(200, 2) + "Hub_B,2023-0"
+    log.write_text(text)
+    capsys.readouterr()
+    store = access_sites.ingest()
+    assert "200 new events" in capsys.readouterr().out
+    assert_store(store, text)
+
+    # The rest of that line arrives with more events
+    text += "3-15\n" + events(50, 3)
+    log.write_text(text)
+    store = access_sites.ingest()
+    out = capsys.readouterr().out
+    assert "51 new events" in out and "(store rebuilt)" not in out
+    assert_store(store, text)
+
+
+def test_truncated_log_rebuilds_the_store(log, capsys):
+    text = HEADER + events(500, 1)
+    log.write_text(text)
+    access_sites.ingest()
+
+    # Shorter than the cursor: the events behind it are gone, so the store is rebuilt from the log
+    text = HEADER + events(100, 4)
+    log.write_text(text)
+    capsys.readouterr()
+    store = access_sites.ingest()
+    assert "(store rebuilt)" in capsys.readouterr().out
+    assert_store(store, text)
+
+
+def test_rewritten_log_rebuilds_the_store(log, capsys):
+    text = HEADER + events(500, 1)
+    log.write_text(text)
+    access_sites.ingest()
+
+    # Same length, different events: caught by the digest of the consumed tail
+    text = HEADER + events(500, 5)
+    log.write_text(text)
+    capsys.readouterr()
+    store = access_sites.ingest()
+    assert "(store rebuilt)" in capsys.readouterr().out
+    assert_store(store, text)
@@ -0,0 +1,60 @@
+import numpy as np
+import pytest
+
+from src.calibrate import calibrate
+
+N = 2_000
+
+
+def rows(seed: int = 0):
+    # A 0/1 flag at ~30%, 80% of rows eligible, and two dimensions (3 programs, 2 years)
+    rng = np.random.default_rng(seed)
+    flag = (rng.random(N) < 0.3).astype(np.int8)
+    eligible = rng.random(N) < 0.8
+    program = rng.integers(0, 3, N)
+    year = rng.integers(0, 2, N)
+    return flag, eligible, program, year
+
+
+def level_sums(flag, eligible, codes, levels: int) -> np.ndarray:
+    return np.bincount(codes[eligible], weights=flag[eligible], minlength=levels).astype(int)
+
+
+def test_margins_met_exactly():
+    flag, eligible, program, year = rows()
+    margins = [(program, np.array([200, 350, 150])), (year, np.array([420, 280]))]
+    out = calibrate(np.random.default_rng(1), flag, eligible, 700, margins)
+    assert out[eligible].sum() == 700
+    assert level_sums(out, eligible, program, 3).tolist() == [200, 350, 150]
+    assert level_sums(out, eligible, year, 2).tolist() == [420, 280]
+    # Rows outside `eligible` are left alone, and the input is not modified
+    assert (out[~eligible] == flag[~eligible]).all()
+    assert not np.shares_memory(out, flag)
+
+
+def test_seeded_and_keeps_existing_flags():
+    flag, eligible, program, year = rows()
+    margins = [(program, level_sums(flag, eligible, program, 3)), (year, level_sums(flag, eligible, year, 2))]
+    total = int(flag[eligible].sum())
+    # Targets the flag already meets: nothing needs to flip
+    assert (calibrate(np.random.default_rng(5), flag, eligible, total, margins) == flag).all()
+
+    margins = [(program, np.array([100, 100, 100]))]
+    a = calibrate(np.random.default_rng(5), flag, eligible, 300, margins)
+    b = calibrate(np.random.default_rng(5), flag, eligible, 300, margins)
+    assert (a == b).all()
+
+
+def test_infeasible_target_raises():
+    flag, eligible, program, year = rows()
+    available = np.bincount(program[eligible], minlength=3)
+    # More 1s on program 0 than it has eligible rows
+    targets = np.array([available[0] + 1, 10, 10])
+    with pytest.raises(ValueError, match="cannot be met"):
+        calibrate(np.random.default_rng(1), flag, eligible, int(targets.sum()), [(program, targets)])
+
+
+def test_targets_must_sum_to_total():
+    flag, eligible, program, _ = rows()
+    with pytest.raises(ValueError, match="not the total"):
+        calibrate(np.random.default_rng(1), flag, eligible, 100, [(program, np.array([50, 30, 10]))])
@@ -0,0 +1,127 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from src import dq_rules
+from src.etl_build_metrics import TABLEAU_COLS
+
+CLEAN = {
+    "client_id": "C00001",
+    "program_name": "SHI",
+    "provider": "Provider_01",
+    "entry_date": pd.Timestamp("2023-01-01"),
+    "exit_date": pd.Timestamp("2023-02-01"),
+    "days_in_program": 31,
+    "exited_flag": 1,
+    "permanent_housing_flag": 1,
+    "exit_interview_completed": 1,
+    "exit_destination": "Rental by client, no ongoing housing subsidy",
+    "income_at_exit_range": "$1-150",
+    "year": 2023,
+    "household_type": "Single Adult",
+    "age_group": "35-44",
+    "race_ethnicity": "White",
+    "gender": "Female",
+}
+
+# One row per rule, changed from CLEAN just enough to break that rule and no other
+BREAKS = {
+    "missing_exit_interview": {"exit_interview_completed": 0},
+    "missing_income": {"income_at_exit_range": "Data Not Collected"},
+    "missing_entry_date": {"entry_date": pd.NaT, "days_in_program": pd.NA},
+    "missing_provider": {"provider": np.nan},
+    "missing_exit_destination": {"exit_destination": np.nan},
+    "missing_exited_flag": {"exited_flag": pd.NA},
+    "unknown_client": {"race_ethnicity": np.nan, "gender": np.nan, "age_group": np.nan},
+    "exit_before_entry": {"exit_date": pd.Timestamp("2022-12-01"), "days_in_program": 0},
+    "exited_without_exit_date": {"exit_date": pd.NaT, "days_in_program": pd.NA},
+    "perm_housing_without_exit": {"exited_flag": 0},
+    "perm_housing_to_temporary_destination": {"exit_destination": "Hotel/motel without voucher"},
+    "permanent_destination_not_flagged": {"permanent_housing_flag": 0},
+    "interview_destination_conflict": {"exit_destination": "No Exit Interview completed", "permanent_housing_flag": 0},
+    "stay_over_two_years": {"exit_date": pd.Timestamp("2025-03-12"), "days_in_program": 801},
+}
+
+
+def frame() -> pd.DataFrame:
+    rows = [CLEAN] + [{**CLEAN, "client_id": f"C{i:05d}", **change} for i, change in enumerate(BREAKS.values(), 2)]
+    df = pd.DataFrame(rows, columns=TABLEAU_COLS)
+    flags = ["days_in_program", "exited_flag", "permanent_housing_flag", "exit_interview_completed", "year"]
+    return df.astype({c: "Int64" for c in flags})
+
+
+def test_default_rules_cover_every_break():
+    assert set(BREAKS) == {r["name"] for r in dq_rules.RULES}
+
+
+def test_each_rule_hits_only_its_row():
+    df = frame()
+    hits = dq_rules.evaluate(df, dq_rules.compile_rules(dq_rules.RULES))
+    flags = hits["flags"]
+    got = dict(zip(flags["client_id"], flags["rule"].astype(str)))
+    expected = {f"C{i:05d}": name for i, name in enumerate(BREAKS, 2)}
+    assert len(flags) == len(BREAKS)
+    assert got == expected
+
+
+def test_counts_per_provider_program():
+    df = frame()
+    counts = dq_rules.evaluate(df, dq_rules.compile_rules(dq_rules.RULES))["counts"].set_index("provider")
+    assert counts.loc["Provider_01", "episodes"] == len(df) - 1
+    assert counts.loc["Provider_01", "missing_provider"] == 0
+    assert counts.loc[np.nan, "missing_provider"] == 1
+    for name in BREAKS.keys() - {"missing_provider"}:
+        assert counts.loc["Provider_01", name] == 1
+
+
+def test_spilled_drilldown_matches_in_memory(tmp_path, monkeypatch):
+    monkeypatch.setattr(dq_rules, "OUT_DRILLDOWN", str(tmp_path / "drill.csv"))
+    df = pd.concat([frame().assign(program_name=p) for p in ("SHI", "HHCM", "SHI")], ignore_index=True)
+    compiled = dq_rules.compile_rules(dq_rules.RULES)
+    spill, counts = dq_rules.flag_spill(), None
+    # Chunks cutting across groups, one with a missing provider
+    for rows in (df.iloc[:20], df.iloc[20:33], df.iloc[33:]):
+        hits = dq_rules.evaluate(rows, compiled)
+        spill.write(hits["flags"])
+        counts = dq_rules.add_counts(counts, hits["counts"])
+    index = dq_rules.write_drilldown(spill, dq_rules.RULES)
+    spill.close()
+
+    whole = dq_rules.evaluate(df, compiled)
+    drill, expected = dq_rules.drilldown_tables(whole["flags"])
+    pd.testing.assert_frame_equal(index, expected, check_dtype=False, check_categorical=False)
+    pd.testing.assert_frame_equal(pd.read_csv(dq_rules.OUT_DRILLDOWN), drill.astype({"rule": str}), check_dtype=False)
+    pd.testing.assert_frame_equal(counts, whole["counts"], check_dtype=False)
+
+
+def test_empty_spill_writes_an_empty_drilldown(tmp_path, monkeypatch):
+    monkeypatch.setattr(dq_rules, "OUT_DRILLDOWN", str(tmp_path / "drill.csv"))
+    spill = dq_rules.flag_spill()
+    index = dq_rules.write_drilldown(spill, dq_rules.RULES)
+    spill.close()
+    assert index.empty
+    assert list(pd.read_csv(dq_rules.OUT_DRILLDOWN).columns) == dq_rules.FLAG_COLS
+
+
+@pytest.mark.parametrize(
+    "when",
+    [
+        "().__class__.__bases__[0].__subclasses__()",
+        "__import__('os').system('true')",
+        "exit_date.__class__",
+        "provider.str.len() > 3",
+        "[c for c in provider]",
+        "(lambda: 1)()",
+        "exited_flag == 1 and provider.isna()",
+        "'x' * 10**9",
+        "not_a_column == 1",
+    ],
+)
+def test_rule_outside_the_whitelist_is_rejected(when):
+    with pytest.raises(ValueError, match="rule 'bad'"):
+        dq_rules.compile_rules([{"name": "bad", "when": when}])
+
+
+def test_rule_syntax_error_is_a_value_error():
+    with pytest.raises(ValueError, match="rule 'bad'"):
+        dq_rules.compile_rules([{"name": "bad", "when": "exited_flag =="}])
@@ -0,0 +1,95 @@
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from src import dq_rules, incremental, intervals
+from src import etl_build_metrics as etl
+from src.generate_data import generate
+
+TABLES = ["monthly", "program", "dq", "equity", "totals"]
+INTERVAL_TABLES = [
+    intervals.returns_to_homelessness,
+    intervals.concurrent_enrollments,
+    intervals.census,
+    intervals.length_of_stay,
+]
+
+
+@pytest.fixture
+def paths(tmp_path, monkeypatch):
+    # Raw files, the Tableau extract and the incremental state all under tmp_path
+    for name in ("RAW_CLIENTS", "RAW_ENG"):
+        monkeypatch.setattr(etl, name, str(tmp_path / os.path.basename(getattr(etl, name))))
+    monkeypatch.setattr(etl, "OUT_TABLEAU", str(tmp_path / "tableau_extract.csv"))
+    monkeypatch.setattr(incremental, "STATE_DIR", str(tmp_path / "state"))
+    monkeypatch.setattr(incremental, "STATE_META", str(tmp_path / "state" / "meta.json"))
+    monkeypatch.setattr(incremental, "STATE_ROWS", str(tmp_path / "state" / "rows.npy"))
+    clients, engagements, _ = generate(seed=7, total_clients=600, episodes_per_client=1.8)
+    clients.to_csv(etl.RAW_CLIENTS, index=False)
+    engagements.to_csv(etl.RAW_ENG, index=False)
+    return tmp_path
+
+
+def edit_one_month(path: str, month: str):
+    # Flip some flags, drop some rows and add returns for existing clients, all exiting in `month`
+    eng = pd.read_csv(path, dtype=str, keep_default_na=False)
+    rows = np.flatnonzero(eng["exit_date"].str.startswith(month).to_numpy())
+    assert len(rows) >= 20
+    eng.loc[rows[:5], "permanent_housing_flag"] = "1"
+    added = eng.loc[rows[10:20]].assign(entry_date=f"{month}-02", exit_date=f"{month}-20")
+    eng = pd.concat([eng.drop(index=rows[5:10]), added], ignore_index=True)
+    eng.to_csv(path, index=False)
+
+
+def by_exit_month(path: str) -> str:
+    # The extract text with rows stable-sorted by exit month, missing exit dates last
+    with open(path) as f:
+        header, *lines = f.readlines()
+    month = pd.to_datetime(pd.read_csv(path, usecols=["exit_date"])["exit_date"]).dt.to_period("M")
+    return header + "".join(lines[i] for i in month.sort_values(kind="stable", na_position="last").index)
+
+
+def assert_same_build(inc: tuple, full: tuple):
+    for name, a, b in zip(TABLES, inc, full):
+        pd.testing.assert_frame_equal(a.reset_index(drop=True), b.reset_index(drop=True), check_dtype=False, check_categorical=False, obj=name)
+    for build in INTERVAL_TABLES:
+        pd.testing.assert_frame_equal(build(inc[5]), build(full[5]), obj=build.__name__)
+    pd.testing.assert_frame_equal(dq_rules.scores(inc[6]["counts"], dq_rules.RULES), dq_rules.scores(full[6]["counts"], dq_rules.RULES), check_dtype=False, check_categorical=False)
+    for a, b in zip(dq_rules.drilldown_tables(inc[6]["flags"]), dq_rules.drilldown_tables(full[6]["flags"])):
+        pd.testing.assert_frame_equal(a, b, check_dtype=False, check_categorical=False)
+
+
+def test_one_changed_month_matches_full_build(paths):
+    first = incremental.build_incremental()
+    edit_one_month(etl.RAW_ENG, "2023-03")
+
+    inc = incremental.build_incremental()
+    summary = inc[7]
+    assert 0 < summary["recomputed"] < summary["partitions"]
+    # At least the 15 edited and added rows, but not the whole export
+    assert 15 <= summary["rows_parsed"] < first[7]["rows_parsed"]
+    with open(etl.OUT_TABLEAU) as f:
+        extract = f.read()
+
+    full = etl.build_in_memory()
+    assert_same_build(inc, full)
+    assert extract == by_exit_month(etl.OUT_TABLEAU)
+
+
+def test_unchanged_export_parses_nothing(paths):
+    first = incremental.build_incremental()
+    assert first[7]["recomputed"] == first[7]["partitions"] > 0
+    again = incremental.build_incremental()
+    assert again[7] == {"partitions": first[7]["partitions"], "recomputed": 0, "removed": 0, "rows_parsed": 0}
+    assert_same_build(again, first)
+
+
+def test_new_rules_rebuild_the_state(paths):
+    first = incremental.build_incremental()
+    rules = dq_rules.RULES[:3]
+    inc = incremental.build_incremental(rules=rules)
+    assert inc[7]["recomputed"] == inc[7]["partitions"]
+    assert inc[7]["rows_parsed"] == first[7]["rows_parsed"]
+    assert list(inc[6]["counts"].columns[-3:]) == [r["name"] for r in rules]
@@ -0,0 +1,92 @@
+import numpy as np
+import pandas as pd
+
+from src import intervals
+
+# (client, program, entry, exit, permanent housing exit); exit None = still enrolled
+EPISODES = [
+    ("C1", "SHI", "2023-01-01", "2023-02-01", 1),  # returns 30 days later
+    ("C1", "CEA", "2023-03-03", "2023-04-01", 0),
+    ("C2", "SHI", "2023-01-10", "2023-01-20", 1),  # never returns
+    ("C3", "CEA", "2023-01-01", None, 0),
+    ("C3", "SHI", "2023-01-05", "2023-01-15", 0),  # starts while CEA is open: concurrent
+    ("C4", "CEA", "2023-01-01", "2023-01-31", 1),
+    ("C4", "SHI", "2023-01-31", "2023-02-10", 0),  # same-day transfer: neither concurrent nor a return
+    ("C5", "SHI", "2024-01-01", "2024-01-02", 0),  # last day in the data
+]
+
+
+def frame(rows=EPISODES) -> pd.DataFrame:
+    df = pd.DataFrame(rows, columns=["client_id", "program_name", "entry_date", "exit_date", "permanent_housing_flag"])
+    df["entry_date"] = pd.to_datetime(df["entry_date"])
+    df["exit_date"] = pd.to_datetime(df["exit_date"])
+    df["exited_flag"] = df["exit_date"].notna().astype(int)
+    return df
+
+
+def counts(df: pd.DataFrame) -> dict:
+    client_key = pd.factorize(df["client_id"])[0]
+    return intervals.interval_counts(*intervals.interval_index(intervals.episodes(df, client_key)))
+
+
+def row(table: pd.DataFrame, **match) -> pd.Series:
+    mask = np.logical_and.reduce([(table[k] == v).to_numpy() for k, v in match.items()])
+    assert mask.sum() == 1
+    return table[mask].iloc[0]
+
+
+def test_returns_within_windows():
+    out = intervals.returns_to_homelessness(counts(frame()))
+    shi = row(out, program_name="SHI", window_months=6)
+    assert (shi["exits_to_perm_housing"], shi["returns"]) == (2, 1)
+    cea = row(out, program_name="CEA", window_months=6)
+    assert (cea["exits_to_perm_housing"], cea["returns"]) == (1, 0)
+    everyone = row(out, program_name=intervals.ALL_PROGRAMS, window_months=6)
+    assert (everyone["exits_to_perm_housing"], everyone["returns"]) == (3, 1)
+    # A 12-month window from any exit runs past 2024-01-02, so no exit is eligible
+    assert (out.loc[out["window_months"] > 6, "exits_to_perm_housing"] == 0).all()
+
+
+def test_return_gap_is_capped_by_window():
+    # Returning 200 days after the exit counts for 12 months but not 6
+    rows = [
+        ("C1", "SHI", "2021-01-01", "2021-02-01", 1),
+        ("C1", "CEA", "2021-08-20", "2021-09-01", 0),
+        ("C2", "SHI", "2024-01-01", None, 0),
+    ]
+    out = intervals.returns_to_homelessness(counts(frame(rows)))
+    assert row(out, program_name="SHI", window_months=6)["returns"] == 0
+    assert row(out, program_name="SHI", window_months=12)["returns"] == 1
+    assert row(out, program_name="SHI", window_months=24)["returns"] == 1
+
+
+def test_concurrent_enrollments():
+    out = intervals.concurrent_enrollments(counts(frame())).set_index("program_name")
+    assert out.loc["SHI", "episodes"] == 5 and out.loc["SHI", "concurrent_episodes"] == 1
+    assert out.loc["CEA", "episodes"] == 3 and out.loc["CEA", "concurrent_episodes"] == 0
+    assert out.loc[intervals.ALL_PROGRAMS, "concurrent_rate"] == 1 / 8
+
+
+def test_census_sweep():
+    daily = intervals.census(counts(frame()))
+    day = daily[daily["date"] == pd.Timestamp("2023-01-12")].set_index("program_name")["active_enrollments"]
+    assert (day["SHI"], day["CEA"], day[intervals.ALL_PROGRAMS]) == (3, 2, 5)
+    # The open CEA enrollment runs through the last day, alongside C5's stay that exits on it
+    last = daily[daily["date"] == daily["date"].max()].set_index("program_name")["active_enrollments"]
+    assert (last["CEA"], last["SHI"]) == (1, 1)
+
+
+def test_episodes_without_entry_date_are_dropped():
+    df = frame(EPISODES + [("C6", "SHI", None, "2023-05-01", 1)])
+    out = intervals.concurrent_enrollments(counts(df)).set_index("program_name")
+    assert out.loc[intervals.ALL_PROGRAMS, "episodes"] == len(EPISODES)
+
+
+def test_client_pieces_merge_to_the_whole():
+    # Counts of disjoint client pieces (as the streaming ETL's spill buckets produce) add up to the counts
+    # of one pass over every client
+    df = frame()
+    whole = counts(df)
+    merged = intervals.merge_counts([counts(df[df["client_id"].isin(part)]) for part in (["C1", "C4"], ["C2", "C3", "C5"])])
+    for build in (intervals.returns_to_homelessness, intervals.concurrent_enrollments, intervals.census, intervals.length_of_stay):
+        pd.testing.assert_frame_equal(build(merged), build(whole))